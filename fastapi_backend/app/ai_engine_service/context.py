@@ -0,0 +1,58 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def select_context(
+    ranked: List[Tuple[str, float]],
+    vectors: Dict[str, Sequence[float]],
+    max_chunks: int,
+    diversity: float,
+    duplicate_similarity: float,
+    score_margin: Optional[float] = None,
+) -> List[str]:
+    """
+    Pick the fewest hits that cover the query, by maximal marginal relevance.
+
+    `ranked` are (id, relevance) pairs, best first. With `score_margin`,
+    hits scoring more than that below the best one are dropped first (the
+    scores must be similarities, e.g. cosine). Each remaining pick
+    maximizes `diversity * relevance - (1 - diversity) * redundancy`, where
+    redundancy is the highest similarity to a hit already picked; hits
+    nearly identical to a picked one (`duplicate_similarity`) are skipped.
+    Hits without a vector count as novel. Returns ids in the order picked.
+    """
+    if not ranked:
+        return []
+    best = ranked[0][1]
+    if score_margin is not None:
+        ranked = [(i, score) for i, score in ranked if score >= best - score_margin]
+
+    ids = [i for i, _ in ranked]
+    # Scale free, so that fused rank scores work as well as similarities
+    relevance = np.array([score for _, score in ranked], dtype=np.float64)
+    if best > 0:
+        relevance /= best
+
+    has_vector = np.array([i in vectors for i in ids])
+    dimension = len(next(iter(vectors.values()))) if vectors else 0
+    matrix = np.zeros((len(ids), dimension), dtype=np.float32)
+    for row, i in enumerate(ids):
+        if i in vectors:
+            matrix[row] = vectors[i]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms > 0, norms, 1)
+
+    redundancy = np.zeros(len(ids))
+    available = np.ones(len(ids), dtype=bool)
+    picked: List[int] = []
+    while available.any() and len(picked) < max_chunks:
+        scores = diversity * relevance - (1 - diversity) * redundancy
+        choice = int(np.argmax(np.where(available, scores, -np.inf)))
+        picked.append(choice)
+        available[choice] = False
+        if has_vector[choice]:
+            similarity = (matrix @ matrix[choice]) * has_vector
+            redundancy = np.maximum(redundancy, similarity)
+            available &= redundancy < duplicate_similarity
+    return [ids[i] for i in picked]
@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List
 
@@ -28,7 +29,8 @@ async def extract_intent(query: str) -> Intent:
     try:
         response = await llm.ainvoke(prompt)
         logger_info.info("LLM Call successful")
-        return intent_parser.parse(response.content)
+        # Parsing is CPU-bound; keep it off the event loop
+        return await asyncio.to_thread(intent_parser.parse, response.content)
     except Exception as e:
         if "invalid_api_key" in str(e).lower() or "401" in str(e):
             raise ValueError(f"Invalid OpenAI API key: {e}")
@@ -109,7 +111,9 @@ class UnifiedIntentHandler(BaseIntentHandler):
 
             # Parse the response and create updates for all documents
             try:
-                change_data = content_parser.parse(response.content)
+                change_data = await asyncio.to_thread(
+                    content_parser.parse, response.content
+                )
 
                 # Create one update per document with the same response
                 for doc in content_extracts:
@@ -1,23 +1,98 @@
+import asyncio
+import re
 import warnings
+from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
+from app.ai_engine_service.context import select_context
 from app.ai_engine_service.intent import IntentHandlerFactory, extract_intent
 from app.config import settings
-from app.database import get_db_session
+from app.database import (
+    get_chunk_vector_ids,
+    get_chunks_with_documents,
+    get_db_session,
+    get_point_chunk_ids,
+    search_chunk_ids,
+)
+from app.embeddings import get_query_embeddings
+from app.keyword_index import keyword_index, terms
 from app.models import DocumentChunk
 from app.schemas import Intent
 from app.utils import logger_error, logger_info
+from app.vector_store import (
+    get_qdrant_client,
+    keywords_complete,
+    retrieve_chunks,
+    retrieve_vectors,
+    run_vector_op,
+    scope_filter,
+    search_points,
+)
 from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
 from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import FieldCondition, Filter, MatchAny
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 warnings.filterwarnings("ignore")
 
+# `code`, "text" or 'text', but not the apostrophe in "don't"
+_QUOTED = re.compile(r"`([^`]+)`|\"([^\"]+)\"|(?<!\w)'([^']+)'(?!\w)")
+_WORD = re.compile(r"[\w.]+")
+_STOP_WORDS = frozenset(
+    "a about add all an and any are as at be by can change delete do docs "
+    "document documentation does for from function how i in is it its me "
+    "modify my new of on or our please remove section should that the this "
+    "to update we what when where which with you".split()
+)
+
+
+def speculative_keywords(query: str, limit: int) -> List[str]:
+    """
+    Terms of the query likely to become the intent's target.
+
+    Quoted text comes first, then identifiers (snake_case, camelCase,
+    dotted names), then the remaining words, longest first.
+    """
+    candidates = ["".join(groups).strip() for groups in _QUOTED.findall(query)]
+    words = [w.strip(".") for w in _WORD.findall(query)]
+    words = [w for w in words if len(w) > 2 and w.lower() not in _STOP_WORDS]
+    identifiers = [w for w in words if "_" in w or "." in w or not w.islower()]
+    candidates += identifiers
+    candidates += sorted(words, key=len, reverse=True)
+
+    keywords, seen = [], set()
+    for candidate in candidates:
+        if candidate and candidate.lower() not in seen:
+            seen.add(candidate.lower())
+            keywords.append(candidate)
+    return keywords[:limit]
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[str]], k: int
+) -> List[Tuple[str, float]]:
+    """
+    Merge ranked id lists: each list adds 1 / (k + rank) to an id's score,
+    so ids ranked well by several retrievers come first.
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _discard(task: Optional[asyncio.Task]) -> None:
+    """Cancel an unused task, and retrieve its error so it is not logged"""
+    if task is None:
+        return
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()
+
 
 class DocuRAG:
     def __init__(self):
@@ -28,9 +103,7 @@ class DocuRAG:
             openai_api_key=settings.OPENAI_API_KEY,
         )
 
-        self.embeddings = OpenAIEmbeddings(
-            model=settings.EMBEDDING_MODEL, openai_api_key=settings.OPENAI_API_KEY
-        )
+        self.embeddings = get_query_embeddings()
 
         self.qdrant_path = Path(settings.QDRANT_PATH)
         self.collection_name = settings.QDRANT_COLLECTION_NAME
@@ -38,7 +111,7 @@ class DocuRAG:
 
     def _get_client(self):
         if self._client is None:
-            self._client = QdrantClient(path=str(self.qdrant_path))
+            self._client = get_qdrant_client()
         return self._client
 
     def _get_vector_store(self):
@@ -48,92 +121,351 @@ class DocuRAG:
             embedding=self.embeddings,
         )
 
+    async def _search_keyword(self, keyword: str, db: AsyncSession) -> List[str]:
+        # content-based filter, ranked and capped at KEYWORD_PREFILTER_LIMIT
+        if keyword_index.ready:
+            return keyword_index.search(keyword, settings.KEYWORD_PREFILTER_LIMIT)
+        return await search_chunk_ids(keyword, db)
+
+    async def _search_keywords(self, keywords: List[str]) -> Dict[str, List[str]]:
+        """Look up several keywords at once, each on its own session"""
+
+        async def search(keyword: str) -> Tuple[str, List[str]]:
+            async with get_db_session() as db:
+                return keyword.lower(), await self._search_keyword(keyword, db)
+
+        return dict(await asyncio.gather(*(search(k) for k in keywords)))
+
     async def _get_relevant_chunk_ids(
-        self, intent: Intent, db: AsyncSession
+        self,
+        intent: Intent,
+        db: AsyncSession,
+        speculative: Optional[asyncio.Task] = None,
     ) -> List[str]:
-        keyword = intent.target
+        """Chunk ids for the intent's target, reusing a speculative lookup"""
+        if speculative is not None:
+            try:
+                found = await speculative
+            except Exception as e:
+                logger_error.error(f"Speculative keyword lookup failed: {e}")
+                found = {}
+            target = intent.target.strip().strip("`'\"").lower()
+            if target in found:
+                logger_info.info(f"Speculative keyword lookup hit for '{target}'")
+                return found[target]
+        return await self._search_keyword(intent.target, db)
 
-        # content-based filter
-        stmt = select(DocumentChunk.chunk_id).where(
-            DocumentChunk.content.ilike(f"%{keyword}%")
+    async def _get_fallback_chunk_ids(self, db: AsyncSession) -> List[str]:
+        # Return latest N chunks - temporary fix
+        stmt = (
+            select(DocumentChunk.chunk_id)
+            .order_by(DocumentChunk.created_at.desc())
+            .limit(10)
         )
         result = await db.execute(stmt)
-        chunk_ids = [str(row[0]) for row in result.fetchall()]
+        return [str(row[0]) for row in result.fetchall()]
 
-        # intent is "add" - fallback to top-K recent or semantic search
-        if not chunk_ids and intent.action == "add":
-            logger_info.info(
-                f"No chunks found for '{keyword}', fallback to recent or related chunks for 'add' intent."
-            )
+    async def _beyond_cap(
+        self, search_results: List, vector_ids: Dict[str, str]
+    ) -> Dict[str, str]:
+        """chunk_id -> point id of the hits that were not in the keyword list"""
+        known = set(vector_ids.values())
+        new_points = [str(r.id) for r in search_results if str(r.id) not in known]
+        if not new_points:
+            return {}
+        async with get_db_session() as db:
+            return await get_point_chunk_ids(new_points, db)
 
-            # Return latest N chunks - temporary fix
-            stmt = (
-                select(DocumentChunk.chunk_id)
-                .order_by(DocumentChunk.created_at.desc())
-                .limit(10)
-            )
-            result = await db.execute(stmt)
-            chunk_ids = [str(row[0]) for row in result.fetchall()]
+    async def _expand_duplicates(
+        self,
+        hits: List[Tuple[str, Dict]],
+        vector_ids: Dict[str, str],
+        max_chunks: Optional[int] = None,
+    ) -> List[Document]:
+        """
+        Turn matched Qdrant points back into the chunks they stand for.
 
-        return chunk_ids
+        Duplicate chunks share the point of their first copy, so one point
+        may cover the same text in many documents; each of them is returned
+        with its own content and document metadata. A document gets at most
+        one chunk per point, and at most `max_chunks` chunks are returned, so
+        a boilerplate point cannot flood the prompt.
+        """
+        chunks_by_vector = defaultdict(list)
+        for chunk_id, vector_id in vector_ids.items():
+            chunks_by_vector[vector_id].append(chunk_id)
+        for vector_id, chunk_ids in chunks_by_vector.items():
+            # The chunk the point was written for comes first
+            chunk_ids.sort(key=lambda chunk_id: chunk_id != vector_id)
 
-    async def task_runner(self, query: str) -> Dict:
-        try:
-            print("=== TASK ENTRY POINT ===")
-            print(f"Query: {query}")
+        chunk_ids = [c for vector_id, _ in hits for c in chunks_by_vector[vector_id]]
+        async with get_db_session() as db:
+            rows = await get_chunks_with_documents(chunk_ids, db)
+        by_chunk = {str(chunk.chunk_id): (chunk, row) for chunk, row in rows}
 
+        documents = []
+        for vector_id, metadata in hits:
+            seen_docs = set()
+            for chunk_id in chunks_by_vector[vector_id]:
+                if chunk_id not in by_chunk:
+                    continue
+                chunk, row = by_chunk[chunk_id]
+                if row.doc_id in seen_docs:
+                    continue
+                seen_docs.add(row.doc_id)
+                if max_chunks is not None and len(documents) >= max_chunks:
+                    return documents
+                documents.append(
+                    Document(
+                        page_content=chunk.content,
+                        metadata={
+                            **metadata,
+                            "doc_id": str(row.doc_id),
+                            "chunk_id": chunk_id,
+                            "chunk_index": chunk.chunk_index,
+                            "title": row.title,
+                            "file_path": row.file_path,
+                            "source_url": row.source_url,
+                            "sourceURL": row.source_url,
+                        },
+                    )
+                )
+        return documents
+
+    def _context_limit(self) -> Optional[int]:
+        """Cap on the chunks passed to the LLM after duplicates are expanded"""
+        return settings.CONTEXT_MAX_CHUNKS if settings.CONTEXT_SELECTION else None
+
+    def _select_context(
+        self,
+        ranked: List[Tuple[str, float]],
+        vectors: Dict[str, List[float]],
+        score_margin: Optional[float],
+    ) -> List[str]:
+        """Point ids of the hits worth passing to the LLM"""
+        selected = select_context(
+            ranked,
+            vectors,
+            max_chunks=settings.CONTEXT_MAX_CHUNKS,
+            diversity=settings.CONTEXT_MMR_LAMBDA,
+            duplicate_similarity=settings.CONTEXT_DUPLICATE_SIMILARITY,
+            score_margin=score_margin,
+        )
+        logger_info.info(
+            f"Context selection kept {len(selected)} of {len(ranked)} hits"
+        )
+        return selected
+
+    async def _filtered_retrieval(self, query: str) -> Tuple[Intent, List[Document]]:
+        """Keyword lookup for the intent's target, then vector search inside it"""
+        embedding_task = speculative_task = None
+        if settings.QUERY_CONCURRENT_MODE:
+            # Neither depends on the intent, run them during the LLM call
+            embedding_task = asyncio.create_task(self.embeddings.aembed_query(query))
+            keywords = speculative_keywords(query, settings.SPECULATIVE_KEYWORDS)
+            if keywords:
+                speculative_task = asyncio.create_task(self._search_keywords(keywords))
+
+        try:
             intent = await extract_intent(query)
             print(f">>>> Intent: {intent}")
 
             async with get_db_session() as db:
-                relevant_chunk_ids = await self._get_relevant_chunk_ids(intent, db)
+                relevant_chunk_ids = await self._get_relevant_chunk_ids(
+                    intent, db, speculative_task
+                )
 
-            print(f" >>> Postgres filter returned {len(relevant_chunk_ids)} chunk_ids")
-            print(f" >>> Chunk IDs: {relevant_chunk_ids}")
+                # intent is "add" - fallback to recent chunks
+                fallback_chunk_ids = []
+                if not relevant_chunk_ids and intent.action == "add":
+                    logger_info.info(
+                        f"No chunks found for '{intent.target}', fallback to recent chunks for 'add' intent."
+                    )
+                    fallback_chunk_ids = await self._get_fallback_chunk_ids(db)
 
-            query_embedding = self.embeddings.embed_query(query)
-            client = self._get_client()
+                # Duplicate chunks are searched through the point they share
+                vector_ids = await get_chunk_vector_ids(
+                    relevant_chunk_ids or fallback_chunk_ids, db
+                )
+                point_ids = sorted(set(vector_ids.values()))
 
-            search_results = []
+            query_embedding = None
+            if relevant_chunk_ids:
+                if embedding_task is not None:
+                    query_embedding = await embedding_task
+                else:
+                    query_embedding = await self.embeddings.aembed_query(query)
+        finally:
+            _discard(embedding_task)
+            _discard(speculative_task)
 
-            query_filter = Filter(
-                must=[
-                    FieldCondition(
-                        key="metadata.chunk_id", match=MatchAny(any=relevant_chunk_ids)
-                    )
-                ]
-            )
+        print(f" >>> Postgres filter returned {len(relevant_chunk_ids)} chunk_ids")
+        print(f" >>> Chunk IDs: {relevant_chunk_ids}")
 
-            if relevant_chunk_ids:
-                search_results = client.search(
-                    collection_name=self.collection_name,
-                    query_vector=query_embedding,
-                    limit=settings.TOP_K_DOCS * 2,
-                    with_payload=True,
-                    query_filter=query_filter,
-                )
-            else:
-                logger_info.info(
-                    "No relevant chunk_ids found — skipping Qdrant search."
+        search_results = []
+        hits = []
+
+        if relevant_chunk_ids:
+            # Scope the search to the points of the matching chunks. With
+            # every point tokenized, Qdrant matches the keyword itself: the
+            # keyword index tokenizes the same way, so the id list is not
+            # needed. Postgres full-text search also matches stems and
+            # substrings, so its ids are kept, plus the keyword once capped
+            keyword = scope_ids = None
+            if (
+                settings.QDRANT_KEYWORD_FILTER
+                and terms(intent.target)
+                and await run_vector_op(keywords_complete)
+            ):
+                keyword = intent.target
+            if keyword is None or not keyword_index.ready:
+                scope_ids = point_ids
+                if len(relevant_chunk_ids) < settings.KEYWORD_PREFILTER_LIMIT:
+                    keyword = None
+            search_results = await run_vector_op(
+                search_points,
+                query_embedding,
+                scope_filter(scope_ids, keyword),
+                settings.TOP_K_DOCS * 2,
+                score_threshold=settings.MIN_SIMILARITY_SCORE,
+                with_vectors=settings.CONTEXT_SELECTION,
+            )
+            if settings.CONTEXT_SELECTION:
+                by_id = {str(r.id): r for r in search_results}
+                selected = self._select_context(
+                    [(point_id, r.score) for point_id, r in by_id.items()],
+                    {point_id: r.vector for point_id, r in by_id.items()},
+                    settings.CONTEXT_SCORE_MARGIN,
                 )
+                search_results = [by_id[point_id] for point_id in selected]
+            if keyword is not None:
+                vector_ids.update(await self._beyond_cap(search_results, vector_ids))
+        elif fallback_chunk_ids:
+            # No ranking is needed for the fallback, fetch the points directly
+            # A point's id is the chunk_id of the chunk it was written for
+            hits = [
+                (str(doc.metadata.get("chunk_id")), doc.metadata)
+                for doc in await run_vector_op(retrieve_chunks, point_ids)
+            ]
+        else:
+            logger_info.info("No relevant chunk_ids found — skipping Qdrant search.")
+
+        logger_info.info(
+            f"Filtered chunks: {len(relevant_chunk_ids)}, "
+            f"Qdrant results: {len(search_results)}"
+        )
 
-            logger_info.info(
-                f"Filtered chunks: {len(relevant_chunk_ids)}, "
-                f"Qdrant results: {len(search_results)}"
+        # Qdrant has already dropped the points below MIN_SIMILARITY_SCORE
+        for result in search_results:
+            chunk_id = result.payload.get("metadata", {}).get("chunk_id", "N/A")
+            print(f"Chunk ID: {chunk_id}, Score: {result.score:.4f}")
+            hits.append((str(result.id), result.payload.get("metadata", {})))
+
+        source_documents = await self._expand_duplicates(
+            hits, vector_ids, self._context_limit()
+        )
+
+        print(f"Retrieved {len(source_documents)} high-confidence documents")
+        return intent, source_documents
+
+    async def _hybrid_search(self, query: str) -> List[Document]:
+        """
+        BM25 over the keyword index and a vector search over the whole
+        collection, run side by side and fused by reciprocal rank.
+
+        Neither retriever needs the intent, and a query whose keyword does
+        not occur literally still finds its semantic matches.
+        """
+        query_terms = [t for t in terms(query) if t not in _STOP_WORDS]
+
+        async def dense() -> List:
+            vector = await self.embeddings.aembed_query(query)
+            return await run_vector_op(
+                search_points,
+                vector,
+                None,
+                settings.HYBRID_CANDIDATES,
+                score_threshold=settings.MIN_SIMILARITY_SCORE,
+                with_vectors=settings.CONTEXT_SELECTION,
             )
 
-            source_documents = []
-            for result in search_results:
-                chunk_id = result.payload.get("metadata", {}).get("chunk_id", "N/A")
-                print(f"Chunk ID: {chunk_id}, Score: {result.score:.4f}")
-                if result.score >= settings.MIN_SIMILARITY_SCORE:
-                    doc = Document(
-                        page_content=result.payload.get("page_content", ""),
-                        metadata=result.payload.get("metadata", {}),
-                    )
-                    source_documents.append(doc)
+        async def sparse() -> List[str]:
+            ranked = keyword_index.bm25(query_terms, settings.HYBRID_CANDIDATES)
+            async with get_db_session() as db:
+                vector_ids = await get_chunk_vector_ids([c for c, _ in ranked], db)
+            # Duplicates share a point, which ranks as its best chunk
+            return list(
+                dict.fromkeys(vector_ids[c] for c, _ in ranked if c in vector_ids)
+            )
+
+        dense_results, sparse_points = await asyncio.gather(dense(), sparse())
+        fused = reciprocal_rank_fusion(
+            [[str(r.id) for r in dense_results], sparse_points], settings.RRF_K
+        )[: settings.TOP_K_DOCS * 2]
+        logger_info.info(
+            f"Hybrid retrieval: {len(dense_results)} dense, "
+            f"{len(sparse_points)} sparse, {len(fused)} fused"
+        )
+        if settings.CONTEXT_SELECTION:
+            vectors = {str(r.id): r.vector for r in dense_results}
+            missing = [point_id for point_id, _ in fused if point_id not in vectors]
+            vectors.update(await run_vector_op(retrieve_vectors, missing))
+            # Fused rank scores are not similarities, so no score cutoff
+            scores = dict(fused)
+            fused = [
+                (point_id, scores[point_id])
+                for point_id in self._select_context(fused, vectors, None)
+            ]
+
+        metadata = {str(r.id): r.payload.get("metadata", {}) for r in dense_results}
+        hits = []
+        for point_id, score in fused:
+            logger_info.debug(f"Point ID: {point_id}, RRF score: {score:.4f}")
+            hits.append((point_id, metadata.get(point_id, {})))
+        async with get_db_session() as db:
+            vector_ids = await get_point_chunk_ids([p for p, _ in fused], db)
+        return await self._expand_duplicates(hits, vector_ids, self._context_limit())
+
+    async def _hybrid_retrieval(self, query: str) -> Tuple[Intent, List[Document]]:
+        search_task = None
+        if settings.QUERY_CONCURRENT_MODE:
+            search_task = asyncio.create_task(self._hybrid_search(query))
+        try:
+            intent = await extract_intent(query)
+            logger_info.debug(f"Intent: {intent}")
+            if search_task is None:
+                source_documents = await self._hybrid_search(query)
+            else:
+                source_documents = await search_task
+        finally:
+            _discard(search_task)
+        logger_info.debug(
+            f"Retrieved {len(source_documents)} documents by hybrid search"
+        )
+        return intent, source_documents
 
-            print(f"Retrieved {len(source_documents)} high-confidence documents")
+    async def task_runner(self, query: str) -> Dict:
+        try:
+            print("=== TASK ENTRY POINT ===")
+            print(f"Query: {query}")
+
+            if settings.RETRIEVAL_MODE == "hybrid" and keyword_index.ready:
+                intent, source_documents = await self._hybrid_retrieval(query)
+                analysis = (
+                    f"Retrieved {len(source_documents)} relevant documents for "
+                    f"'{intent.target}' by hybrid keyword and semantic search."
+                )
+            else:
+                # Without the index at all, startup has warned once already
+                if (
+                    settings.RETRIEVAL_MODE == "hybrid"
+                    and settings.KEYWORD_INDEX_ENABLED
+                ):
+                    logger_info.info(
+                        "Keyword index not ready, using keyword-filtered retrieval"
+                    )
+                intent, source_documents = await self._filtered_retrieval(query)
+                analysis = f"Retrieved {len(source_documents)} relevant documents (similarity ≥ {settings.MIN_SIMILARITY_SCORE}) containing '{intent.target}'."
 
             handler = IntentHandlerFactory.create_handler(intent, self.llm_model)
             documents_to_update = await handler.process_intent(
@@ -143,7 +475,7 @@ class DocuRAG:
             return {
                 "query": query,
                 "keyword": intent.target,
-                "analysis": f"Retrieved {len(source_documents)} relevant documents (similarity ≥ {settings.MIN_SIMILARITY_SCORE}) containing '{intent.target}'.",
+                "analysis": analysis,
                 "documents_to_update": documents_to_update,
                 "total_documents": len(documents_to_update),
             }
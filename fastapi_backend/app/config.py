@@ -1,4 +1,5 @@
-from typing import Optional, Set
+import os
+from typing import Literal, Optional, Set
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -6,6 +7,10 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     # Database settings
     DATABASE_URL: Optional[str] = None
+    # Bulk writes of documents and chunks: "copy" uses asyncpg COPY,
+    # "insert" uses batched executemany INSERTs
+    POSTGRES_WRITE_MODE: Literal["copy", "insert"] = "copy"
+    POSTGRES_WRITE_BATCH_SIZE: int = 5000
 
     # OpenAI settings
     OPENAI_API_KEY: str
@@ -17,6 +22,37 @@ class Settings(BaseSettings):
 
     # RAG settings
     TOP_K_DOCS: int = 8
+    # Best ranked keyword matches the vector search is scoped to
+    KEYWORD_PREFILTER_LIMIT: int = 500
+    # Resolve keywords from an in-memory index built at startup instead of
+    # querying Postgres (costs memory in proportion to the corpus)
+    KEYWORD_INDEX_ENABLED: bool = False
+    # Match the keyword on the tokens in the Qdrant payload. With the keyword
+    # index the search is scoped by the keyword alone, without an id list;
+    # with Postgres lookups (which also match stems and substrings) the ids
+    # are still sent, plus the keyword once KEYWORD_PREFILTER_LIMIT is hit.
+    # Local mode ignores payload indexes, so there the filter is a scan
+    QDRANT_KEYWORD_FILTER: bool = True
+    # Embed the query and look up likely keywords while the intent is being
+    # extracted; SPECULATIVE_KEYWORDS is how many query terms are looked up
+    QUERY_CONCURRENT_MODE: bool = True
+    SPECULATIVE_KEYWORDS: int = 3
+    # "keyword" scopes the vector search to chunks containing the intent's
+    # keyword; "hybrid" fuses BM25 over the in-memory keyword index with a
+    # vector search over the whole collection (needs KEYWORD_INDEX_ENABLED)
+    RETRIEVAL_MODE: Literal["keyword", "hybrid"] = "keyword"
+    # Candidates taken from each hybrid retriever, and the rank fusion constant
+    HYBRID_CANDIDATES: int = 50
+    RRF_K: int = 60
+    # Narrow the hits down before they go into the LLM prompt: drop hits
+    # scoring CONTEXT_SCORE_MARGIN below the best one, then pick up to
+    # CONTEXT_MAX_CHUNKS by maximal marginal relevance (CONTEXT_MMR_LAMBDA
+    # weighs relevance against novelty), skipping near-identical hits
+    CONTEXT_SELECTION: bool = True
+    CONTEXT_MAX_CHUNKS: int = 6
+    CONTEXT_MMR_LAMBDA: float = 0.7
+    CONTEXT_SCORE_MARGIN: float = 0.15
+    CONTEXT_DUPLICATE_SIMILARITY: float = 0.95
     MIN_CHARS_PER_CHUNK: int = 200
 
     # Similarity score threshold (cosine similarity; higher is more similar)
@@ -24,22 +60,103 @@ class Settings(BaseSettings):
 
     # Qdrant settings
     QDRANT_PATH: str
+    # Qdrant server to use instead of the local storage at QDRANT_PATH
+    QDRANT_URL: Optional[str] = None
     QDRANT_COLLECTION_NAME: str = "openai_docs"
+    # Threads running vector store calls off the event loop
+    QDRANT_MAX_WORKERS: int = 4
+    # Quantized copy of the vectors kept in RAM (Qdrant server only): "scalar"
+    # is int8 (4x smaller), "binary" one bit per dimension (32x smaller).
+    # Searches take OVERSAMPLING times more candidates from the quantized
+    # vectors and, with RESCORE, re-rank them on the originals (kept on disk)
+    QDRANT_QUANTIZATION: Literal["none", "scalar", "binary"] = "none"
+    QDRANT_QUANTIZATION_OVERSAMPLING: float = 2.0
+    QDRANT_QUANTIZATION_RESCORE: bool = True
+    # "numpy" keeps the vectors in a memory-mapped matrix under NUMPY_STORE_PATH
+    # and searches by brute force instead of Qdrant; fast for up to a few
+    # hundred thousand chunks. Switching needs a full re-ingestion
+    VECTOR_BACKEND: Literal["qdrant", "numpy"] = "qdrant"
+    NUMPY_STORE_PATH: str = "./local-shared-data/numpy_vectors"
+    NUMPY_STORE_FLOAT16: bool = False  # halves memory, ~1e-3 score precision loss
 
     # Document loader settings
     DOCUMENT_LOADER_DIR: str
+    LOADER_WORKERS: int = 8  # threads reading and parsing JSON files
+
+    # Ingestion mode on startup:
+    # "incremental" keeps Postgres and Qdrant and only re-ingests files whose
+    # content hash changed; "full" drops everything and rebuilds from scratch
+    INGESTION_MODE: Literal["incremental", "full"] = "incremental"
+    JOB_PROGRESS_INTERVAL: float = 5.0  # seconds between job progress saves
+
+    # Re-ingest files as they are added, changed or removed in
+    # DOCUMENT_LOADER_DIR; events are batched until the directory is quiet
+    WATCH_DOCUMENTS: bool = False
+    WATCH_DEBOUNCE_SECONDS: float = 2.0
+    WATCH_MAX_DELAY_SECONDS: float = 30.0  # flush a long burst at the latest
+
+    # Re-indexing of edited documents (reindex_outbox table)
+    REINDEX_POLL_INTERVAL: float = 5.0  # seconds between outbox polls
+    REINDEX_BATCH_SIZE: int = 50  # outbox rows handled per poll
+    REINDEX_MAX_ATTEMPTS: int = 5  # failed rows are retried up to this many times
 
     # Document chunking settings
     CHUNK_SIZE: int = 1200
     CHUNK_OVERLAP: int = 200
+    # Where chunking runs: "inline" on the event loop, or sharded across a
+    # "thread" or "process" pool of CHUNKING_WORKERS workers
+    CHUNKING_EXECUTOR: Literal["inline", "thread", "process"] = "inline"
+    CHUNKING_WORKERS: int = os.cpu_count() or 1
+
+    # Chunks repeated across documents (nav blocks, footers, shared snippets)
+    # are embedded once and share one Qdrant point; exact copies after
+    # whitespace and case normalization only. DEDUP_NEAR_DUPLICATES also
+    # shares the point of a MinHash/LSH near-duplicate, whose own text is
+    # then never embedded, so it is lossy and off by default
+    DEDUP_ENABLED: bool = True
+    DEDUP_NEAR_DUPLICATES: bool = False
+    DEDUP_NEAR_THRESHOLD: float = 0.9  # estimated Jaccard similarity
+    DEDUP_NUM_PERM: int = 128
+    DEDUP_LSH_BANDS: int = 16
 
     # Embedding settings
     EMBEDDING_MODEL: str = "text-embedding-3-small"
-    EMBEDDING_BATCH_SIZE: int = 128
+    # Embedding requests are packed up to EMBEDDING_BATCH_TOKENS tokens and
+    # EMBEDDING_BATCH_SIZE texts (the API allows 300k tokens / 2048 inputs),
+    # with up to EMBEDDING_MAX_CONCURRENCY requests in flight (also the
+    # number of embed workers of the streaming pipeline)
+    EMBEDDING_BATCH_SIZE: int = 2048
+    EMBEDDING_BATCH_TOKENS: int = 100_000
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+
+    # Embedding cache settings (on-disk, keyed by model + dimension + text hash).
+    # The file is created on the first embedding request, next to QDRANT_PATH
+    # in the gitignored local-shared-data directory
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "./local-shared-data/embedding_cache.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 500_000
+    EMBEDDING_CACHE_FLOAT16: bool = False  # halves disk use, ~1e-3 precision loss
+
+    # In-process LRU of query vectors, in front of the on-disk cache above
+    QUERY_EMBEDDING_CACHE_ENABLED: bool = True
+    QUERY_EMBEDDING_CACHE_MAX_ENTRIES: int = 2048
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS: float = 3600  # 0 never expires
 
     # Vector store settings
-    VECTOR_DIMENSION: int = 1536  # text-embedding-3-small dimension
-    INGESTION_BATCH_SIZE: int = 128
+    # Size of the stored vectors; text-embedding-3 models return shortened
+    # vectors below their full size (1536 for -small, 3072 for -large), which
+    # cuts storage and search cost in proportion. Changing it needs a full
+    # re-ingestion (INGESTION_MODE=full)
+    VECTOR_DIMENSION: int = 1536
+
+    # Streaming ingestion pipeline (load -> chunk -> embed -> store)
+    PIPELINE_QUEUE_SIZE: int = 8  # max items waiting between two stages
+    PIPELINE_DOC_BATCH_SIZE: int = 32  # documents chunked and written together
+    PIPELINE_CHUNK_WORKERS: int = 2
+    PIPELINE_WRITE_WORKERS: int = 2
+    # Completed files are recorded in the manifest in groups of this size, so
+    # an interrupted run resumes after them
+    PIPELINE_CHECKPOINT_FILES: int = 20
 
     # API settings
     OPENAPI_URL: str = "/openapi.json"
@@ -1,3 +1,26 @@
-from .ingest import chunk_documents, ingest_to_qdrant, load_documents_from_dir
+from .ingest import (
+    LoadResult,
+    chunk_documents,
+    ingest_to_qdrant,
+    iter_load_results,
+    load_documents_from_dir,
+    load_documents_from_files,
+    stream_documents_from_files,
+)
+from .pipeline import IngestionPipeline, PipelineStats
+from .sync import rebuild_index, sync_files, sync_index
 
-__all__ = ["load_documents_from_dir", "chunk_documents", "ingest_to_qdrant"]
+__all__ = [
+    "LoadResult",
+    "iter_load_results",
+    "stream_documents_from_files",
+    "load_documents_from_dir",
+    "load_documents_from_files",
+    "chunk_documents",
+    "ingest_to_qdrant",
+    "IngestionPipeline",
+    "PipelineStats",
+    "rebuild_index",
+    "sync_index",
+    "sync_files",
+]
@@ -0,0 +1,132 @@
+import hashlib
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from app.config import settings
+from langchain.schema import Document
+
+# Mersenne prime above the 32-bit shingle hashes, for the MinHash permutations
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD = re.compile(r"\w+")
+SHINGLE_WORDS = 3
+
+
+@dataclass
+class DedupStats:
+    chunks: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+
+    @property
+    def duplicates(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class ChunkDeduplicator:
+    """
+    Finds chunks whose text was already seen in this ingestion run.
+
+    Exact copies (after whitespace and case normalization) are matched by
+    hash. With a threshold below 1, near-duplicates are also found with
+    MinHash over word shingles and LSH banding, then confirmed by their
+    estimated Jaccard similarity.
+    Every chunk gets a `vector_id` in its metadata: its own chunk_id, or
+    the chunk_id of the first copy whose vector it shares.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        num_perm: int = settings.DEDUP_NUM_PERM,
+        bands: int = settings.DEDUP_LSH_BANDS,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError("DEDUP_NUM_PERM must be a multiple of DEDUP_LSH_BANDS")
+        if threshold is None:
+            # Near-duplicate sharing is opt-in, 1 keeps exact matches only
+            threshold = (
+                settings.DEDUP_NEAR_THRESHOLD if settings.DEDUP_NEAR_DUPLICATES else 1.0
+            )
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 29, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 29, size=num_perm, dtype=np.uint64)
+
+        self._exact: Dict[str, str] = {}
+        self._buckets: Dict[int, Dict[bytes, List[str]]] = defaultdict(dict)
+        self._signatures: Dict[str, np.ndarray] = {}
+        self.stats = DedupStats()
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        words = _WORD.findall(text)
+        if len(words) < SHINGLE_WORDS:
+            return None
+        hashes = np.fromiter(
+            {
+                zlib.crc32(" ".join(words[i : i + SHINGLE_WORDS]).encode())
+                for i in range(len(words) - SHINGLE_WORDS + 1)
+            },
+            dtype=np.uint64,
+        )
+        # a * h + b stays below 2**62, so uint64 arithmetic cannot overflow
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        return [
+            sig[i * self.rows : (i + 1) * self.rows].tobytes()
+            for i in range(self.bands)
+        ]
+
+    def _find_similar(self, sig: np.ndarray, keys: List[bytes]) -> Optional[str]:
+        for band, key in enumerate(keys):
+            for candidate in self._buckets[band].get(key, ()):
+                similarity = np.mean(self._signatures[candidate] == sig)
+                if similarity >= self.threshold:
+                    return candidate
+        return None
+
+    def assign(self, chunks: List[Document]) -> List[Document]:
+        """Set `vector_id` on every chunk and return the ones to embed"""
+        unique = []
+        for chunk in chunks:
+            chunk_id = chunk.metadata["chunk_id"]
+            self.stats.chunks += 1
+
+            digest = hashlib.sha256(normalize(chunk.page_content).encode()).hexdigest()
+            source = self._exact.get(digest)
+            if source is not None:
+                chunk.metadata["vector_id"] = source
+                self.stats.exact_duplicates += 1
+                continue
+
+            sig = None
+            if self.threshold < 1:
+                sig = self.signature(chunk.page_content)
+            if sig is not None:
+                keys = self._band_keys(sig)
+                source = self._find_similar(sig, keys)
+                if source is not None:
+                    chunk.metadata["vector_id"] = source
+                    self.stats.near_duplicates += 1
+                    continue
+                self._signatures[chunk_id] = sig
+                for band, key in enumerate(keys):
+                    self._buckets[band].setdefault(key, []).append(chunk_id)
+
+            self._exact[digest] = chunk_id
+            chunk.metadata["vector_id"] = chunk_id
+            unique.append(chunk)
+        return unique
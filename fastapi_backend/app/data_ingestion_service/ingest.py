@@ -1,173 +1,327 @@
+import asyncio
 import datetime
-import json
+import hashlib
+import multiprocessing
+import re
 import uuid
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
+from typing import AsyncIterator, Deque, Iterable, List, Optional, Tuple
 
+import orjson
 from app.config import settings
+from app.embeddings import count_tokens, get_embeddings, pack_by_tokens
 from app.utils import logger_error, logger_info
+from app.vector_store import ensure_collection, run_vector_op, upsert_chunks
 from langchain.schema import Document
 from langchain.text_splitter import (
     MarkdownHeaderTextSplitter,
     RecursiveCharacterTextSplitter,
 )
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
+from langchain_core.embeddings import Embeddings
+
+from .manifest import document_id_for
 
 # === Config ===
 DOCS_DIR = settings.DOCUMENT_LOADER_DIR
-QDRANT_COLLECTION_NAME = settings.QDRANT_COLLECTION_NAME
 
 
 # === Step 1: Load and Parse JSON Files ===
+@dataclass
+class LoadResult:
+    """Outcome of loading one source file"""
+
+    file_path: str
+    document: Optional[Document] = None
+    skipped: Optional[str] = None  # reason the file produced no document
+    error: Optional[str] = None
+
+
+def load_document(file: Path) -> LoadResult:
+    """Read and parse one JSON file (blocking, runs on the loader thread pool)"""
+    try:
+        raw = file.read_bytes()
+        stat = file.stat()
+        data = orjson.loads(raw)
+        markdown = data.get("markdown", "")
+        metadata = data.get("metadata", {})
+
+        if metadata.get("language", "en") != "en":
+            return LoadResult(str(file), skipped="non-English")
+        if not markdown.strip():
+            return LoadResult(str(file), skipped="empty")
+
+        metadata.update(
+            {
+                "file_path": str(file),
+                "file_size": stat.st_size,
+                "last_modified": datetime.datetime.fromtimestamp(stat.st_mtime),
+                "title": metadata.get("title") or file.stem.replace("_", " ").title(),
+                "doc_id": document_id_for(file),
+                "version": datetime.datetime.now().isoformat(),
+                "source_url": metadata.get("sourceURL", "unknown"),
+            }
+        )
+        return LoadResult(
+            str(file), document=Document(page_content=markdown, metadata=metadata)
+        )
+    except Exception as e:
+        return LoadResult(str(file), error=f"{type(e).__name__}: {e}")
+
+
+async def iter_load_results(
+    files: Iterable[Path], workers: int = settings.LOADER_WORKERS
+) -> AsyncIterator[LoadResult]:
+    """
+    Load files concurrently on a thread pool, yielding results in input order.
+
+    At most `workers * 2` files are in flight, so memory stays bounded no
+    matter how large the directory is.
+    """
+    loop = asyncio.get_running_loop()
+    pending: Deque[asyncio.Future] = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for file in files:
+            pending.append(loop.run_in_executor(pool, load_document, file))
+            if len(pending) >= workers * 2:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+
+
+async def stream_documents_from_files(
+    files: Iterable[Path],
+) -> AsyncIterator[Document]:
+    async for result in iter_load_results(files):
+        if result.error:
+            logger_error.error(f"Error reading {result.file_path}: {result.error}")
+        elif result.document is not None:
+            yield result.document
+
+
 async def load_documents_from_dir(directory: str):
-    docs = []
-    for file in Path(directory).glob("*.json"):
-        try:
-            data = json.loads(file.read_text(encoding="utf-8"))
-            markdown = data.get("markdown", "")
-            metadata = data.get("metadata", {})
-
-            if metadata.get("language", "en") != "en" or not markdown.strip():
-                continue  # Skip non-English or empty docs
-            doc_id = str(uuid.uuid5(uuid.NAMESPACE_URL, str(file.resolve())))
-            metadata.update(
-                {
-                    "file_path": (
-                        str(file) if file else metadata.get("sourceURL", "unknown")
-                    ),
-                    "file_size": (
-                        file.stat().st_size
-                        if file
-                        else metadata.get("fileSize", "unknown")
-                    ),
-                    "last_modified": (
-                        datetime.datetime.fromtimestamp(file.stat().st_mtime)
-                        if file
-                        else None
-                    ),
-                    "title": (
-                        metadata.get("title") or file.stem.replace("_", " ").title()
-                        if file
-                        else "Untitled"
-                    ),
-                    "doc_id": doc_id,
-                    "version": datetime.datetime.now().isoformat(),
-                    "source_url": metadata.get("sourceURL", "unknown"),
-                }
-            )
+    return await load_documents_from_files(Path(directory).glob("*.json"))
+
 
-            docs.append(Document(page_content=markdown, metadata=metadata))
-        except Exception as e:
-            print(f"Error reading {file}: {e}")
-    return docs
+async def load_documents_from_files(files: Iterable[Path]):
+    return [doc async for doc in stream_documents_from_files(files)]
 
 
 # === Step 2: Chunk Text ===
-async def chunk_documents(docs):
-    all_chunks = []
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1d3c2e-8f4b-5a7e-9c0d-2b1e4f6a8d3c")
+HEADER_KEYS = ("h1", "h2", "h3")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_chunk_id(doc_id: str, section_path: str, offset: int, digest: str) -> str:
+    """
+    Deterministic chunk id, also used as the Qdrant point id.
+
+    The offset is relative to the header section, so editing one section
+    does not change the ids of chunks in the other sections.
+    """
+    key = f"{doc_id}|{section_path}|{offset}|{digest}"
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, key))
 
-    # Step 1: Setup splitters
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def locate_chunk(text: str, source: str, cursor: int) -> Optional[Tuple[int, int]]:
+    """
+    Character span of a chunk in its parent document, searching from `cursor`.
+
+    The header splitter strips and re-joins lines, so the chunk is matched
+    by its first and last line and the span is checked ignoring whitespace.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return None
+    start = source.find(lines[0], cursor)
+    if start < 0:
+        return None
+    end = source.find(lines[-1], start)
+    if end < 0:
+        return None
+    end += len(lines[-1])
+    if _WHITESPACE.sub("", source[start:end]) != _WHITESPACE.sub("", text):
+        return None
+    return start, end
+
+
+@lru_cache(maxsize=4)
+def _get_splitters(chunk_size: int, chunk_overlap: int):
     header_splitter = MarkdownHeaderTextSplitter(
         headers_to_split_on=[("#", "h1"), ("##", "h2"), ("###", "h3")]
     )
     recursive_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=settings.CHUNK_SIZE,
-        chunk_overlap=settings.CHUNK_OVERLAP,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
         separators=["\n\n", "\n", ". ", " ", ""],
+        add_start_index=True,
     )
+    return header_splitter, recursive_splitter
 
-    # Step 2: Split each document
-    for doc in docs:
-        header_chunks = header_splitter.split_text(doc.page_content)
-
-        for chunk in header_chunks:
-            # Step 2a: Start with a copy of original doc metadata
-            base_metadata = doc.metadata.copy()
-            base_metadata.update(
-                chunk.metadata
-            )  # If header_splitter added section info
-
-            content = chunk.page_content
-            # Split only when exceeding configured chunk size
-            if len(content) > settings.CHUNK_SIZE:
-                sub_chunks = recursive_splitter.split_text(content)
-                for idx, sub in enumerate(sub_chunks):
-                    metadata = base_metadata.copy()
-                    metadata["chunk_id"] = str(uuid.uuid4())
-                    metadata["chunk_index"] = idx
-                    metadata["chunk_type"] = "recursive"
-                    all_chunks.append(Document(page_content=sub, metadata=metadata))
-            else:
-                base_metadata["chunk_id"] = str(uuid.uuid4())
-                base_metadata["chunk_index"] = 0
-                base_metadata["chunk_type"] = "header"
-                all_chunks.append(
-                    Document(page_content=content, metadata=base_metadata)
-                )
-
-    return all_chunks
 
+def split_document(doc: Document, chunk_size: int, chunk_overlap: int):
+    """Split one document into chunks (pure CPU work, safe to run in a worker)"""
+    header_splitter, recursive_splitter = _get_splitters(chunk_size, chunk_overlap)
+    chunks = []
 
-# === Step 3: Embed & Store in Qdrant ===
-async def ingest_to_qdrant(docs):
-    logger_info.info(f"Processing {len(docs)} document chunks...")
+    header_chunks = header_splitter.split_text(doc.page_content)
+    # Identical sections with the same path would collide on their id
+    seen_keys = set()
+    # Chunks come in document order, so each one is searched after the last
+    cursor = 0
 
-    # Initialize embeddings with batch processing
-    embeddings = OpenAIEmbeddings(
-        model=settings.EMBEDDING_MODEL,
-        openai_api_key=settings.OPENAI_API_KEY,
-        chunk_size=settings.EMBEDDING_BATCH_SIZE,
-    )
+    for chunk in header_chunks:
+        # Start with a copy of original doc metadata
+        base_metadata = doc.metadata.copy()
+        base_metadata.update(chunk.metadata)  # If header_splitter added section info
+        section_path = " > ".join(
+            chunk.metadata[key] for key in HEADER_KEYS if key in chunk.metadata
+        )
+        base_metadata["section_path"] = section_path
 
-    # Initialize Qdrant client with local file storage
-    qdrant_path = Path(settings.QDRANT_PATH)
-    qdrant_path.mkdir(parents=True, exist_ok=True)
+        content = chunk.page_content
+        # Split only when exceeding configured chunk size
+        if len(content) > chunk_size:
+            sub_chunks = recursive_splitter.create_documents([content])
+            pieces = [
+                (sub.page_content, sub.metadata["start_index"], "recursive")
+                for sub in sub_chunks
+            ]
+        else:
+            pieces = [(content, 0, "header")]
 
-    client = QdrantClient(path=str(qdrant_path))
+        for idx, (text, offset, chunk_type) in enumerate(pieces):
+            digest = content_hash(text)
+            key = (section_path, offset, digest)
+            occurrence = 0
+            while (*key, occurrence) in seen_keys:
+                occurrence += 1
+            seen_keys.add((*key, occurrence))
 
-    # Create collection if it doesn't exist
-    try:
-        client.get_collection(QDRANT_COLLECTION_NAME)
-        logger_info.info(f"Collection '{QDRANT_COLLECTION_NAME}' already exists")
-    except Exception:
-        client.create_collection(
-            collection_name=QDRANT_COLLECTION_NAME,
-            vectors_config=VectorParams(
-                size=settings.VECTOR_DIMENSION, distance=Distance.COSINE
-            ),
-        )
-        logger_info.info(f"Created collection '{QDRANT_COLLECTION_NAME}'")
+            metadata = base_metadata.copy()
+            metadata["chunk_id"] = make_chunk_id(
+                doc.metadata["doc_id"],
+                section_path if not occurrence else f"{section_path}#{occurrence}",
+                offset,
+                digest,
+            )
+            metadata["chunk_index"] = idx
+            metadata["chunk_type"] = chunk_type
+            metadata["content_hash"] = digest
+
+            span = locate_chunk(text, doc.page_content, cursor)
+            if span is not None:
+                cursor = span[0]
+            metadata["start_offset"], metadata["end_offset"] = span or (None, None)
+            chunks.append(Document(page_content=text, metadata=metadata))
+
+    return chunks
 
-    # Initialize vector store
-    vector_store = QdrantVectorStore(
-        client=client,
-        collection_name=QDRANT_COLLECTION_NAME,
-        embedding=embeddings,
-    )
 
-    # Flatten metadata to ensure top-level payload
-    flattened_docs = []
-    # chunk_id_log_path = Path("chunk_ids.txt")
-    for doc in docs:
-        flat_metadata = {**doc.metadata}  # ensure no nested 'metadata' inside
-        chunk_id = flat_metadata.get("chunk_id")
-        if not chunk_id:
-            logger_error.error("Missing chunk_id in document metadata!")
-        flattened_docs.append(
-            Document(page_content=doc.page_content, metadata=flat_metadata)
+def _split_shard(docs: List[Document], chunk_size: int, chunk_overlap: int):
+    return [
+        chunk
+        for doc in docs
+        for chunk in split_document(doc, chunk_size, chunk_overlap)
+    ]
+
+
+_chunking_pool: Optional[Executor] = None
+
+
+def _get_chunking_pool() -> Executor:
+    global _chunking_pool
+    if _chunking_pool is None:
+        if settings.CHUNKING_EXECUTOR == "process":
+            # spawn: forking a process that runs an event loop and threads
+            # is not safe
+            _chunking_pool = ProcessPoolExecutor(
+                max_workers=settings.CHUNKING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            _chunking_pool = ThreadPoolExecutor(max_workers=settings.CHUNKING_WORKERS)
+    return _chunking_pool
+
+
+async def chunk_documents(docs):
+    """
+    Split documents into chunks.
+
+    With CHUNKING_EXECUTOR "process" (or "thread") the documents are sharded
+    across a worker pool; shards are merged back in input order, so the
+    output is identical to the inline mode.
+    """
+    docs = list(docs)
+    args = (settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+    if settings.CHUNKING_EXECUTOR == "inline" or len(docs) < 2:
+        return _split_shard(docs, *args)
+
+    # Several shards per worker keep the pool busy when documents vary in size
+    shard_count = min(len(docs), settings.CHUNKING_WORKERS * 4)
+    shard_size = -(-len(docs) // shard_count)
+    loop = asyncio.get_running_loop()
+    pool = _get_chunking_pool()
+    shards = await asyncio.gather(
+        *(
+            loop.run_in_executor(pool, _split_shard, docs[i : i + shard_size], *args)
+            for i in range(0, len(docs), shard_size)
         )
+    )
+    return [chunk for shard in shards for chunk in shard]
+
+
+# === Step 3: Embed & Store in Qdrant ===
+async def ingest_to_qdrant(docs, embeddings: Optional[Embeddings] = None):
+    logger_info.info(f"Processing {len(docs)} document chunks...")
+
+    if embeddings is None:
+        # Batches are packed below, the embeddings must not split them again
+        embeddings = get_embeddings(token_batching=False)
 
-    # Add documents to the vector store in batches
-    for i in range(0, len(flattened_docs), settings.INGESTION_BATCH_SIZE):
-        batch = flattened_docs[i : i + settings.INGESTION_BATCH_SIZE]
-        # logger_info.info("Ingesting chunk_ids:")
-        # for doc in batch:
-        #    logger_info.info(f"  - {doc.metadata.get('chunk_id')}")
-        vector_store.add_documents(batch)
+    await run_vector_op(ensure_collection)
+
+    missing = [doc for doc in docs if not doc.metadata.get("chunk_id")]
+    if missing:
+        logger_error.error(f"Skipping {len(missing)} chunks without chunk_id!")
+        docs = [doc for doc in docs if doc.metadata.get("chunk_id")]
+
+    # Each batch fills one embedding request up to the token budget; batches
+    # are embedded concurrently and upserted as they complete. Points are
+    # keyed by chunk_id, so re-running the same content overwrites them
+    token_counts = await asyncio.to_thread(
+        count_tokens, [doc.page_content for doc in docs], settings.EMBEDDING_MODEL
+    )
+    batches = pack_by_tokens(
+        token_counts, settings.EMBEDDING_BATCH_TOKENS, settings.EMBEDDING_BATCH_SIZE
+    )
+    semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+    # Qdrant local mode is not safe for concurrent writers
+    qdrant_lock = asyncio.Lock()
+
+    async def process(number: int, batch: range):
+        chunks = [docs[i] for i in batch]
+        async with semaphore:
+            vectors = await embeddings.aembed_documents(
+                [chunk.page_content for chunk in chunks]
+            )
+        async with qdrant_lock:
+            await run_vector_op(upsert_chunks, chunks, vectors)
         logger_info.info(
-            f"Processed batch {i//settings.INGESTION_BATCH_SIZE + 1}/{(len(flattened_docs) + settings.INGESTION_BATCH_SIZE - 1)//settings.INGESTION_BATCH_SIZE} ({len(batch)} chunks)"
+            f"Processed batch {number}/{len(batches)} ({len(chunks)} chunks, "
+            f"{sum(token_counts[i] for i in batch)} tokens)"
         )
 
-    print(f"Ingested {len(flattened_docs)} chunks into Qdrant!")
+    await asyncio.gather(*(process(n, b) for n, b in enumerate(batches, 1)))
+
+    print(f"Ingested {len(docs)} chunks into Qdrant!")
@@ -0,0 +1,172 @@
+import asyncio
+import datetime
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.database import clear_existing_data, create_ingestion_job, update_ingestion_job
+from app.models import IngestionJob, JobStatus
+from app.utils import logger_error, logger_info
+
+from .pipeline import PipelineStats
+from .sync import rebuild_index, sync_files, sync_index
+
+
+class IngestionJobConflict(Exception):
+    """Raised when a job is requested while another one is running"""
+
+
+@dataclass
+class RunningJob:
+    job_id: int
+    stats: PipelineStats
+    started: float
+    task: Optional[asyncio.Task] = None
+
+
+class IngestionJobRunner:
+    """
+    Runs ingestion as a background task, one job at a time.
+
+    Progress lives in the job's PipelineStats while it runs and is flushed
+    to the `ingestion_jobs` table every JOB_PROGRESS_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.current: Optional[RunningJob] = None
+        # Set once a job has completed, so readiness does not depend on it
+        # being the first run
+        self.completed_once = False
+        self._start_lock = asyncio.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self.current is not None
+
+    async def start(
+        self,
+        mode: str,
+        trigger: str,
+        paths: Optional[List[Path]] = None,
+        resume: bool = False,
+    ) -> IngestionJob:
+        """
+        Start a job; `paths` limits an incremental job to those files.
+
+        With `resume`, a full job continues an interrupted rebuild from its
+        checkpoints instead of clearing the stores first.
+        """
+        async with self._start_lock:
+            if self.current is not None:
+                raise IngestionJobConflict(
+                    f"Ingestion job {self.current.job_id} is already running"
+                )
+            job = await create_ingestion_job(mode=mode, trigger=trigger)
+            running = RunningJob(
+                job_id=job.id, stats=PipelineStats(), started=time.perf_counter()
+            )
+            self.current = running
+            running.task = asyncio.create_task(self._run(running, mode, paths, resume))
+            return job
+
+    async def wait(self) -> None:
+        """Wait for the running job, if any, to finish"""
+        running = self.current
+        if running is not None and running.task is not None:
+            await asyncio.wait([running.task])
+
+    async def _run(
+        self,
+        running: RunningJob,
+        mode: str,
+        paths: Optional[List[Path]],
+        resume: bool,
+    ) -> None:
+        await update_ingestion_job(
+            running.job_id,
+            status=JobStatus.running,
+            started_at=datetime.datetime.utcnow(),
+        )
+        flusher = asyncio.create_task(self._flush_progress(running))
+        try:
+            if mode == "full" and resume:
+                logger_info.info("Resuming the interrupted full rebuild")
+                await sync_index(settings.DOCUMENT_LOADER_DIR, running.stats)
+            elif mode == "full":
+                await clear_existing_data()
+                await rebuild_index(settings.DOCUMENT_LOADER_DIR, running.stats)
+            elif paths is not None:
+                await sync_files(paths, running.stats)
+            else:
+                await sync_index(settings.DOCUMENT_LOADER_DIR, running.stats)
+        except Exception as e:
+            logger_error.error(f"Ingestion job {running.job_id} failed: {e}")
+            await update_ingestion_job(
+                running.job_id,
+                status=JobStatus.failed,
+                error=str(e),
+                finished_at=datetime.datetime.utcnow(),
+                **self._progress_values(running.stats),
+            )
+        else:
+            logger_info.info(f"Ingestion job {running.job_id} finished")
+            failed = running.stats.failed_files
+            await update_ingestion_job(
+                running.job_id,
+                status=JobStatus.succeeded,
+                error=(
+                    f"{len(failed)} files could not be read: {', '.join(failed[:10])}"
+                    if failed
+                    else None
+                ),
+                finished_at=datetime.datetime.utcnow(),
+                **self._progress_values(running.stats),
+            )
+            self.completed_once = True
+        finally:
+            flusher.cancel()
+            self.current = None
+
+    async def _flush_progress(self, running: RunningJob) -> None:
+        while True:
+            await asyncio.sleep(settings.JOB_PROGRESS_INTERVAL)
+            try:
+                await update_ingestion_job(
+                    running.job_id, **self._progress_values(running.stats)
+                )
+            except Exception as e:
+                logger_error.error(f"Could not save job progress: {e}")
+
+    @staticmethod
+    def _progress_values(stats: PipelineStats) -> Dict[str, int]:
+        return {
+            "files_total": stats.files_total,
+            "files_done": stats.files_done,
+            "documents_done": stats.documents,
+            "chunks_done": stats.chunks,
+            "batches_done": stats.batches,
+            "duplicates_done": stats.dedup.duplicates,
+        }
+
+    def live_progress(self, job_id: int) -> Optional[Dict]:
+        """Up-to-date counters, throughput and ETA of the running job"""
+        running = self.current
+        if running is None or running.job_id != job_id:
+            return None
+        stats = running.stats
+        elapsed = time.perf_counter() - running.started
+        eta = None
+        if stats.files_done and stats.files_total:
+            remaining = stats.files_total - stats.files_done
+            eta = remaining * elapsed / stats.files_done
+        return {
+            **self._progress_values(stats),
+            "throughput_chunks_per_sec": stats.chunks / elapsed if elapsed else 0.0,
+            "eta_seconds": eta,
+        }
+
+
+# Global instance
+job_runner = IngestionJobRunner()
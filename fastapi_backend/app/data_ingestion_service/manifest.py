@@ -0,0 +1,102 @@
+import hashlib
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+HASH_READ_SIZE = 1024 * 1024
+
+
+@dataclass
+class SourceFile:
+    """A JSON file found in the document loader directory"""
+
+    path: Path
+    content_hash: str
+    file_size: int
+
+    @property
+    def key(self) -> str:
+        return str(self.path.resolve())
+
+    @property
+    def doc_id(self) -> str:
+        return document_id_for(self.path)
+
+
+@dataclass
+class ManifestDiff:
+    """Difference between the files on disk and the stored ingestion manifest"""
+
+    added: List[SourceFile] = field(default_factory=list)
+    changed: List[SourceFile] = field(default_factory=list)
+    unchanged: List[SourceFile] = field(default_factory=list)
+    # Manifest keys (resolved file paths) mapped to the doc_id they produced
+    removed: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def to_ingest(self) -> List[SourceFile]:
+        return self.added + self.changed
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+
+def document_id_for(path: Path) -> str:
+    """Stable doc_id for a source file, derived from its absolute path"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, str(path.resolve())))
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while block := f.read(HASH_READ_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_file(path: Path) -> SourceFile:
+    return SourceFile(
+        path=path, content_hash=hash_file(path), file_size=path.stat().st_size
+    )
+
+
+def scan_directory(directory: str) -> List[SourceFile]:
+    """Hash every JSON file in the directory (blocking, run it in a thread)"""
+    return [_source_file(path) for path in sorted(Path(directory).glob("*.json"))]
+
+
+def scan_files(paths: Iterable[Path]) -> List[SourceFile]:
+    """Hash the given files, skipping the ones no longer on disk"""
+    files = []
+    for path in sorted(set(paths)):
+        try:
+            files.append(_source_file(path))
+        except FileNotFoundError:
+            continue
+    return files
+
+
+def diff_manifest(files: List[SourceFile], manifest: Dict[str, str]) -> ManifestDiff:
+    """
+    Compare scanned files against the stored manifest.
+
+    `manifest` maps each previously ingested file key to its content hash.
+    """
+    diff = ManifestDiff()
+    seen = set()
+    for source in files:
+        seen.add(source.key)
+        stored_hash = manifest.get(source.key)
+        if stored_hash is None:
+            diff.added.append(source)
+        elif stored_hash != source.content_hash:
+            diff.changed.append(source)
+        else:
+            diff.unchanged.append(source)
+
+    for key in manifest:
+        if key not in seen:
+            diff.removed[key] = document_id_for(Path(key))
+    return diff
@@ -0,0 +1,314 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from app.config import settings
+from app.database import (
+    AsyncSessionLocal,
+    save_chunks_to_postgres,
+    save_documents_to_postgres,
+)
+from app.embeddings import count_tokens, get_embeddings, pack_by_tokens
+from app.utils import logger_error, logger_info
+from app.vector_store import ensure_collection, run_vector_op, upsert_chunks
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+from .dedup import ChunkDeduplicator, DedupStats
+from .ingest import chunk_documents, iter_load_results
+
+# Marks the end of a queue; one is sent per consumer
+_DONE = object()
+
+CheckpointHandler = Callable[[List[str]], Awaitable[None]]
+
+
+@dataclass
+class PipelineStats:
+    files_total: int = 0
+    files_done: int = 0
+    # Files that could not be read; left out of the manifest to be retried
+    failed_files: List[str] = field(default_factory=list)
+    documents: int = 0
+    chunks: int = 0
+    batches: int = 0
+    doc_ids: Set[str] = field(default_factory=set)
+    dedup: DedupStats = field(default_factory=DedupStats)
+    # Time each stage spent working (summed over its workers)
+    stage_seconds: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    elapsed: float = 0.0
+
+
+class IngestionPipeline:
+    """
+    Streaming ingestion: load -> chunk -> embed -> store.
+
+    Stages are connected by bounded queues, so memory depends on the queue
+    depth rather than the corpus size, and embedding requests overlap with
+    the Postgres and Qdrant writes of earlier batches.
+
+    A file is complete once all of its chunks, and the points its duplicate
+    chunks share, are stored. Completed files are passed to `on_checkpoint`
+    every PIPELINE_CHECKPOINT_FILES files and when the run ends, even if it
+    failed, so an interrupted run can be resumed from there. Files that
+    could not be read are never complete, so the next run retries them.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = settings.PIPELINE_QUEUE_SIZE,
+        doc_batch_size: int = settings.PIPELINE_DOC_BATCH_SIZE,
+        chunk_workers: int = settings.PIPELINE_CHUNK_WORKERS,
+        embed_workers: int = settings.EMBEDDING_MAX_CONCURRENCY,
+        write_workers: int = settings.PIPELINE_WRITE_WORKERS,
+        stats: Optional[PipelineStats] = None,
+        embeddings: Optional[Embeddings] = None,
+        on_checkpoint: Optional[CheckpointHandler] = None,
+        checkpoint_files: int = settings.PIPELINE_CHECKPOINT_FILES,
+    ):
+        self.queue_size = queue_size
+        self.doc_batch_size = doc_batch_size
+        self.chunk_workers = chunk_workers
+        self.embed_workers = embed_workers
+        self.write_workers = write_workers
+        # The chunk stage packs the requests, so no second packing here
+        self.embeddings = embeddings or get_embeddings(token_batching=False)
+        # Callers may pass their own stats object to watch progress live
+        self.stats = stats if stats is not None else PipelineStats()
+        self.deduplicator = None
+        if settings.DEDUP_ENABLED:
+            self.deduplicator = ChunkDeduplicator()
+            self.stats.dedup = self.deduplicator.stats
+        # Qdrant local mode is not safe for concurrent writers
+        self._qdrant_lock = asyncio.Lock()
+
+        self.on_checkpoint = on_checkpoint
+        self.checkpoint_files = checkpoint_files
+        # Chunks and shared points each document still waits for
+        self._pending: Dict[str, int] = {}
+        self._doc_files: Dict[str, str] = {}
+        # Points queued for embedding -> documents whose duplicates use them
+        self._waiting: Dict[str, List[str]] = {}
+        self._completed: List[str] = []
+        # First embedding error; the stages drain and stop loading new work
+        self._error: Optional[Exception] = None
+
+    async def run(self, files: Iterable[Path]) -> PipelineStats:
+        started = time.perf_counter()
+        await run_vector_op(ensure_collection)
+
+        doc_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        embed_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(self._load(files, doc_queue))
+                chunkers = [
+                    group.create_task(self._chunk(doc_queue, embed_queue))
+                    for _ in range(self.chunk_workers)
+                ]
+                embedders = [
+                    group.create_task(self._embed(embed_queue, write_queue))
+                    for _ in range(self.embed_workers)
+                ]
+                for _ in range(self.write_workers):
+                    group.create_task(self._write(write_queue))
+
+                group.create_task(
+                    self._close_after(chunkers, embed_queue, self.embed_workers)
+                )
+                group.create_task(
+                    self._close_after(embedders, write_queue, self.write_workers)
+                )
+            if self._error is not None:
+                raise self._error
+        finally:
+            # Keep what was completed before a failure, for the next run
+            try:
+                await self._checkpoint(force=True)
+            except Exception as e:
+                logger_error.error(f"Could not save ingestion checkpoint: {e}")
+
+        self.stats.elapsed = time.perf_counter() - started
+        logger_info.info(
+            f"Pipeline ingested {self.stats.documents} documents, "
+            f"{self.stats.chunks} chunks in {self.stats.batches} batches "
+            f"({self.stats.elapsed:.1f}s)"
+        )
+        if self.stats.failed_files:
+            logger_error.error(
+                f"{len(self.stats.failed_files)} files could not be read and "
+                "will be retried by the next run"
+            )
+        dedup = self.stats.dedup
+        if dedup.duplicates:
+            logger_info.info(
+                f"Deduplication: {dedup.duplicates} of {dedup.chunks} chunks share "
+                f"a vector ({dedup.exact_duplicates} exact, "
+                f"{dedup.near_duplicates} near-duplicates)"
+            )
+        return self.stats
+
+    async def _close_after(self, tasks, queue: asyncio.Queue, consumers: int):
+        """Signal the next stage once every worker of this stage is done"""
+        await asyncio.gather(*tasks)
+        for _ in range(consumers):
+            await queue.put(_DONE)
+
+    async def _load(self, files: Iterable[Path], doc_queue: asyncio.Queue):
+        batch: List[Document] = []
+        async with aclosing(iter_load_results(files)) as results:
+            async for result in results:
+                if self._error is not None:
+                    break
+                self.stats.files_done += 1
+                if result.error:
+                    logger_error.error(
+                        f"Error reading {result.file_path}: {result.error}"
+                    )
+                    self.stats.failed_files.append(result.file_path)
+                    continue
+                if result.document is None:
+                    # Nothing to store, the file is complete already
+                    self._completed.append(result.file_path)
+                    continue
+                batch.append(result.document)
+                if len(batch) >= self.doc_batch_size:
+                    await doc_queue.put(batch)
+                    batch = []
+        if batch:
+            await doc_queue.put(batch)
+        for _ in range(self.chunk_workers):
+            await doc_queue.put(_DONE)
+
+    async def _chunk(self, doc_queue: asyncio.Queue, embed_queue: asyncio.Queue):
+        async with AsyncSessionLocal() as session:
+            while (docs := await doc_queue.get()) is not _DONE:
+                if self._error is not None:
+                    continue
+                started = time.perf_counter()
+                # Parent rows must exist before their chunks are written
+                await save_documents_to_postgres(docs, session)
+                chunks = await chunk_documents(docs)
+                self.stats.stage_seconds["chunk"] += time.perf_counter() - started
+
+                self.stats.documents += len(docs)
+                self.stats.doc_ids.update(doc.metadata["doc_id"] for doc in docs)
+                chunks = await self._deduplicate(docs, chunks, session)
+                # One queue item is one embedding request, packed by tokens
+                token_counts = await asyncio.to_thread(
+                    count_tokens,
+                    [chunk.page_content for chunk in chunks],
+                    settings.EMBEDDING_MODEL,
+                )
+                for batch in pack_by_tokens(
+                    token_counts,
+                    settings.EMBEDDING_BATCH_TOKENS,
+                    settings.EMBEDDING_BATCH_SIZE,
+                ):
+                    await embed_queue.put([chunks[i] for i in batch])
+                await self._checkpoint()
+
+    async def _deduplicate(
+        self, docs: List[Document], chunks: List[Document], session
+    ) -> List[Document]:
+        """Store duplicate chunks right away and return the ones to embed"""
+        unique = chunks
+        if self.deduplicator is not None:
+            started = time.perf_counter()
+            unique = self.deduplicator.assign(chunks)
+            self.stats.stage_seconds["dedup"] += time.perf_counter() - started
+        # Before any await, so other workers see which points are still queued
+        self._track(docs, chunks, unique)
+
+        duplicates = [c for c in chunks if self._shared_vector(c)]
+        if duplicates:
+            # Their vector is the one of the first copy, nothing to embed
+            await save_chunks_to_postgres(duplicates, session)
+            self.stats.chunks += len(duplicates)
+        for doc in docs:
+            self._release(doc.metadata["doc_id"])
+        return unique
+
+    @staticmethod
+    def _shared_vector(chunk: Document) -> Optional[str]:
+        """The point a duplicate chunk shares, None for chunks with their own"""
+        vector_id = chunk.metadata.get("vector_id", chunk.metadata["chunk_id"])
+        return vector_id if vector_id != chunk.metadata["chunk_id"] else None
+
+    def _track(self, docs: List[Document], chunks: List[Document], unique):
+        """Count what each document waits for before its file is complete"""
+        for doc in docs:
+            # One for the chunk rows written by the chunk stage
+            self._pending[doc.metadata["doc_id"]] = 1
+            self._doc_files[doc.metadata["doc_id"]] = doc.metadata["file_path"]
+        for chunk in unique:
+            self._pending[chunk.metadata["doc_id"]] += 1
+            self._waiting[chunk.metadata["chunk_id"]] = []
+        for chunk in chunks:
+            vector_id = self._shared_vector(chunk)
+            # Duplicates of a point that is not stored yet wait for it
+            if vector_id in self._waiting:
+                self._waiting[vector_id].append(chunk.metadata["doc_id"])
+                self._pending[chunk.metadata["doc_id"]] += 1
+
+    def _stored(self, batch: List[Document]) -> None:
+        for chunk in batch:
+            self._release(chunk.metadata["doc_id"])
+            for doc_id in self._waiting.pop(chunk.metadata["chunk_id"], []):
+                self._release(doc_id)
+
+    def _release(self, doc_id: str) -> None:
+        self._pending[doc_id] -= 1
+        if self._pending[doc_id] == 0:
+            del self._pending[doc_id]
+            self._completed.append(self._doc_files.pop(doc_id))
+
+    async def _checkpoint(self, force: bool = False) -> None:
+        if not self._completed or self.on_checkpoint is None:
+            return
+        if force or len(self._completed) >= self.checkpoint_files:
+            files, self._completed = self._completed, []
+            await self.on_checkpoint(files)
+
+    async def _embed(self, embed_queue: asyncio.Queue, write_queue: asyncio.Queue):
+        while (batch := await embed_queue.get()) is not _DONE:
+            if self._error is not None:
+                # Keep draining so the chunk stage is not blocked
+                continue
+            started = time.perf_counter()
+            try:
+                vectors = await self.embeddings.aembed_documents(
+                    [chunk.page_content for chunk in batch]
+                )
+            except Exception as e:
+                # Batches embedded so far are still written and checkpointed
+                logger_error.error(f"Embedding failed, stopping the pipeline: {e}")
+                self._error = e
+                continue
+            self.stats.stage_seconds["embed"] += time.perf_counter() - started
+            await write_queue.put((batch, vectors))
+
+    async def _write(self, write_queue: asyncio.Queue):
+        async with AsyncSessionLocal() as session:
+            while (item := await write_queue.get()) is not _DONE:
+                batch, vectors = item
+                started = time.perf_counter()
+                await save_chunks_to_postgres(batch, session)
+                async with self._qdrant_lock:
+                    await run_vector_op(upsert_chunks, batch, vectors)
+                self.stats.stage_seconds["write"] += time.perf_counter() - started
+
+                self.stats.chunks += len(batch)
+                self.stats.batches += 1
+                self._stored(batch)
+                await self._checkpoint()
+                logger_info.info(
+                    f"Stored batch {self.stats.batches} ({len(batch)} chunks, "
+                    f"{self.stats.chunks} total)"
+                )
@@ -0,0 +1,216 @@
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from app.config import settings
+from app.database import (
+    AsyncSessionLocal,
+    delete_chunks,
+    finish_reindex,
+    get_document_chunks,
+    get_pending_reindex,
+    save_chunks_to_postgres,
+    split_vector_ids_for_chunks,
+    update_chunk_positions,
+)
+from app.embeddings import get_embeddings
+from app.models import Document as DocumentRow
+from app.utils import logger_error, logger_info
+from app.vector_store import (
+    delete_points,
+    ensure_collection,
+    retrieve_chunks,
+    run_vector_op,
+    update_chunk_metadata,
+    upsert_chunks,
+)
+from langchain.schema import Document
+
+from .ingest import chunk_documents
+from .jobs import job_runner
+
+# Metadata set per chunk by split_document, the rest is shared by the document
+CHUNK_METADATA_KEYS = {
+    "chunk_id",
+    "chunk_index",
+    "chunk_type",
+    "content_hash",
+    "section_path",
+    "start_offset",
+    "end_offset",
+    "vector_id",
+    "h1",
+    "h2",
+    "h3",
+}
+POSITION_KEYS = ("chunk_index", "start_offset", "end_offset")
+
+
+@dataclass
+class ReindexResult:
+    embedded: int = 0
+    kept: int = 0
+    removed: int = 0
+
+
+def _document_metadata(row: DocumentRow, existing: List[Document]) -> Dict:
+    """Metadata of the source document, taken from one of its stored chunks"""
+    if existing:
+        metadata = {
+            k: v
+            for k, v in existing[0].metadata.items()
+            if k not in CHUNK_METADATA_KEYS
+        }
+    else:
+        metadata = {
+            "title": row.title,
+            "file_path": row.file_path,
+            "source_url": row.source_url,
+            "language": row.language,
+        }
+    metadata["doc_id"] = str(row.doc_id)
+    return metadata
+
+
+async def reindex_document(doc_id: UUID) -> ReindexResult:
+    """
+    Re-chunk an edited document and re-embed only the chunks that changed.
+
+    Chunk ids are derived from the section and content of each chunk, so
+    chunks whose text survived the edit keep their id and their vector;
+    only their position (chunk_index and offsets) is updated.
+    """
+    result = ReindexResult()
+    async with AsyncSessionLocal() as session:
+        row = await session.get(DocumentRow, doc_id)
+        if row is None:
+            return result
+        stored = await get_document_chunks(doc_id, session)
+
+        old = {str(chunk.chunk_id): chunk for chunk in stored}
+        # A shared point may belong to another document, only read an own one
+        own = [c for c in stored if c.vector_id in (None, c.chunk_id)]
+        existing = await run_vector_op(
+            retrieve_chunks, [str(c.chunk_id) for c in own[:1]]
+        )
+        source = Document(
+            page_content=row.content or "",
+            metadata=_document_metadata(row, existing),
+        )
+        chunks = await chunk_documents([source])
+
+        new_chunks = [c for c in chunks if c.metadata["chunk_id"] not in old]
+        removed = set(old) - {c.metadata["chunk_id"] for c in chunks}
+        moved = {}
+        for chunk in chunks:
+            stored_chunk = old.get(chunk.metadata["chunk_id"])
+            if stored_chunk is None:
+                continue
+            position = {key: chunk.metadata[key] for key in POSITION_KEYS}
+            if any(getattr(stored_chunk, key) != position[key] for key in position):
+                moved[chunk.metadata["chunk_id"]] = position
+
+        # Embed first, so a failed request leaves both stores untouched
+        vectors = []
+        if new_chunks:
+            embeddings = get_embeddings()
+            vectors = await embeddings.aembed_documents(
+                [chunk.page_content for chunk in new_chunks]
+            )
+
+        # Only chunks with a point of their own carry a payload to update
+        own_points = {
+            chunk_id: position
+            for chunk_id, position in moved.items()
+            if old[chunk_id].vector_id in (None, old[chunk_id].chunk_id)
+        }
+        # A removed chunk's point may still serve duplicates elsewhere
+        _, unused_points = await split_vector_ids_for_chunks(list(removed), session)
+
+        await run_vector_op(ensure_collection)
+        await run_vector_op(upsert_chunks, new_chunks, vectors)
+        await run_vector_op(update_chunk_metadata, own_points)
+        await run_vector_op(delete_points, unused_points)
+
+        await delete_chunks(list(removed), session)
+        await save_chunks_to_postgres(new_chunks, session)
+        await update_chunk_positions(moved, session)
+
+    result.embedded = len(new_chunks)
+    result.kept = len(chunks) - len(new_chunks)
+    result.removed = len(removed)
+    return result
+
+
+class ReindexWorker:
+    """
+    Drains the `reindex_outbox` table in the background.
+
+    Approved edits add a row in the same transaction as the new content;
+    the worker polls every REINDEX_POLL_INTERVAL seconds, or right away
+    when notified, and retries failed rows up to REINDEX_MAX_ATTEMPTS times.
+    """
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=settings.REINDEX_POLL_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                handled = await self.process_pending()
+                if handled >= settings.REINDEX_BATCH_SIZE:
+                    # More rows may be waiting, go on without sleeping
+                    self._wakeup.set()
+            except Exception as e:
+                logger_error.error(f"Re-index worker error: {e}")
+
+    async def process_pending(self) -> int:
+        """Re-index one batch of outbox rows; returns the number handled"""
+        # Ingestion jobs write the same stores, let them finish first
+        await job_runner.wait()
+
+        async with AsyncSessionLocal() as session:
+            rows = await get_pending_reindex(session, settings.REINDEX_BATCH_SIZE)
+            # Several edits of one document need a single re-index
+            by_document = defaultdict(list)
+            for row in rows:
+                by_document[row.doc_id].append(row.id)
+
+            for doc_id, outbox_ids in by_document.items():
+                try:
+                    result = await reindex_document(doc_id)
+                except Exception as e:
+                    logger_error.error(f"Re-indexing document {doc_id} failed: {e}")
+                    await finish_reindex(outbox_ids, session, error=str(e))
+                    continue
+                logger_info.info(
+                    f"Re-indexed document {doc_id}: {result.embedded} chunks "
+                    f"embedded, {result.kept} kept, {result.removed} removed"
+                )
+                await finish_reindex(outbox_ids, session)
+        return len(rows)
+
+
+# Global instance
+reindex_worker = ReindexWorker()
@@ -0,0 +1,152 @@
+import asyncio
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from app.database import (
+    AsyncSessionLocal,
+    delete_chunks_for_documents,
+    delete_documents,
+    forget_ingested_files,
+    get_ingestion_manifest,
+    record_ingested_files,
+    split_vector_ids_for_documents,
+)
+from app.utils import logger_info
+from app.vector_store import (
+    backfill_keywords,
+    delete_document_points,
+    delete_points,
+    reset_collection,
+    run_vector_op,
+)
+
+from .manifest import SourceFile, diff_manifest, scan_directory, scan_files
+from .pipeline import IngestionPipeline, PipelineStats
+
+
+async def _ingest_files(
+    files: List[SourceFile], stats: Optional[PipelineStats] = None
+) -> int:
+    """
+    Stream the given files through the ingestion pipeline.
+
+    Each file is recorded in the manifest as soon as it is fully stored, so
+    a run that fails halfway is resumed by the next sync from that point.
+    """
+    stats = stats if stats is not None else PipelineStats()
+    stats.files_total = len(files)
+    sources = {str(source.path): source for source in files}
+
+    async def checkpoint(paths: List[str]):
+        done = [sources[path] for path in paths]
+        async with AsyncSessionLocal() as session:
+            # A changed file may now be skipped by the loader; drop its old row
+            await delete_documents(
+                [s.doc_id for s in done if s.doc_id not in stats.doc_ids], session
+            )
+            # Skipped files (empty, non-English) are recorded too so they are
+            # not loaded again until they change on disk
+            await record_ingested_files(
+                [
+                    {
+                        "file_path": source.key,
+                        "doc_id": source.doc_id,
+                        "content_hash": source.content_hash,
+                        "file_size": source.file_size,
+                    }
+                    for source in done
+                ],
+                session,
+            )
+
+    pipeline = IngestionPipeline(stats=stats, on_checkpoint=checkpoint)
+    await pipeline.run([source.path for source in files])
+    return stats.documents
+
+
+async def rebuild_index(directory: str, stats: Optional[PipelineStats] = None) -> int:
+    """
+    Re-ingest every file; expects Postgres to be empty already.
+
+    An interrupted rebuild is finished with sync_index, which skips the
+    files that were checkpointed before it stopped.
+    """
+    await run_vector_op(reset_collection)
+    files = await asyncio.to_thread(scan_directory, directory)
+    count = await _ingest_files(files, stats)
+    logger_info.info(f"Full rebuild ingested {count} documents")
+    return count
+
+
+async def _apply_diff(
+    files: List[SourceFile],
+    keys: Optional[set],
+    stats: Optional[PipelineStats] = None,
+) -> int:
+    """
+    Diff the files against the manifest and ingest what changed.
+
+    When `keys` is given, only those manifest entries are considered, so
+    files outside the set are neither re-ingested nor treated as removed.
+    """
+    async with AsyncSessionLocal() as session:
+        manifest = await get_ingestion_manifest(session)
+        if keys is not None:
+            manifest = {k: v for k, v in manifest.items() if k in keys}
+        diff = diff_manifest(files, manifest)
+
+        logger_info.info(
+            f"Ingestion manifest: {len(diff.added)} added, {len(diff.changed)} "
+            f"changed, {len(diff.removed)} removed, {len(diff.unchanged)} unchanged"
+        )
+        if diff.is_empty:
+            return 0
+
+        removed_doc_ids = list(diff.removed.values())
+        # Added files are cleaned too: the store may hold chunks written
+        # before the manifest existed, under ids that would not be replaced
+        stale_doc_ids = [source.doc_id for source in diff.to_ingest]
+
+        # Points shared with other documents through duplicate chunks stay;
+        # points these documents only reference as duplicates go with them
+        shared, exclusive = await split_vector_ids_for_documents(
+            removed_doc_ids + stale_doc_ids, session
+        )
+        await run_vector_op(
+            delete_document_points, removed_doc_ids + stale_doc_ids, keep_ids=shared
+        )
+        await run_vector_op(delete_points, exclusive)
+        await delete_documents(removed_doc_ids, session)
+        await delete_chunks_for_documents(stale_doc_ids, session)
+        await forget_ingested_files(list(diff.removed), session)
+
+    return await _ingest_files(diff.to_ingest, stats)
+
+
+async def sync_index(directory: str, stats: Optional[PipelineStats] = None) -> int:
+    """
+    Bring Postgres and Qdrant in line with the files on disk.
+
+    Only files whose content hash differs from the stored manifest are
+    loaded, chunked and embedded; removed files are deleted from both stores.
+    """
+    files = await asyncio.to_thread(scan_directory, directory)
+    count = await _apply_diff(files, None, stats)
+    # Points of unchanged files may predate the keyword tokens in the payload
+    await run_vector_op(backfill_keywords)
+    return count
+
+
+async def sync_files(
+    paths: Iterable[Path], stats: Optional[PipelineStats] = None
+) -> int:
+    """
+    Like sync_index, but scoped to the given files.
+
+    Paths that no longer exist are treated as removed. All changed files go
+    through one pipeline run, so their chunks share embedding batches.
+    """
+    paths = [Path(p) for p in paths]
+    files = await asyncio.to_thread(scan_files, paths)
+    keys = {str(p.resolve()) for p in paths}
+    return await _apply_diff(files, keys, stats)
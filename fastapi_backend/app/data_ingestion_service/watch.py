@@ -0,0 +1,135 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Optional, Set
+
+from app.config import settings
+from app.utils import logger_error, logger_info
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+
+from .jobs import IngestionJobConflict, job_runner
+
+BatchHandler = Callable[[Set[Path]], Awaitable[None]]
+
+
+class _JsonEventHandler(FileSystemEventHandler):
+    """Forwards create/modify/delete/move events of JSON files to the watcher"""
+
+    def __init__(self, watcher: "DocumentWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.is_directory or event.event_type not in (
+            "created",
+            "modified",
+            "deleted",
+            "moved",
+        ):
+            return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path and str(path).endswith(".json"):
+                self.watcher.notify_threadsafe(Path(path))
+
+
+async def reingest_paths(paths: Set[Path]) -> None:
+    """Run an incremental ingestion job scoped to the given files"""
+    while True:
+        # Let a running job (startup or API) finish first; the files it
+        # already covered will show up as unchanged in the manifest
+        await job_runner.wait()
+        try:
+            job = await job_runner.start(
+                mode="incremental", trigger="watcher", paths=sorted(paths)
+            )
+        except IngestionJobConflict:
+            continue
+        logger_info.info(f"Started ingestion job {job.id} for {len(paths)} files")
+        await job_runner.wait()
+        return
+
+
+class DocumentWatcher:
+    """
+    Watches DOCUMENT_LOADER_DIR and re-ingests the files that change.
+
+    Events are collected until the directory has been quiet for
+    WATCH_DEBOUNCE_SECONDS (or WATCH_MAX_DELAY_SECONDS have passed since the
+    first one), then handed over as one batch, so a burst of new files goes
+    through a single pipeline run and shares embedding calls.
+    """
+
+    def __init__(
+        self,
+        directory: str = settings.DOCUMENT_LOADER_DIR,
+        debounce: float = settings.WATCH_DEBOUNCE_SECONDS,
+        max_delay: float = settings.WATCH_MAX_DELAY_SECONDS,
+        on_batch: BatchHandler = reingest_paths,
+    ):
+        self.directory = directory
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.on_batch = on_batch
+        self.pending: Set[Path] = set()
+        self._first_event = 0.0
+        self._last_event = 0.0
+        self._wakeup = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._observer: Optional[Observer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._flush_loop())
+        self._observer = Observer()
+        self._observer.schedule(_JsonEventHandler(self), self.directory)
+        self._observer.start()
+        logger_info.info(f"Watching {self.directory} for document changes")
+
+    async def stop(self) -> None:
+        if self._observer is not None:
+            self._observer.stop()
+            await asyncio.to_thread(self._observer.join)
+            self._observer = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def notify_threadsafe(self, path: Path) -> None:
+        """Called from the observer thread"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.notify, path)
+
+    def notify(self, path: Path) -> None:
+        now = time.monotonic()
+        if not self.pending:
+            self._first_event = now
+        self.pending.add(path)
+        self._last_event = now
+        self._wakeup.set()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self.pending:
+                continue
+            await self._wait_for_quiet()
+
+            paths, self.pending = self.pending, set()
+            try:
+                await self.on_batch(paths)
+            except Exception as e:
+                logger_error.error(
+                    f"Re-ingesting {len(paths)} changed files failed: {e}"
+                )
+
+    async def _wait_for_quiet(self) -> None:
+        while True:
+            now = time.monotonic()
+            quiet_at = self._last_event + self.debounce
+            deadline = self._first_event + self.max_delay
+            if now >= min(quiet_at, deadline):
+                return
+            await asyncio.sleep(min(quiet_at, deadline) - now)
@@ -1,16 +1,29 @@
+import asyncio
 import datetime
-import logging
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from uuid import UUID
 
-from sqlalchemy import text
+from sqlalchemy import delete, func, insert, literal_column, or_, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.future import select
 
 from .config import settings
-from .models import Base, Document, DocumentChunk, DocumentVersion
+from .keyword_index import analyze, keyword_index
+from .models import (
+    Base,
+    ChunkType,
+    Document,
+    DocumentChunk,
+    DocumentVersion,
+    IngestedFile,
+    IngestionJob,
+    JobStatus,
+    ReindexOutbox,
+)
+from .utils import logger_error, logger_info
 
 # Get the project root directory
 ROOT_DIR = Path(__file__).resolve().parents[2]
@@ -22,8 +35,6 @@ AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
-logger_error = logging.getLogger(__name__)
-
 
 @asynccontextmanager
 async def get_db_session():
@@ -40,14 +51,72 @@ async def get_db_session():
 #        yield session
 
 
-async def create_db_and_tables():
-    """Create database tables"""
+async def create_db_and_tables(drop_existing: bool = True):
+    """Create database tables, optionally wiping the existing schema first"""
     async with engine.begin() as conn:
-        # Drop all tables with CASCADE to handle foreign key dependencies
-        await conn.execute(text("DROP SCHEMA public CASCADE"))
-        await conn.execute(text("CREATE SCHEMA public"))
+        if drop_existing:
+            # Drop all tables with CASCADE to handle foreign key dependencies
+            await conn.execute(text("DROP SCHEMA public CASCADE"))
+            await conn.execute(text("CREATE SCHEMA public"))
         # Create tables with latest schema
         await conn.run_sync(Base.metadata.create_all)
+        # create_all does not add columns to tables that already exist
+        for column, column_type in (
+            ("start_offset", "INTEGER"),
+            ("end_offset", "INTEGER"),
+            ("vector_id", "UUID"),
+        ):
+            await conn.execute(
+                text(
+                    "ALTER TABLE document_chunks "
+                    f"ADD COLUMN IF NOT EXISTS {column} {column_type}"
+                )
+            )
+        await conn.execute(
+            text(
+                "ALTER TABLE ingestion_jobs "
+                "ADD COLUMN IF NOT EXISTS duplicates_done INTEGER DEFAULT 0"
+            )
+        )
+        await conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_document_chunks_vector_id "
+                "ON document_chunks (vector_id)"
+            )
+        )
+        # Rows from before deduplication have no vector_id; their point is
+        # their own chunk_id. Filled once, so lookups can use the index above
+        await conn.execute(
+            text(
+                "UPDATE document_chunks SET vector_id = chunk_id "
+                "WHERE vector_id IS NULL"
+            )
+        )
+        await conn.execute(
+            text(
+                "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_tsv "
+                "tsvector GENERATED ALWAYS AS (to_tsvector('english', content)) STORED"
+            )
+        )
+        await conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_document_chunks_content_tsv "
+                "ON document_chunks USING gin (content_tsv)"
+            )
+        )
+
+    try:
+        # Lets the keyword prefilter's ILIKE use an index instead of a full scan
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            await conn.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_document_chunks_content_trgm "
+                    "ON document_chunks USING gin (content gin_trgm_ops)"
+                )
+            )
+    except Exception as e:
+        logger_error.error(f"Trigram index unavailable, keyword search will scan: {e}")
 
 
 async def clear_existing_data():
@@ -55,6 +124,8 @@ async def clear_existing_data():
         await conn.execute(text("TRUNCATE TABLE document_chunks CASCADE"))
         await conn.execute(text("TRUNCATE TABLE document_versions CASCADE"))
         await conn.execute(text("TRUNCATE TABLE documents CASCADE"))
+        await conn.execute(text("TRUNCATE TABLE ingested_files"))
+    keyword_index.clear()
 
 
 async def is_db_empty():
@@ -130,43 +201,525 @@ async def save_document_version_and_update(
     # Update the document with new content and timestamp
     doc.content = new_content
     doc.updated_at = datetime.datetime.utcnow()
+
+    # Chunks and vectors are brought up to date in the background; the
+    # outbox row commits together with the edit, so it cannot be lost
+    session.add(ReindexOutbox(doc_id=doc.doc_id))
     await session.commit()
     await session.refresh(doc)
     return doc
 
 
-async def save_chunks_to_postgres(chunks: List[Document], session: AsyncSession):
+CHUNK_COLUMNS = [
+    "chunk_id",
+    "doc_id",
+    "chunk_index",
+    "chunk_type",
+    "content",
+    "start_offset",
+    "end_offset",
+    "vector_id",
+    "created_at",
+]
+DOCUMENT_COLUMNS = [
+    "doc_id",
+    "file_name",
+    "title",
+    "file_path",
+    "file_size",
+    "language",
+    "version",
+    "last_modified",
+    "source_url",
+    "content_type",
+    "status_code",
+    "scrape_id",
+    "content",
+    "created_at",
+]
+
+
+def _as_datetime(value) -> datetime.datetime:
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.datetime.now()
+
+
+def _chunk_rows(chunks) -> List[tuple]:
+    now = datetime.datetime.utcnow()
+    rows = []
     for chunk in chunks:
         meta = chunk.metadata
-        if "chunk_id" not in meta:
-            logger_error.error(f"Missing chunk_id in chunk metadata: {meta}")
-            continue  # Skip this chunk if no chunk_id
+        if "chunk_id" not in meta or "doc_id" not in meta:
+            logger_error.error(f"Missing chunk_id or doc_id in chunk metadata: {meta}")
+            continue  # Skip this chunk
+        rows.append(
+            (
+                # asyncpg encodes UUID strings itself, no per-row conversion
+                str(meta["chunk_id"]),
+                str(meta["doc_id"]),
+                meta["chunk_index"],
+                meta.get("chunk_type", "recursive"),
+                chunk.page_content,
+                meta.get("start_offset"),
+                meta.get("end_offset"),
+                str(meta.get("vector_id") or meta["chunk_id"]),
+                now,
+            )
+        )
+    return rows
 
-        try:
-            # Convert string chunk_id to UUID object for database storage
-            chunk_id_uuid = (
-                UUID(meta["chunk_id"])
-                if isinstance(meta["chunk_id"], str)
-                else meta["chunk_id"]
+
+def _document_rows(docs) -> List[tuple]:
+    now = datetime.datetime.utcnow()
+    rows = []
+    for doc in docs:
+        meta = doc.metadata
+        rows.append(
+            (
+                str(meta["doc_id"]),
+                Path(meta.get("file_path", "unknown")).name,
+                meta.get("title", "Untitled"),
+                meta.get("file_path", "unknown"),
+                meta.get("file_size", 0),
+                meta.get("language", "en"),
+                meta.get("version", datetime.datetime.now().isoformat()),
+                _as_datetime(meta.get("last_modified")),
+                meta.get("source_url", "unknown"),
+                meta.get("content_type"),
+                meta.get("status_code"),
+                meta.get("scrape_id"),
+                doc.page_content,
+                now,
+            )
+        )
+    return rows
+
+
+async def _copy_rows(session: AsyncSession, table: str, columns, rows) -> None:
+    """COPY rows through the session's asyncpg connection and transaction"""
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    for i in range(0, len(rows), settings.POSTGRES_WRITE_BATCH_SIZE):
+        await raw.driver_connection.copy_records_to_table(
+            table,
+            records=rows[i : i + settings.POSTGRES_WRITE_BATCH_SIZE],
+            columns=columns,
+        )
+
+
+async def _insert_rows(session: AsyncSession, stmt, columns, rows) -> None:
+    """Batched executemany INSERT"""
+    for i in range(0, len(rows), settings.POSTGRES_WRITE_BATCH_SIZE):
+        batch = rows[i : i + settings.POSTGRES_WRITE_BATCH_SIZE]
+        await session.execute(stmt, [dict(zip(columns, row)) for row in batch])
+
+
+async def save_chunks_to_postgres(chunks, session: AsyncSession) -> int:
+    """
+    Bulk insert chunks into `document_chunks` and return the row count.
+
+    Uses COPY unless POSTGRES_WRITE_MODE is "insert". Existing chunks of
+    the same documents must have been deleted beforehand.
+    """
+    rows = _chunk_rows(chunks)
+    if not rows:
+        return 0
+    entries = [(row[0], row[1], row[4]) for row in rows]
+
+    if settings.POSTGRES_WRITE_MODE == "copy":
+        await _copy_rows(session, "document_chunks", CHUNK_COLUMNS, rows)
+    else:
+        rows = [
+            (UUID(r[0]), UUID(r[1]), r[2], ChunkType(r[3]), *r[4:7], UUID(r[7]), r[8])
+            for r in rows
+        ]
+        await _insert_rows(session, insert(DocumentChunk), CHUNK_COLUMNS, rows)
+
+    await session.commit()
+    if keyword_index.active:
+        # Tokenizing is CPU-bound, keep it off the event loop
+        analyzed = await asyncio.to_thread(analyze, entries)
+        keyword_index.add_analyzed(analyzed)
+    logger_info.info(f"Wrote {len(rows)} chunks to Postgres")
+    return len(rows)
+
+
+async def save_documents_to_postgres(docs, session: AsyncSession) -> int:
+    """
+    Insert or update one `documents` row per loaded source document.
+
+    Re-ingested documents are updated in place so that their version
+    history is kept. In copy mode the rows go through a temporary table.
+    """
+    rows = _document_rows(docs)
+    if not rows:
+        return 0
+
+    # created_at is kept from the first ingestion
+    update_columns = [c for c in DOCUMENT_COLUMNS if c not in ("doc_id", "created_at")]
+
+    if settings.POSTGRES_WRITE_MODE == "copy":
+        await session.execute(
+            text(
+                "CREATE TEMP TABLE documents_stage "
+                "(LIKE documents INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+        )
+        await _copy_rows(session, "documents_stage", DOCUMENT_COLUMNS, rows)
+        columns = ", ".join(DOCUMENT_COLUMNS)
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in update_columns)
+        await session.execute(
+            text(
+                f"INSERT INTO documents ({columns}) "
+                f"SELECT {columns} FROM documents_stage "
+                f"ON CONFLICT (doc_id) DO UPDATE SET {updates}"
+            )
+        )
+    else:
+        stmt = pg_insert(Document)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Document.doc_id],
+            set_={c: stmt.excluded[c] for c in update_columns},
+        )
+        rows = [(UUID(r[0]), *r[1:]) for r in rows]
+        await _insert_rows(session, stmt, DOCUMENT_COLUMNS, rows)
+
+    await session.commit()
+    logger_info.info(f"Wrote {len(rows)} documents to Postgres")
+    return len(rows)
+
+
+async def delete_chunks_for_documents(doc_ids: List[str], session: AsyncSession):
+    if not doc_ids:
+        return
+    await session.execute(
+        delete(DocumentChunk).where(
+            DocumentChunk.doc_id.in_([UUID(doc_id) for doc_id in doc_ids])
+        )
+    )
+    await session.commit()
+    keyword_index.remove_documents(doc_ids)
+
+
+async def delete_documents(doc_ids: List[str], session: AsyncSession):
+    """Delete documents together with their chunks and versions"""
+    if not doc_ids:
+        return
+    await session.execute(
+        delete(Document).where(
+            Document.doc_id.in_([UUID(doc_id) for doc_id in doc_ids])
+        )
+    )
+    await session.commit()
+    keyword_index.remove_documents(doc_ids)
+
+
+async def _split_vector_ids(
+    condition, session: AsyncSession
+) -> Tuple[List[str], List[str]]:
+    used = select(DocumentChunk.vector_id).where(condition).distinct()
+    vector_ids = {str(v) for v in (await session.execute(used)).scalars()}
+    if not vector_ids:
+        return [], []
+    shared = await session.execute(
+        select(DocumentChunk.vector_id)
+        .where(DocumentChunk.vector_id.in_(used.scalar_subquery()))
+        .where(~condition)
+        .distinct()
+    )
+    shared_ids = {str(v) for v in shared.scalars()}
+    return sorted(shared_ids), sorted(vector_ids - shared_ids)
+
+
+async def split_vector_ids_for_documents(
+    doc_ids: List[str], session: AsyncSession
+) -> Tuple[List[str], List[str]]:
+    """
+    Qdrant points used by the chunks of these documents, split into the ones
+    other documents still share and the ones that can be deleted with them.
+    """
+    if not doc_ids:
+        return [], []
+    condition = DocumentChunk.doc_id.in_([UUID(doc_id) for doc_id in doc_ids])
+    return await _split_vector_ids(condition, session)
+
+
+async def split_vector_ids_for_chunks(
+    chunk_ids: List[str], session: AsyncSession
+) -> Tuple[List[str], List[str]]:
+    """Like split_vector_ids_for_documents, for individual chunks"""
+    if not chunk_ids:
+        return [], []
+    condition = DocumentChunk.chunk_id.in_([UUID(chunk_id) for chunk_id in chunk_ids])
+    return await _split_vector_ids(condition, session)
+
+
+def _like_pattern(keyword: str) -> str:
+    """Substring pattern matching the keyword literally"""
+    escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+async def search_chunk_ids(
+    keyword: str, session: AsyncSession, limit: int = settings.KEYWORD_PREFILTER_LIMIT
+) -> List[str]:
+    """
+    Ids of the chunks containing the keyword, best matches first.
+
+    A chunk matches on its words (full-text, so "tokens" finds "token") or
+    on a plain substring; both conditions are served by GIN indexes. Full
+    text matches are ranked first by ts_rank, and the result is capped.
+    """
+    query = func.websearch_to_tsquery(literal_column("'english'::regconfig"), keyword)
+    result = await session.execute(
+        select(DocumentChunk.chunk_id)
+        .where(
+            or_(
+                DocumentChunk.content_tsv.op("@@")(query),
+                DocumentChunk.content.ilike(_like_pattern(keyword), escape="\\"),
             )
-            doc_id_uuid = (
-                UUID(meta["doc_id"])
-                if isinstance(meta["doc_id"], str)
-                else meta["doc_id"]
+        )
+        .order_by(
+            func.ts_rank(DocumentChunk.content_tsv, query).desc(),
+            DocumentChunk.chunk_id,
+        )
+        .limit(limit)
+    )
+    return [str(chunk_id) for chunk_id in result.scalars().all()]
+
+
+async def build_keyword_index(batch_size: int = 1000) -> None:
+    """Load every stored chunk into the in-memory keyword index"""
+    keyword_index.begin_build()
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(
+                select(
+                    DocumentChunk.chunk_id, DocumentChunk.doc_id, DocumentChunk.content
+                ).execution_options(yield_per=batch_size)
             )
+            async for rows in result.partitions():
+                analyzed = await asyncio.to_thread(analyze, rows)
+                keyword_index.load(analyzed)
+    except Exception as e:
+        keyword_index.abort_build()
+        logger_error.error(f"Could not build the keyword index: {e}")
+        return
+    keyword_index.finish_build()
+
+
+async def get_chunk_vector_ids(
+    chunk_ids: List[str], session: AsyncSession
+) -> Dict[str, str]:
+    """Map of chunk_id -> id of the Qdrant point holding its vector"""
+    if not chunk_ids:
+        return {}
+    result = await session.execute(
+        select(DocumentChunk.chunk_id, DocumentChunk.vector_id).where(
+            DocumentChunk.chunk_id.in_([UUID(chunk_id) for chunk_id in chunk_ids])
+        )
+    )
+    return {str(chunk_id): str(vector_id) for chunk_id, vector_id in result.all()}
+
+
+async def get_point_chunk_ids(
+    point_ids: List[str], session: AsyncSession
+) -> Dict[str, str]:
+    """Map of chunk_id -> point id for every chunk stored in the given points"""
+    if not point_ids:
+        return {}
+    result = await session.execute(
+        select(DocumentChunk.chunk_id, DocumentChunk.vector_id).where(
+            DocumentChunk.vector_id.in_([UUID(point_id) for point_id in point_ids])
+        )
+    )
+    return {str(chunk_id): str(vector_id) for chunk_id, vector_id in result.all()}
+
+
+async def get_chunks_with_documents(
+    chunk_ids: List[str], session: AsyncSession
+) -> List[Tuple[DocumentChunk, Document]]:
+    if not chunk_ids:
+        return []
+    result = await session.execute(
+        select(DocumentChunk, Document)
+        .join(Document, Document.doc_id == DocumentChunk.doc_id)
+        .where(DocumentChunk.chunk_id.in_([UUID(chunk_id) for chunk_id in chunk_ids]))
+    )
+    return [(chunk, document) for chunk, document in result.all()]
+
 
-            db_chunk = DocumentChunk(
-                chunk_id=chunk_id_uuid,
-                doc_id=doc_id_uuid,
-                chunk_index=meta["chunk_index"],
-                chunk_type=meta.get("chunk_type", "recursive"),
-                content=chunk.page_content,
+async def get_ingestion_manifest(session: AsyncSession) -> Dict[str, str]:
+    """Map of ingested file path -> content hash"""
+    result = await session.execute(
+        select(IngestedFile.file_path, IngestedFile.content_hash)
+    )
+    return {file_path: content_hash for file_path, content_hash in result.all()}
+
+
+async def record_ingested_files(entries: List[Dict], session: AsyncSession):
+    """Upsert manifest rows (file_path, doc_id, content_hash, file_size)"""
+    now = datetime.datetime.utcnow()
+    # Stay well below the Postgres bind parameter limit per statement
+    for i in range(0, len(entries), 1000):
+        stmt = pg_insert(IngestedFile).values(
+            [{**entry, "ingested_at": now} for entry in entries[i : i + 1000]]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IngestedFile.file_path],
+            set_={
+                "doc_id": stmt.excluded.doc_id,
+                "content_hash": stmt.excluded.content_hash,
+                "file_size": stmt.excluded.file_size,
+                "ingested_at": stmt.excluded.ingested_at,
+            },
+        )
+        await session.execute(stmt)
+    await session.commit()
+
+
+async def forget_ingested_files(file_paths: List[str], session: AsyncSession):
+    if not file_paths:
+        return
+    await session.execute(
+        delete(IngestedFile).where(IngestedFile.file_path.in_(list(file_paths)))
+    )
+    await session.commit()
+
+
+async def create_ingestion_job(mode: str, trigger: str) -> IngestionJob:
+    async with AsyncSessionLocal() as session:
+        job = IngestionJob(mode=mode, trigger=trigger, status=JobStatus.pending)
+        session.add(job)
+        await session.commit()
+        await session.refresh(job)
+        return job
+
+
+async def update_ingestion_job(job_id: int, **values) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(IngestionJob).where(IngestionJob.id == job_id).values(**values)
+        )
+        await session.commit()
+
+
+async def get_ingestion_job(job_id: int) -> Optional[IngestionJob]:
+    async with AsyncSessionLocal() as session:
+        return await session.get(IngestionJob, job_id)
+
+
+async def list_ingestion_jobs(limit: int = 20) -> List[IngestionJob]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(IngestionJob).order_by(IngestionJob.id.desc()).limit(limit)
+        )
+        return list(result.scalars().all())
+
+
+async def fail_interrupted_jobs() -> None:
+    """Jobs still marked running belong to a process that died"""
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(IngestionJob)
+            .where(IngestionJob.status.in_([JobStatus.pending, JobStatus.running]))
+            .values(
+                status=JobStatus.failed,
+                error="Interrupted by a restart",
+                finished_at=datetime.datetime.utcnow(),
             )
-            session.add(db_chunk)
-        except (ValueError, TypeError) as e:
-            logger_error.error(
-                f"Invalid UUID format for chunk_id {meta.get('chunk_id')} or doc_id {meta.get('doc_id')}: {e}"
+        )
+        await session.commit()
+
+
+async def rebuild_was_interrupted() -> bool:
+    """True if the latest full rebuild did not finish and no job succeeded since"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(IngestionJob.id, IngestionJob.status)
+            .where(IngestionJob.mode == "full")
+            .order_by(IngestionJob.id.desc())
+            .limit(1)
+        )
+        latest = result.first()
+        if latest is None or latest.status == JobStatus.succeeded:
+            return False
+        # A later incremental run changed the index the checkpoints describe
+        result = await session.execute(
+            select(IngestionJob.id)
+            .where(
+                IngestionJob.id > latest.id,
+                IngestionJob.status == JobStatus.succeeded,
             )
-            continue
+            .limit(1)
+        )
+        return result.first() is None
+
 
+async def get_document_chunks(
+    doc_id: UUID, session: AsyncSession
+) -> List[DocumentChunk]:
+    result = await session.execute(
+        select(DocumentChunk)
+        .where(DocumentChunk.doc_id == doc_id)
+        .order_by(DocumentChunk.chunk_index)
+    )
+    return list(result.scalars().all())
+
+
+async def delete_chunks(chunk_ids: List[str], session: AsyncSession):
+    if not chunk_ids:
+        return
+    await session.execute(
+        delete(DocumentChunk).where(
+            DocumentChunk.chunk_id.in_([UUID(chunk_id) for chunk_id in chunk_ids])
+        )
+    )
+    await session.commit()
+    keyword_index.remove_chunks(chunk_ids)
+
+
+async def update_chunk_positions(updates: Dict[str, Dict], session: AsyncSession):
+    """Set chunk_index and offsets of chunks that kept their content"""
+    if not updates:
+        return
+    for chunk_id, values in updates.items():
+        await session.execute(
+            update(DocumentChunk)
+            .where(DocumentChunk.chunk_id == UUID(chunk_id))
+            .values(**values)
+        )
+    await session.commit()
+
+
+async def get_pending_reindex(session: AsyncSession, limit: int) -> List[ReindexOutbox]:
+    """Unprocessed outbox rows, oldest first"""
+    result = await session.execute(
+        select(ReindexOutbox)
+        .where(ReindexOutbox.processed_at.is_(None))
+        .where(ReindexOutbox.attempts < settings.REINDEX_MAX_ATTEMPTS)
+        .order_by(ReindexOutbox.id)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def finish_reindex(
+    outbox_ids: List[int], session: AsyncSession, error: Optional[str] = None
+):
+    """Mark outbox rows done, or count a failed attempt when `error` is set"""
+    if not outbox_ids:
+        return
+    stmt = update(ReindexOutbox).where(ReindexOutbox.id.in_(outbox_ids))
+    if error is None:
+        stmt = stmt.values(processed_at=datetime.datetime.utcnow(), error=None)
+    else:
+        stmt = stmt.values(attempts=ReindexOutbox.attempts + 1, error=error)
+    await session.execute(stmt)
     await session.commit()
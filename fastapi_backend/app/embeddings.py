@@ -0,0 +1,573 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import tiktoken
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from .config import settings
+from .utils import logger_error
+
+# Full output size of the OpenAI embedding models
+NATIVE_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+# Used when the tokenizer cannot be loaded; English prose averages about four
+# characters per token, three keeps batches safely under the budget
+CHARS_PER_TOKEN_ESTIMATE = 3
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache with LRU eviction.
+
+    Vectors are stored in a SQLite file keyed by (model, dimension, content
+    hash), so unchanged chunks and repeated queries are never sent to the
+    embedding API twice, even across restarts. The file is opened on first
+    use, so building the embeddings client touches no disk.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int,
+        use_float16: bool = False,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.dtype = np.float16 if use_float16 else np.float32
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """The SQLite connection, opened on first use; call with the lock held"""
+        if self._conn is not None:
+            return self._conn
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        # WAL lets several worker processes share the same cache file
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used "
+            "ON embeddings(last_used)"
+        )
+        conn.commit()
+        self._conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, dimension: int, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{dimension}:{digest}"
+
+    def _decode(self, blob: bytes, dimension: int) -> List[float]:
+        # Entries written with another dtype setting stay readable
+        dtype = np.float16 if len(blob) == dimension * 2 else np.float32
+        return np.frombuffer(blob, dtype=dtype).astype(np.float32).tolist()
+
+    def get_many(self, keys: Sequence[str], dimension: int) -> Dict[str, List[float]]:
+        if not keys:
+            return {}
+        found: Dict[str, List[float]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            conn = self._connect()
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = self._decode(blob, dimension)
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype=self.dtype).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            (entries,) = (
+                self._connect().execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            )
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "size_bytes": self.path.stat().st_size if self.path.exists() else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated texts from an EmbeddingCache"""
+
+    def __init__(
+        self, embeddings: Embeddings, cache: EmbeddingCache, model: str, dimension: int
+    ):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+        self.dimension = dimension
+
+    def _keys(self, texts: Sequence[str]) -> List[str]:
+        return [
+            EmbeddingCache.make_key(self.model, self.dimension, text) for text in texts
+        ]
+
+    def _missing(self, texts, keys, found) -> Dict[str, str]:
+        # Identical texts in one batch are embedded once
+        return {key: text for key, text in zip(keys, texts) if key not in found}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = self._keys(texts)
+        found = self.cache.get_many(keys, self.dimension)
+        missing = self._missing(texts, keys, found)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_items = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(new_items)
+            found.update(new_items)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        (key,) = self._keys([text])
+        found = self.cache.get_many([key], self.dimension)
+        if key not in found:
+            found[key] = self.embeddings.embed_query(text)
+            self.cache.put_many({key: found[key]})
+        return found[key]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = self._keys(texts)
+        found = await asyncio.to_thread(self.cache.get_many, keys, self.dimension)
+        missing = self._missing(texts, keys, found)
+        if missing:
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            new_items = dict(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self.cache.put_many, new_items)
+            found.update(new_items)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        (key,) = self._keys([text])
+        found = await asyncio.to_thread(self.cache.get_many, [key], self.dimension)
+        if key not in found:
+            found[key] = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(self.cache.put_many, {key: found[key]})
+        return found[key]
+
+
+def normalize_query(text: str) -> str:
+    """Queries that differ only in Unicode form or whitespace embed the same"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class QueryEmbeddingCache:
+    """
+    In-process LRU cache of query vectors, with an optional TTL.
+
+    Resent queries (retries, re-submits from the UI) are answered from
+    memory without a thread hop to the on-disk cache or an API call.
+    """
+
+    def __init__(self, max_entries: int, ttl: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl  # seconds, 0 keeps entries until they are evicted
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if (
+                entry is not None
+                and self.ttl
+                and time.monotonic() - entry[0] > self.ttl
+            ):
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple, vector: List[float]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated queries from a QueryEmbeddingCache.
+
+    Queries are normalized before they are embedded, so the layers below
+    (including the on-disk cache shared by all workers) see one text per
+    query. Identical queries that arrive while one is in flight wait for
+    its result instead of sending their own request.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: QueryEmbeddingCache,
+        model: str,
+        dimension: int,
+    ):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+        self.dimension = dimension
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+
+    def _key(self, text: str) -> Tuple:
+        return (self.model, self.dimension, text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        text = normalize_query(text)
+        key = self._key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        text = normalize_query(text)
+        key = self._key(text)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                # The request it waited for was cancelled, send one itself
+        return await self._embed_once(key, text)
+
+    async def _embed_once(self, key: Tuple, text: str) -> List[float]:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            vector = await self.embeddings.aembed_query(text)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; this marks it retrieved if there are none
+            future.exception()
+            raise
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+        self.cache.put(key, vector)
+        future.set_result(vector)
+        return vector
+
+
+@lru_cache(maxsize=4)
+def _load_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _get_encoding(model: str):
+    # Only successful loads are cached, a failed download is retried later
+    try:
+        return _load_encoding(model)
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use
+        logger_error.error(f"Tokenizer unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(texts: Sequence[str], model: str) -> List[int]:
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return [len(text) // CHARS_PER_TOKEN_ESTIMATE + 1 for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts))]
+
+
+def pack_by_tokens(
+    token_counts: Sequence[int], max_tokens: int, max_texts: int
+) -> List[range]:
+    """
+    Split a list of texts into consecutive batches for embedding requests.
+
+    A batch is closed when adding the next text would exceed `max_tokens`
+    or `max_texts`; a single text over the budget gets a batch of its own.
+    """
+    batches = []
+    start = 0
+    tokens = 0
+    for i, count in enumerate(token_counts):
+        if i > start and (tokens + count > max_tokens or i - start >= max_texts):
+            batches.append(range(start, i))
+            start = i
+            tokens = 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append(range(start, len(token_counts)))
+    return batches
+
+
+class TokenBatchedEmbeddings(Embeddings):
+    """
+    Packs texts into embedding requests by token count.
+
+    Chunk sizes are configured in characters, so fixed-count batches are
+    either far below or over the per-request token limit. Requests are
+    filled up to `max_tokens` and, in the async path, up to
+    `max_concurrency` of them are in flight at once.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        max_tokens: int,
+        max_texts: int,
+        max_concurrency: int,
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_texts = max_texts
+        self.max_concurrency = max_concurrency
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        counts = count_tokens(texts, self.model)
+        return [
+            [texts[i] for i in batch]
+            for batch in pack_by_tokens(counts, self.max_tokens, self.max_texts)
+        ]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for batch in self._batches(texts):
+            vectors.extend(self.embeddings.embed_documents(batch))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = await asyncio.to_thread(self._batches, texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.embeddings.aembed_documents(batch)
+
+        results = await asyncio.gather(*(embed(batch) for batch in batches))
+        return [vector for result in results for vector in result]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
+
+
+_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Process-wide embedding cache, or None when caching is disabled"""
+    global _cache
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = EmbeddingCache(
+            path=settings.EMBEDDING_CACHE_PATH,
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+            use_float16=settings.EMBEDDING_CACHE_FLOAT16,
+        )
+    return _cache
+
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+
+
+def get_query_embedding_cache() -> Optional[QueryEmbeddingCache]:
+    """Process-wide query vector cache, or None when it is disabled"""
+    global _query_cache
+    if not settings.QUERY_EMBEDDING_CACHE_ENABLED:
+        return None
+    if _query_cache is None:
+        _query_cache = QueryEmbeddingCache(
+            max_entries=settings.QUERY_EMBEDDING_CACHE_MAX_ENTRIES,
+            ttl=settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+        )
+    return _query_cache
+
+
+def dimensions_argument(model: str, dimension: int) -> Optional[int]:
+    """
+    Value of the API's `dimensions` parameter for a vector size, None to
+    get the model's full output. text-embedding-3 models can shorten their
+    vectors; older models only return their native size. Models whose size
+    is not known here are asked for their full output, so a custom model
+    does not fail at import.
+    """
+    native = NATIVE_DIMENSIONS.get(model)
+    if native is None:
+        return None
+    if dimension > native:
+        raise ValueError(
+            f"VECTOR_DIMENSION {dimension} is larger than the {native} "
+            f"dimensions of {model}"
+        )
+    if dimension == native:
+        return None
+    if not model.startswith("text-embedding-3"):
+        raise ValueError(
+            f"{model} cannot shorten its embeddings, set VECTOR_DIMENSION to {native}"
+        )
+    return dimension
+
+
+def get_embeddings(token_batching: bool = True, **kwargs) -> Embeddings:
+    """
+    OpenAI embeddings for the configured model, at VECTOR_DIMENSION.
+
+    Requests are packed by token count, and texts found in the cache are
+    not sent at all. Callers that already pack their texts with
+    pack_by_tokens pass `token_batching=False`, so that each call is sent
+    as is and the texts are not tokenized twice.
+    """
+    client = OpenAIEmbeddings(
+        model=settings.EMBEDDING_MODEL,
+        openai_api_key=settings.OPENAI_API_KEY,
+        dimensions=dimensions_argument(
+            settings.EMBEDDING_MODEL, settings.VECTOR_DIMENSION
+        ),
+        # One packed batch must go out as a single request
+        chunk_size=settings.EMBEDDING_BATCH_SIZE,
+        **kwargs,
+    )
+    embeddings = client
+    if token_batching:
+        embeddings = TokenBatchedEmbeddings(
+            client,
+            model=settings.EMBEDDING_MODEL,
+            max_tokens=settings.EMBEDDING_BATCH_TOKENS,
+            max_texts=settings.EMBEDDING_BATCH_SIZE,
+            max_concurrency=settings.EMBEDDING_MAX_CONCURRENCY,
+        )
+    cache = get_embedding_cache()
+    if cache is None:
+        return embeddings
+    return CachedEmbeddings(
+        embeddings,
+        cache,
+        model=settings.EMBEDDING_MODEL,
+        dimension=settings.VECTOR_DIMENSION,
+    )
+
+
+def get_query_embeddings() -> Embeddings:
+    """get_embeddings() with the in-process query vector cache in front"""
+    embeddings = get_embeddings()
+    cache = get_query_embedding_cache()
+    if cache is None:
+        return embeddings
+    return QueryCachedEmbeddings(
+        embeddings,
+        cache,
+        model=settings.EMBEDDING_MODEL,
+        dimension=settings.VECTOR_DIMENSION,
+    )
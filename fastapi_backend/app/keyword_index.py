@@ -0,0 +1,308 @@
+import math
+import re
+import sys
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .utils import logger_info
+
+_WORD = re.compile(r"\w+")
+# Pieces of a camelCase word: "HTTPServerError" -> HTTP, Server, Error
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+MIN_TERM_LENGTH = 2
+_MAX_COUNT = (1 << 16) - 1
+# Removed chunks stay in the postings until there are at least this many
+COMPACT_MIN_REMOVED = 10_000
+# BM25 term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# (chunk_id, doc_id, text) of a stored chunk
+ChunkEntry = Tuple[str, str, str]
+
+
+def terms(text: str) -> Counter:
+    """
+    Lowercased words of the text with their counts.
+
+    snake_case and camelCase identifiers are also split into their pieces,
+    so "add_documents" can be found as "documents" and "QdrantClient" as
+    "qdrant".
+    """
+    counts = Counter()
+    # Count raw words first, so each distinct word is split only once
+    for word, count in Counter(_WORD.findall(text)).items():
+        lowered = word.lower()
+        if len(lowered) >= MIN_TERM_LENGTH:
+            counts[lowered] += count
+        if "_" in word or not (word.islower() or word.isupper() or word.istitle()):
+            for part in word.split("_"):
+                for piece in _CAMEL.findall(part):
+                    piece = piece.lower()
+                    if piece != lowered and len(piece) >= MIN_TERM_LENGTH:
+                        counts[piece] += count
+    return counts
+
+
+def analyze(entries: Iterable[ChunkEntry]) -> List[Tuple[str, str, Counter]]:
+    """Tokenize stored chunks; CPU-bound, safe to run on a worker thread"""
+    return [
+        (str(chunk_id), str(doc_id), terms(text)) for chunk_id, doc_id, text in entries
+    ]
+
+
+class KeywordIndex:
+    """
+    In-memory inverted index over chunk text: term -> chunk ordinals.
+
+    Postings are compact arrays of ordinals (in insertion order) with the
+    term count of each chunk, so a keyword is resolved without a database
+    round trip; a keyword with a term that never occurs is rejected by a
+    single dict lookup. The same postings score BM25 for hybrid retrieval.
+    Removed chunks are masked and purged from the postings once they make
+    up half of the index.
+
+    Updates made while the index is being built are recorded and replayed
+    once the build has finished.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._pending: Optional[List[Tuple[str, object]]] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._chunk_ids: List[Optional[str]] = []
+        self._doc_ids: List[str] = []
+        # Number of terms per chunk, and in total over the live chunks
+        self._lengths = array("I")
+        self._total_length = 0
+        self._ordinals: Dict[str, int] = {}
+        self._doc_chunks: Dict[str, Set[str]] = {}
+        self._removed = 0
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    @property
+    def active(self) -> bool:
+        """False while the index is off, when updates are dropped anyway"""
+        return self.ready or self._pending is not None
+
+    # Updates, called after the database writes they mirror
+
+    def add(self, entries: List[ChunkEntry]) -> None:
+        self._apply("_insert", entries)
+
+    def add_analyzed(self, analyzed: List[Tuple[str, str, Counter]]) -> None:
+        """Like add(), for entries already tokenized by analyze()"""
+        self._apply("load", analyzed)
+
+    def remove_chunks(self, chunk_ids: List[str]) -> None:
+        self._apply("_remove_chunks", [str(c) for c in chunk_ids])
+
+    def remove_documents(self, doc_ids: List[str]) -> None:
+        self._apply("_remove_documents", [str(d) for d in doc_ids])
+
+    def clear(self) -> None:
+        self._apply("_clear", None)
+
+    def _apply(self, method: str, arg) -> None:
+        if self._pending is not None:
+            self._pending.append((method, arg))
+        elif self.ready:
+            getattr(self, method)(arg)
+
+    # Building
+
+    def begin_build(self) -> None:
+        self.ready = False
+        self._reset()
+        self._pending = []
+
+    def load(self, analyzed: List[Tuple[str, str, Counter]]) -> None:
+        for chunk_id, doc_id, counts in analyzed:
+            self._insert_terms(chunk_id, doc_id, counts)
+
+    def finish_build(self) -> None:
+        pending, self._pending = self._pending or [], None
+        for method, arg in pending:
+            getattr(self, method)(arg)
+        self.ready = True
+        logger_info.info(
+            f"Keyword index ready: {len(self)} chunks, {len(self._postings)} terms"
+        )
+
+    def abort_build(self) -> None:
+        self._pending = None
+        self.ready = False
+        self._reset()
+
+    # Internals
+
+    def _insert(self, entries: List[ChunkEntry]) -> None:
+        self.load(analyze(entries))
+
+    def _insert_terms(self, chunk_id: str, doc_id: str, counts: Counter) -> None:
+        # Chunk ids are derived from content, a re-inserted id replaces the old
+        self._remove_chunk(chunk_id)
+        doc_id = sys.intern(doc_id)
+        ordinal = len(self._chunk_ids)
+        self._chunk_ids.append(chunk_id)
+        self._doc_ids.append(doc_id)
+        length = sum(counts.values())
+        self._lengths.append(length)
+        self._total_length += length
+        self._ordinals[chunk_id] = ordinal
+        self._doc_chunks.setdefault(doc_id, set()).add(chunk_id)
+        for term, count in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("I"), array("H"))
+            postings[0].append(ordinal)
+            postings[1].append(min(count, _MAX_COUNT))
+
+    def _remove_chunk(self, chunk_id: str) -> None:
+        ordinal = self._ordinals.pop(chunk_id, None)
+        if ordinal is None:
+            return
+        self._chunk_ids[ordinal] = None
+        self._total_length -= self._lengths[ordinal]
+        chunks = self._doc_chunks.get(self._doc_ids[ordinal])
+        if chunks is not None:
+            chunks.discard(chunk_id)
+            if not chunks:
+                del self._doc_chunks[self._doc_ids[ordinal]]
+        self._removed += 1
+
+    def _remove_chunks(self, chunk_ids: List[str]) -> None:
+        for chunk_id in chunk_ids:
+            self._remove_chunk(chunk_id)
+        self._maybe_compact()
+
+    def _remove_documents(self, doc_ids: List[str]) -> None:
+        for doc_id in doc_ids:
+            for chunk_id in list(self._doc_chunks.get(doc_id, ())):
+                self._remove_chunk(chunk_id)
+        self._maybe_compact()
+
+    def _clear(self, _=None) -> None:
+        self._reset()
+
+    def _maybe_compact(self) -> None:
+        if self._removed < max(len(self._ordinals), COMPACT_MIN_REMOVED):
+            return
+        live = np.fromiter(
+            (c is not None for c in self._chunk_ids),
+            dtype=bool,
+            count=len(self._chunk_ids),
+        )
+        for term in list(self._postings):
+            ordinals, counts = self._postings[term]
+            keep = live[np.frombuffer(ordinals, dtype=np.uint32)]
+            if not keep.any():
+                del self._postings[term]
+                continue
+            kept_ordinals = np.frombuffer(ordinals, dtype=np.uint32)[keep]
+            kept_counts = np.frombuffer(counts, dtype=np.uint16)[keep]
+            self._postings[term] = (
+                array("I", kept_ordinals.tobytes()),
+                array("H", kept_counts.tobytes()),
+            )
+        self._removed = 0
+
+    # Queries
+
+    def search(self, keyword: str, limit: int) -> List[str]:
+        """
+        Ids of the chunks containing every term of the keyword, ranked by
+        how often the terms occur in them.
+        """
+        query = terms(keyword)
+        if not query:
+            return []
+        postings = []
+        for term in query:
+            entry = self._postings.get(term)
+            if entry is None:
+                return []
+            postings.append(entry)
+        # Intersect starting from the rarest term
+        postings.sort(key=lambda entry: len(entry[0]))
+
+        ordinals = np.frombuffer(postings[0][0], dtype=np.uint32)
+        scores = np.frombuffer(postings[0][1], dtype=np.uint16).astype(np.uint32)
+        for other_ordinals, other_counts in postings[1:]:
+            ordinals, mine, theirs = np.intersect1d(
+                ordinals,
+                np.frombuffer(other_ordinals, dtype=np.uint32),
+                assume_unique=True,
+                return_indices=True,
+            )
+            scores = scores[mine] + np.frombuffer(other_counts, dtype=np.uint16)[theirs]
+            if not len(ordinals):
+                return []
+
+        return [chunk_id for chunk_id, _ in self._top(ordinals, scores, limit)]
+
+    def bm25(self, query_terms: Iterable[str], limit: int) -> List[Tuple[str, float]]:
+        """
+        Chunks containing any of the terms, ranked by BM25, with their scores.
+
+        Document frequencies count removed chunks that are still in the
+        postings, which only shifts the weights slightly until compaction.
+        """
+        if not self._ordinals:
+            return []
+        live = len(self._ordinals)
+        average_length = max(self._total_length / live, 1.0)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        scores = None
+        for term in set(query_terms):
+            entry = self._postings.get(term)
+            if entry is None:
+                continue
+            ordinals = np.frombuffer(entry[0], dtype=np.uint32)
+            counts = np.frombuffer(entry[1], dtype=np.uint16).astype(np.float32)
+            frequency = len(ordinals)
+            idf = math.log(1 + (live - frequency + 0.5) / (frequency + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ordinals] / average_length)
+            if scores is None:
+                scores = np.zeros(len(self._chunk_ids), dtype=np.float32)
+            # Ordinals are unique within a posting list
+            scores[ordinals] += idf * counts * (BM25_K1 + 1) / (counts + norm)
+        if scores is None:
+            return []
+        ordinals = np.flatnonzero(scores)
+        return self._top(ordinals, scores[ordinals], limit)
+
+    def _top(
+        self, ordinals: np.ndarray, scores: np.ndarray, limit: int
+    ) -> List[Tuple[str, float]]:
+        """Best scored live chunks, older chunks first among equals"""
+        # Removed chunks may still be in the postings, look a bit further
+        candidates = np.arange(len(ordinals))
+        wanted = limit + self._removed
+        if wanted < len(candidates):
+            candidates = np.argpartition(-scores.astype(np.float64), wanted)[:wanted]
+        candidates = candidates[
+            np.lexsort((ordinals[candidates], -scores[candidates].astype(np.float64)))
+        ]
+
+        ranked = []
+        for i in candidates:
+            chunk_id = self._chunk_ids[ordinals[i]]
+            if chunk_id is None:
+                continue
+            ranked.append((chunk_id, float(scores[i])))
+            if len(ranked) >= limit:
+                break
+        return ranked
+
+
+# Global instance, filled at startup when KEYWORD_INDEX_ENABLED is set
+keyword_index = KeywordIndex()
@@ -1,24 +1,22 @@
-import datetime
-from pathlib import Path
+import asyncio
 
 from app.config import settings
-from app.data_ingestion_service import (
-    chunk_documents,
-    ingest_to_qdrant,
-    load_documents_from_dir,
-)
+from app.data_ingestion_service.jobs import job_runner
+from app.data_ingestion_service.reindex import reindex_worker
+from app.data_ingestion_service.watch import DocumentWatcher
 from app.database import (
-    AsyncSessionLocal,
-    clear_existing_data,
+    build_keyword_index,
     create_db_and_tables,
-    save_chunks_to_postgres,
+    fail_interrupted_jobs,
+    rebuild_was_interrupted,
 )
-from app.models import Document
-from app.routes import debug, query
-from app.utils import logger_error, simple_generate_unique_route_id
+from app.routes import debug, ingestion, query
+from app.utils import logger_error, logger_info, simple_generate_unique_route_id
+from app.vector_store import check_collection_dimension, count_points, run_vector_op
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from openai import OpenAI
+from fastapi.responses import JSONResponse
+from openai import AsyncOpenAI
 
 app = FastAPI(
     title="awesome-docify",
@@ -28,6 +26,13 @@ app = FastAPI(
     openapi_url=settings.OPENAPI_URL,
 )
 
+# Readiness flags, set during startup
+app.state.database_ready = False
+app.state.index_ready = False
+app.state.watcher = None
+# Startup tasks nobody awaits; referenced here so they are not collected
+app.state.background_tasks = set()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
@@ -47,65 +52,121 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Ready once the schema exists and an index is available to query"""
+    index_ready = app.state.index_ready or job_runner.completed_once
+    checks = {
+        "database": app.state.database_ready,
+        "index": index_ready,
+        "ingestion_running": job_runner.is_running,
+    }
+    if app.state.database_ready and index_ready:
+        return {"status": "ready", "checks": checks}
+    return JSONResponse(
+        status_code=503, content={"status": "not_ready", "checks": checks}
+    )
+
+
 # Mount query endpoints
 app.include_router(query.router)
 
 # Mount debug endpoints
 app.include_router(debug.router)
 
+# Mount ingestion job endpoints
+app.include_router(ingestion.router)
+
+
+async def validate_openai_key():
+    try:
+        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        await client.models.list()
+        print("OpenAI API key is valid")
+    except Exception as e:
+        logger_error.error(f"OpenAI API key check failed: {e}")
+
+
+def _start_background_task(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    app.state.background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+
+def _background_task_done(task: asyncio.Task) -> None:
+    app.state.background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger_error.error(
+            f"Background task {task.get_coro().__name__} failed: {task.exception()}"
+        )
+
 
 # Startup logic
 @app.on_event("startup")
 async def startup_event():
     try:
-        # Create database tables
-        await create_db_and_tables()
-
-        await clear_existing_data()
-
-        print("Tables truncated. Ingesting fresh data...")
-
-        docs = await load_documents_from_dir(settings.DOCUMENT_LOADER_DIR)
-
-        if docs:
-            async with AsyncSessionLocal() as session:
-                # Insert documents into DB first
-                for doc in docs:
-                    meta = doc.metadata
-                    document = Document(
-                        doc_id=meta["doc_id"],
-                        file_name=Path(meta.get("file_path", "unknown")).name,
-                        title=meta.get("title", "Untitled"),
-                        file_path=meta.get("file_path", "unknown"),
-                        file_size=meta.get("file_size", 0),
-                        language=meta.get("language", "en"),
-                        version=meta.get(
-                            "version", datetime.datetime.now().isoformat()
-                        ),
-                        last_modified=meta.get(
-                            "last_modified", datetime.datetime.now().isoformat()
-                        ),
-                        source_url=meta.get("source_url", "unknown"),
-                        content_type=meta.get("content_type"),
-                        status_code=meta.get("status_code"),
-                        scrape_id=meta.get("scrape_id"),
-                        content=doc.page_content,
-                    )
-                    session.add(document)
-                await session.commit()
-
-                # chunk and save to document_chunks
-                chunked_docs = await chunk_documents(docs)
-                await save_chunks_to_postgres(chunked_docs, session)
-                await ingest_to_qdrant(chunked_docs)
-
-                print("Documents and chunks ingested into PostgreSQL and Qdrant")
-        else:
-            print("No documents found to ingest")
-
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        client.models.list()
-        print("OpenAI API key is valid")
+        # "full" drops and recreates the schema, "incremental" keeps the data
+        full = settings.INGESTION_MODE == "full"
+        await create_db_and_tables(drop_existing=False)
+        # A rebuild that died halfway (crash, OOM, rate limit) goes on from
+        # its checkpoints instead of starting over
+        resume = full and await rebuild_was_interrupted()
+        if resume:
+            # Checkpoints of a collection built for another VECTOR_DIMENSION
+            # cannot be reused
+            try:
+                await run_vector_op(check_collection_dimension)
+            except ValueError as e:
+                logger_error.error(f"Not resuming the rebuild: {e}")
+                resume = False
+        if full and not resume:
+            await create_db_and_tables(drop_existing=True)
+        await fail_interrupted_jobs()
+        app.state.database_ready = True
+
+        # Serve the existing index while the ingestion job runs, unless it
+        # was built for another VECTOR_DIMENSION
+        index_usable = not full
+        if index_usable:
+            try:
+                await run_vector_op(check_collection_dimension)
+            except ValueError as e:
+                logger_error.error(str(e))
+                index_usable = False
+        app.state.index_ready = index_usable and await run_vector_op(count_points) > 0
+
+        job = await job_runner.start(
+            mode=settings.INGESTION_MODE, trigger="startup", resume=resume
+        )
+        logger_info.info(f"Started ingestion job {job.id} ({settings.INGESTION_MODE})")
+
+        # Picks up edits that were approved but not yet re-indexed, too
+        reindex_worker.start()
+
+        if settings.KEYWORD_INDEX_ENABLED:
+            # Queries use Postgres until the index is ready
+            _start_background_task(build_keyword_index())
+        elif settings.RETRIEVAL_MODE == "hybrid":
+            logger_error.warning(
+                "RETRIEVAL_MODE=hybrid needs KEYWORD_INDEX_ENABLED=true, "
+                "using keyword-filtered retrieval"
+            )
+
+        if settings.WATCH_DOCUMENTS:
+            app.state.watcher = DocumentWatcher()
+            app.state.watcher.start()
+
+        _start_background_task(validate_openai_key())
 
     except Exception as e:
         logger_error.error(f"Startup warning: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await reindex_worker.stop()
+    if app.state.watcher is not None:
+        await app.state.watcher.stop()
+    for task in list(app.state.background_tasks):
+        task.cancel()
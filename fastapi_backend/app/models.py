@@ -2,9 +2,18 @@ import datetime
 import enum
 import uuid
 
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, String, Text
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import (
+    Column,
+    Computed,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import declarative_base, deferred, relationship
 
 Base = declarative_base()
 
@@ -18,6 +27,13 @@ class ChunkType(str, enum.Enum):
     recursive = "recursive"
 
 
+class JobStatus(str, enum.Enum):
+    pending = "pending"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
 # ───────────────────────────────
 # Document Table
 # ───────────────────────────────
@@ -98,6 +114,79 @@ class DocumentChunk(Base):
     chunk_index = Column(Integer)
     chunk_type = Column(Enum(ChunkType))
     content = Column(Text)
+    # Character span in the parent document's content (None if not found)
+    start_offset = Column(Integer)
+    end_offset = Column(Integer)
+    # Qdrant point holding this chunk's vector; another chunk's id when the
+    # text is a duplicate (rows written before deduplication are backfilled
+    # with their own chunk_id at startup)
+    vector_id = Column(UUID(as_uuid=True), index=True)
+    # Maintained by Postgres, used to rank keyword matches
+    content_tsv = deferred(
+        Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True))
+    )
     created_at = Column(DateTime, default=datetime.datetime.utcnow())
 
     document = relationship("Document", back_populates="chunks")
+
+
+# ───────────────────────────────
+# Ingestion Manifest Table
+# ───────────────────────────────
+
+
+class IngestedFile(Base):
+    __tablename__ = "ingested_files"
+
+    # Resolved path of the source JSON file
+    file_path = Column(Text, primary_key=True)
+    doc_id = Column(UUID(as_uuid=True), nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    file_size = Column(Integer)
+    ingested_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+# ───────────────────────────────
+# Ingestion Jobs Table
+# ───────────────────────────────
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    mode = Column(String, nullable=False)  # "incremental" or "full"
+    trigger = Column(String, nullable=False)  # "startup", "api", ...
+    status = Column(Enum(JobStatus), default=JobStatus.pending, nullable=False)
+
+    files_total = Column(Integer, default=0)
+    files_done = Column(Integer, default=0)
+    documents_done = Column(Integer, default=0)
+    chunks_done = Column(Integer, default=0)
+    batches_done = Column(Integer, default=0)
+    duplicates_done = Column(Integer, default=0)
+    error = Column(Text)
+
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+# ───────────────────────────────
+# Re-index Outbox Table
+# ───────────────────────────────
+
+
+class ReindexOutbox(Base):
+    """Documents whose chunks must be re-indexed after an approved edit"""
+
+    __tablename__ = "reindex_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    doc_id = Column(
+        UUID(as_uuid=True), ForeignKey("documents.doc_id", ondelete="CASCADE")
+    )
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    processed_at = Column(DateTime, index=True)
@@ -0,0 +1,313 @@
+import os
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+# Rows scored per matrix product, bounds the float32 copy of float16 storage
+SEARCH_BLOCK_ROWS = 65_536
+_INITIAL_CAPACITY = 1024
+# Stay below SQLite's bound-parameter limit
+_SQL_BATCH = 500
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+class NumpyVectorStore:
+    """
+    Brute-force vector store for corpora up to a few hundred thousand chunks.
+
+    Normalized vectors live in a memory-mapped .npy matrix (float32, or
+    float16 to halve it), one row per point; point ids, row numbers and
+    payloads are kept in SQLite next to it. A search is a dot product of the
+    queries with the candidate rows, so cosine scores are exact.
+
+    Rows of deleted points are reused by later upserts, and the matrix
+    doubles its capacity when full. Reads may run in parallel, writes must
+    not overlap anything else; vector_store.py holds its lock around calls.
+    """
+
+    def __init__(self, directory: str, use_float16: bool = False):
+        self.directory = Path(directory)
+        self.dtype = np.float16 if use_float16 else np.float32
+        self._lock = threading.Lock()
+        # Guards mapping the files, which concurrent readers may trigger
+        self._open_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._vectors: Optional[np.ndarray] = None
+
+    @property
+    def _matrix_path(self) -> Path:
+        return self.directory / "vectors.npy"
+
+    @property
+    def _db_path(self) -> Path:
+        return self.directory / "points.sqlite3"
+
+    # Lifecycle
+
+    def exists(self) -> bool:
+        return self._matrix_path.exists()
+
+    def create(self, dimension: int) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        np.lib.format.open_memmap(
+            self._matrix_path,
+            mode="w+",
+            dtype=self.dtype,
+            shape=(_INITIAL_CAPACITY, dimension),
+        ).flush()
+        self._open()
+
+    def drop(self) -> None:
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def close(self) -> None:
+        with self._open_lock:
+            self._vectors = None
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+
+    def _open(self) -> None:
+        if self._vectors is not None:
+            return
+        with self._open_lock:
+            if self._vectors is not None:
+                return
+            vectors = np.lib.format.open_memmap(self._matrix_path, mode="r+")
+            conn = sqlite3.connect(
+                str(self._db_path), check_same_thread=False, timeout=30
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS points (point_id TEXT PRIMARY KEY, "
+                "row INTEGER NOT NULL, doc_id TEXT, payload BLOB NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_points_doc_id ON points(doc_id)"
+            )
+            conn.commit()
+
+            rows = conn.execute("SELECT point_id, row FROM points").fetchall()
+            self._conn = conn
+            self._rows: Dict[str, int] = dict(rows)
+            self._size = max(self._rows.values(), default=-1) + 1
+            self._ids = np.empty(len(vectors), dtype=object)
+            self._live = np.zeros(len(vectors), dtype=bool)
+            for point_id, row in rows:
+                self._ids[row] = point_id
+                self._live[row] = True
+            self._free = np.flatnonzero(~self._live[: self._size]).tolist()
+            # Set last: other threads skip the lock once the matrix is mapped
+            self._vectors = vectors
+
+    @property
+    def dimension(self) -> int:
+        self._open()
+        return self._vectors.shape[1]
+
+    def count(self) -> int:
+        self._open()
+        return len(self._rows)
+
+    # Writes
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._vectors)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        tmp = self._matrix_path.with_suffix(".tmp.npy")
+        grown = np.lib.format.open_memmap(
+            tmp, mode="w+", dtype=self._vectors.dtype, shape=(capacity, self.dimension)
+        )
+        grown[: len(self._vectors)] = self._vectors
+        grown.flush()
+        os.replace(tmp, self._matrix_path)
+        self._vectors = grown
+        extra = capacity - len(self._ids)
+        self._ids = np.concatenate([self._ids, np.empty(extra, dtype=object)])
+        self._live = np.concatenate([self._live, np.zeros(extra, dtype=bool)])
+
+    def _take_row(self, point_id: str) -> int:
+        row = self._rows.get(point_id)
+        if row is not None:
+            return row
+        if self._free:
+            return self._free.pop()
+        self._size += 1
+        self._grow(self._size)
+        return self._size - 1
+
+    def upsert(
+        self,
+        point_ids: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+        payloads: Sequence[Dict[str, Any]],
+    ) -> None:
+        self._open()
+        # A point repeated within the batch keeps its last vector and payload
+        last = {point_id: i for i, point_id in enumerate(point_ids)}
+        if len(last) < len(point_ids):
+            keep = sorted(last.values())
+            point_ids = [point_ids[i] for i in keep]
+            vectors = [vectors[i] for i in keep]
+            payloads = [payloads[i] for i in keep]
+        rows = [self._take_row(point_id) for point_id in point_ids]
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        self._vectors[rows] = matrix.astype(self._vectors.dtype)
+        # Vectors first: a row only counts once SQLite points at it
+        self._vectors.flush()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO points (point_id, row, doc_id, payload) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        point_id,
+                        row,
+                        payload.get("metadata", {}).get("doc_id"),
+                        orjson.dumps(payload),
+                    )
+                    for point_id, row, payload in zip(point_ids, rows, payloads)
+                ],
+            )
+            self._conn.commit()
+        for point_id, row in zip(point_ids, rows):
+            self._rows[point_id] = row
+            self._ids[row] = point_id
+            self._live[row] = True
+
+    def delete(self, point_ids: Iterable[str]) -> None:
+        self._open()
+        point_ids = [p for p in dict.fromkeys(point_ids) if p in self._rows]
+        if not point_ids:
+            return
+        with self._lock:
+            for i in range(0, len(point_ids), _SQL_BATCH):
+                batch = point_ids[i : i + _SQL_BATCH]
+                self._conn.execute(
+                    f"DELETE FROM points WHERE point_id IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+            self._conn.commit()
+        for point_id in point_ids:
+            row = self._rows.pop(point_id)
+            self._ids[row] = None
+            self._live[row] = False
+            self._free.append(row)
+
+    def document_points(self, doc_ids: Sequence[str]) -> List[str]:
+        """Ids of the points whose payload belongs to one of the documents"""
+        self._open()
+        found = []
+        with self._lock:
+            for i in range(0, len(doc_ids), _SQL_BATCH):
+                batch = list(doc_ids[i : i + _SQL_BATCH])
+                found.extend(
+                    point_id
+                    for (point_id,) in self._conn.execute(
+                        "SELECT point_id FROM points WHERE doc_id IN "
+                        f"({','.join('?' * len(batch))})",
+                        batch,
+                    )
+                )
+        return found
+
+    def set_metadata(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        """Merge values into the payload metadata of existing points"""
+        payloads = self.payloads(list(updates))
+        for point_id, payload in payloads.items():
+            payload.setdefault("metadata", {}).update(updates[point_id])
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE points SET payload = ? WHERE point_id = ?",
+                [(orjson.dumps(p), point_id) for point_id, p in payloads.items()],
+            )
+            self._conn.commit()
+
+    # Reads
+
+    def payloads(self, point_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        self._open()
+        found = {}
+        with self._lock:
+            for i in range(0, len(point_ids), _SQL_BATCH):
+                batch = list(point_ids[i : i + _SQL_BATCH])
+                rows = self._conn.execute(
+                    "SELECT point_id, payload FROM points WHERE point_id IN "
+                    f"({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update((point_id, orjson.loads(p)) for point_id, p in rows)
+        return found
+
+    def vectors(self, point_ids: Sequence[str]) -> Dict[str, List[float]]:
+        self._open()
+        known = [p for p in point_ids if p in self._rows]
+        matrix = self._vectors[[self._rows[p] for p in known]].astype(np.float32)
+        return {point_id: vector.tolist() for point_id, vector in zip(known, matrix)}
+
+    def search(
+        self,
+        queries: np.ndarray,
+        limit: int,
+        point_ids: Optional[Sequence[str]] = None,
+        score_threshold: Optional[float] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Top `limit` points by cosine similarity for each query row, among
+        `point_ids` if given, else among all points.
+        """
+        self._open()
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if point_ids is None:
+            # Contiguous blocks of the matrix, free rows masked out
+            rows = None
+            candidates = self._size
+        else:
+            rows = np.fromiter(
+                (self._rows[p] for p in point_ids if p in self._rows), dtype=np.int64
+            )
+            candidates = len(rows)
+
+        scores = np.empty((len(queries), candidates), dtype=np.float32)
+        for start in range(0, candidates, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, candidates)
+            block = (
+                self._vectors[start:end]
+                if rows is None
+                else self._vectors[rows[start:end]]
+            )
+            scores[:, start:end] = queries @ block.astype(np.float32, copy=False).T
+        if rows is None:
+            rows = np.arange(candidates)
+            scores[:, ~self._live[:candidates]] = -np.inf
+
+        results = []
+        for query_scores in scores:
+            top = np.arange(len(query_scores))
+            if limit < len(top):
+                top = np.argpartition(-query_scores, limit)[:limit]
+            top = top[np.argsort(-query_scores[top], kind="stable")]
+            hits = []
+            for i in top:
+                score = float(query_scores[i])
+                if score == -np.inf or (
+                    score_threshold is not None and score < score_threshold
+                ):
+                    break
+                hits.append((self._ids[rows[i]], score))
+            results.append(hits)
+        return results
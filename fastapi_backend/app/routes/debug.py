@@ -2,9 +2,16 @@ import json
 from pathlib import Path
 
 from app.config import settings
-from app.schemas import CollectionInfo, JSONFileContentResponse, JSONFileListResponse
+from app.embeddings import get_embedding_cache, get_query_embedding_cache
+from app.schemas import (
+    CollectionInfo,
+    EmbeddingCacheStats,
+    JSONFileContentResponse,
+    JSONFileListResponse,
+    QueryEmbeddingCacheStats,
+)
+from app.vector_store import count_points, get_collection_info, run_vector_op
 from fastapi import APIRouter, HTTPException
-from qdrant_client import QdrantClient
 
 router = APIRouter(prefix="/api/v1/debug", tags=["Debug"])
 
@@ -55,19 +62,22 @@ async def read_json_file(filename: str):
 @router.get("/qdrant-status", response_model=CollectionInfo)
 async def check_qdrant_status():
     """
-    Check local Qdrant database status and collection info
+    Check the configured vector store (local or server Qdrant, or NumPy)
+    and its collection info
     """
     try:
-        # Initialize Qdrant client
-        qdrant_path = Path(settings.QDRANT_PATH)
-
-        if not qdrant_path.exists():
-            raise HTTPException(status_code=404, detail="Qdrant directory not found")
-
-        client = QdrantClient(path=str(qdrant_path))
+        # 0 also when the collection does not exist (yet)
+        if not await run_vector_op(count_points):
+            info = {
+                "name": settings.QDRANT_COLLECTION_NAME,
+                "vectors_count": 0,
+                "points_count": 0,
+                "status": "empty",
+            }
+            return CollectionInfo(**info)
 
         # Get collection info
-        collection_info = client.get_collection(settings.QDRANT_COLLECTION_NAME)
+        collection_info = await run_vector_op(get_collection_info)
 
         info = {
             "name": settings.QDRANT_COLLECTION_NAME,
@@ -84,3 +94,25 @@ async def check_qdrant_status():
         raise HTTPException(
             status_code=500, detail=f"Failed to get Qdrant status: {str(e)}"
         )
+
+
+@router.get("/embedding-cache", response_model=EmbeddingCacheStats)
+async def embedding_cache_stats():
+    """
+    Return size and hit-rate statistics of the embedding cache
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        return EmbeddingCacheStats(enabled=False)
+    return EmbeddingCacheStats(enabled=True, **cache.stats())
+
+
+@router.get("/query-embedding-cache", response_model=QueryEmbeddingCacheStats)
+async def query_embedding_cache_stats():
+    """
+    Return size and hit-rate statistics of the in-process query vector cache
+    """
+    cache = get_query_embedding_cache()
+    if cache is None:
+        return QueryEmbeddingCacheStats(enabled=False)
+    return QueryEmbeddingCacheStats(enabled=True, **cache.stats())
@@ -0,0 +1,71 @@
+from app.data_ingestion_service.jobs import IngestionJobConflict, job_runner
+from app.database import get_ingestion_job, list_ingestion_jobs
+from app.models import IngestionJob
+from app.schemas import (
+    IngestionJobListResponse,
+    IngestionJobRequest,
+    IngestionJobResponse,
+)
+from app.utils import logger_error
+from fastapi import APIRouter, HTTPException
+
+router = APIRouter(prefix="/api/v1/ingestion", tags=["Ingestion"])
+
+
+def _job_response(job: IngestionJob) -> IngestionJobResponse:
+    data = {
+        "id": job.id,
+        "mode": job.mode,
+        "trigger": job.trigger,
+        "status": job.status.value,
+        "files_total": job.files_total or 0,
+        "files_done": job.files_done or 0,
+        "documents_done": job.documents_done or 0,
+        "chunks_done": job.chunks_done or 0,
+        "batches_done": job.batches_done or 0,
+        "duplicates_done": job.duplicates_done or 0,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    # The running job's counters are fresher in memory than in the table
+    live = job_runner.live_progress(job.id)
+    if live:
+        data.update(live)
+    return IngestionJobResponse(**data)
+
+
+@router.post("/jobs", response_model=IngestionJobResponse, status_code=202)
+async def start_ingestion_job(request: IngestionJobRequest):
+    """
+    Start a background ingestion job
+    """
+    try:
+        job = await job_runner.start(mode=request.mode, trigger="api")
+    except IngestionJobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger_error.error(f"Error starting ingestion job: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to start job: {e}")
+    return _job_response(job)
+
+
+@router.get("/jobs", response_model=IngestionJobListResponse)
+async def list_jobs(limit: int = 20):
+    """
+    List the most recent ingestion jobs
+    """
+    jobs = await list_ingestion_jobs(limit=limit)
+    return IngestionJobListResponse(jobs=[_job_response(job) for job in jobs])
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_job(job_id: int):
+    """
+    Poll the status and progress of an ingestion job
+    """
+    job = await get_ingestion_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
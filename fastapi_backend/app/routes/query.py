@@ -1,8 +1,8 @@
-from pathlib import Path
 from typing import Dict
 
 from app.ai_engine_service.rag_engine import orchestrator
 from app.config import settings
+from app.data_ingestion_service.reindex import reindex_worker
 from app.database import AsyncSessionLocal, save_document_version_and_update
 from app.models import Document
 from app.schemas import (
@@ -15,8 +15,8 @@ from app.schemas import (
     SavedChange,
 )
 from app.utils import logger_error, logger_info
+from app.vector_store import get_collection_info, run_vector_op
 from fastapi import APIRouter, HTTPException
-from qdrant_client import QdrantClient
 from sqlalchemy.future import select
 
 router = APIRouter(prefix="/api/v1", tags=["Docify"])
@@ -131,6 +131,10 @@ async def save_change(request: SaveChangeRequest):
                 )
                 saved_count += 1
 
+        # Chunks and vectors of the edited documents are refreshed in the
+        # background, the response does not wait for the embedding calls
+        reindex_worker.notify()
+
         print(">>>>> Saved in the database!!!")
         print(">>>>> Saved changes: ", saved_changes)
         print(
@@ -187,12 +191,8 @@ async def collection_info():
     Get vector DB collection info
     """
     try:
-        # Initialize Qdrant client
-        qdrant_path = Path(settings.QDRANT_PATH)
-        client = QdrantClient(path=str(qdrant_path))
-
         # Get collection info
-        collection_info = client.get_collection(settings.QDRANT_COLLECTION_NAME)
+        collection_info = await run_vector_op(get_collection_info)
 
         info = {
             "name": settings.QDRANT_COLLECTION_NAME,
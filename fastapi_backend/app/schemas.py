@@ -76,6 +76,42 @@ class CollectionInfo(BaseModel):
     status: str = Field(..., description="Status of the collection")
 
 
+class IngestionJobRequest(BaseModel):
+    mode: Literal["incremental", "full"] = Field(
+        "incremental",
+        description="'incremental' re-ingests changed files, 'full' rebuilds everything",
+    )
+
+
+class IngestionJobResponse(BaseModel):
+    id: int = Field(..., description="Job id")
+    mode: str = Field(..., description="Ingestion mode")
+    trigger: str = Field(..., description="What started the job (startup, api, ...)")
+    status: str = Field(..., description="pending, running, succeeded or failed")
+    files_total: int = Field(0, description="Files to ingest")
+    files_done: int = Field(0, description="Files loaded so far")
+    documents_done: int = Field(0, description="Documents chunked so far")
+    chunks_done: int = Field(0, description="Chunks embedded and stored so far")
+    batches_done: int = Field(0, description="Embedding batches stored so far")
+    duplicates_done: int = Field(
+        0, description="Chunks that share the vector of an earlier copy"
+    )
+    throughput_chunks_per_sec: Optional[float] = Field(
+        None, description="Chunks stored per second (running jobs only)"
+    )
+    eta_seconds: Optional[float] = Field(
+        None, description="Estimated seconds left (running jobs only)"
+    )
+    error: Optional[str] = Field(None, description="Error of a failed job")
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class IngestionJobListResponse(BaseModel):
+    jobs: List[IngestionJobResponse] = Field(..., description="Most recent jobs first")
+
+
 # ---------- Debug MODELS ----------
 
 
@@ -88,6 +124,28 @@ class JSONFileContentResponse(BaseModel):
     metadata: Dict[str, Any] = Field(..., description="Metadata of the file")
 
 
+class EmbeddingCacheStats(BaseModel):
+    enabled: bool = Field(..., description="Whether the embedding cache is enabled")
+    path: Optional[str] = Field(None, description="Location of the cache file")
+    entries: int = Field(0, description="Number of cached vectors")
+    max_entries: int = Field(0, description="Entries kept before LRU eviction")
+    size_bytes: int = Field(0, description="Size of the cache file on disk")
+    hits: int = Field(0, description="Cache hits since startup")
+    misses: int = Field(0, description="Cache misses since startup")
+    hit_rate: float = Field(0.0, description="hits / (hits + misses)")
+
+
+class QueryEmbeddingCacheStats(BaseModel):
+    enabled: bool = Field(..., description="Whether the query cache is enabled")
+    entries: int = Field(0, description="Number of cached query vectors")
+    max_entries: int = Field(0, description="Entries kept before LRU eviction")
+    ttl_seconds: float = Field(0.0, description="Entry lifetime, 0 for no expiry")
+    hits: int = Field(0, description="Cache hits since startup")
+    misses: int = Field(0, description="Cache misses since startup")
+    expired: int = Field(0, description="Lookups that found an expired entry")
+    hit_rate: float = Field(0.0, description="hits / (hits + misses)")
+
+
 # ---------- Service MODELS ----------
 
 
@@ -0,0 +1,708 @@
+import asyncio
+import datetime
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Disabled,
+    Distance,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    HasIdCondition,
+    IsEmptyCondition,
+    MatchAny,
+    MatchValue,
+    PayloadField,
+    PayloadSchemaType,
+    PointIdsList,
+    PointStruct,
+    QuantizationConfig,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    ScoredPoint,
+    SearchParams,
+    SetPayload,
+    SetPayloadOperation,
+    VectorParams,
+)
+
+from .config import settings
+from .keyword_index import terms
+from .numpy_store import NumpyVectorStore
+from .utils import logger_info
+
+# Qdrant local mode locks its storage folder, so every part of the app has to
+# share a single client instead of opening its own.
+_client: Optional[QdrantClient] = None
+# Used instead of Qdrant when VECTOR_BACKEND is "numpy"
+_numpy_store: Optional[NumpyVectorStore] = None
+# Whether every point carries its keyword tokens, None until checked
+_keywords_complete: Optional[bool] = None
+
+# Top-level payload field with the words of the chunk text
+KEYWORDS_FIELD = "keywords"
+# Payload fields filtered on, indexed on the collection
+PAYLOAD_INDEXES = {
+    "metadata.doc_id": PayloadSchemaType.KEYWORD,
+    KEYWORDS_FIELD: PayloadSchemaType.KEYWORD,
+}
+
+T = TypeVar("T")
+
+
+class _ReadWriteLock:
+    """
+    Many readers or one writer at a time.
+
+    Local mode has no locking of its own: searches may run side by side,
+    but a write must not overlap any other access. Waiting writers go
+    before new readers, so a steady stream of queries cannot starve them.
+    `enabled` is checked on every acquire; when it returns False the lock
+    is skipped.
+    """
+
+    def __init__(self, enabled: Callable[[], bool] = lambda: True):
+        self._enabled = enabled
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        if not self._enabled():
+            yield
+            return
+        with self._cond:
+            while self._writing or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        if not self._enabled():
+            yield
+            return
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+def _in_process_store() -> bool:
+    """True if the vectors live in this process: local Qdrant or NumPy"""
+    return settings.VECTOR_BACKEND == "numpy" or not settings.QDRANT_URL
+
+
+# A Qdrant server handles concurrent requests itself
+_lock = _ReadWriteLock(enabled=_in_process_store)
+# Vector store calls block; they run here instead of on the event loop
+_executor = ThreadPoolExecutor(
+    max_workers=settings.QDRANT_MAX_WORKERS, thread_name_prefix="qdrant"
+)
+
+
+async def run_vector_op(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking function of this module on the bounded Qdrant pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def get_qdrant_client() -> QdrantClient:
+    """Return the process-wide Qdrant client, creating it on first use"""
+    global _client
+    if _client is None:
+        if settings.QDRANT_URL:
+            _client = QdrantClient(url=settings.QDRANT_URL)
+        else:
+            qdrant_path = Path(settings.QDRANT_PATH)
+            qdrant_path.mkdir(parents=True, exist_ok=True)
+            _client = QdrantClient(path=str(qdrant_path))
+    return _client
+
+
+def get_numpy_store() -> Optional[NumpyVectorStore]:
+    """The process-wide numpy store, None when Qdrant is the vector backend"""
+    global _numpy_store
+    if settings.VECTOR_BACKEND != "numpy":
+        return None
+    if _numpy_store is None:
+        _numpy_store = NumpyVectorStore(
+            str(Path(settings.NUMPY_STORE_PATH) / settings.QDRANT_COLLECTION_NAME),
+            use_float16=settings.NUMPY_STORE_FLOAT16,
+        )
+    return _numpy_store
+
+
+@dataclass
+class CollectionStats:
+    points_count: int
+    vectors_count: int
+
+
+def quantization_config() -> Optional[QuantizationConfig]:
+    """Quantization set by QDRANT_QUANTIZATION, None for plain float32"""
+    if settings.QDRANT_QUANTIZATION == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+    if settings.QDRANT_QUANTIZATION == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def _search_params() -> Optional[SearchParams]:
+    if settings.QDRANT_QUANTIZATION == "none":
+        return None
+    return SearchParams(
+        quantization=QuantizationSearchParams(
+            rescore=settings.QDRANT_QUANTIZATION_RESCORE,
+            oversampling=settings.QDRANT_QUANTIZATION_OVERSAMPLING,
+        )
+    )
+
+
+def _check_dimension(size: int) -> None:
+    if size != settings.VECTOR_DIMENSION:
+        raise ValueError(
+            f"Collection '{settings.QDRANT_COLLECTION_NAME}' stores {size}-dimensional "
+            f"vectors but VECTOR_DIMENSION is {settings.VECTOR_DIMENSION}; "
+            "re-ingest with INGESTION_MODE=full"
+        )
+
+
+def check_collection_dimension() -> None:
+    """Raise ValueError if the stored collection has another vector size"""
+    store = get_numpy_store()
+    if store is not None:
+        with _lock.read():
+            if store.exists():
+                _check_dimension(store.dimension)
+        return
+    client = get_qdrant_client()
+    with _lock.read():
+        if not client.collection_exists(settings.QDRANT_COLLECTION_NAME):
+            return
+        config = client.get_collection(settings.QDRANT_COLLECTION_NAME).config
+    _check_dimension(config.params.vectors.size)
+
+
+def ensure_collection() -> None:
+    """
+    Create the collection and its payload indexes if they don't exist, and
+    bring the quantization of an existing collection in line with the
+    settings (Qdrant rebuilds it from the stored vectors, no re-embedding).
+    An existing collection with another vector size is rejected.
+    """
+    store = get_numpy_store()
+    if store is not None:
+        with _lock.write():
+            if store.exists():
+                _check_dimension(store.dimension)
+                return
+            store.create(settings.VECTOR_DIMENSION)
+        logger_info.info(f"Created numpy vector store in {store.directory}")
+        return
+    client = get_qdrant_client()
+    quantization = quantization_config()
+    with _lock.write():
+        if client.collection_exists(settings.QDRANT_COLLECTION_NAME):
+            info = client.get_collection(settings.QDRANT_COLLECTION_NAME)
+            config = info.config
+            _check_dimension(config.params.vectors.size)
+            _create_payload_indexes(client, info.payload_schema or {})
+            current = config.quantization_config
+            # Local mode keeps no quantization, there is nothing to update
+            if settings.QDRANT_URL and current != quantization:
+                client.update_collection(
+                    collection_name=settings.QDRANT_COLLECTION_NAME,
+                    quantization_config=quantization or Disabled.DISABLED,
+                )
+                logger_info.info(
+                    f"Set quantization of '{settings.QDRANT_COLLECTION_NAME}' "
+                    f"to {settings.QDRANT_QUANTIZATION}"
+                )
+            return
+        client.create_collection(
+            collection_name=settings.QDRANT_COLLECTION_NAME,
+            vectors_config=VectorParams(
+                size=settings.VECTOR_DIMENSION,
+                distance=Distance.COSINE,
+                # Only the oversampled candidates are rescored from the originals
+                on_disk=quantization is not None,
+            ),
+            quantization_config=quantization,
+        )
+        _create_payload_indexes(client, {})
+    logger_info.info(f"Created collection '{settings.QDRANT_COLLECTION_NAME}'")
+
+
+def _create_payload_indexes(client: QdrantClient, existing: Dict[str, Any]) -> None:
+    """Index the filtered payload fields, also on collections from older versions"""
+    # Only Qdrant server builds them, local mode scans the payloads
+    if not settings.QDRANT_URL:
+        return
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        if field_name in existing:
+            continue
+        client.create_payload_index(
+            collection_name=settings.QDRANT_COLLECTION_NAME,
+            field_name=field_name,
+            field_schema=field_schema,
+        )
+        logger_info.info(f"Created payload index on '{field_name}'")
+
+
+def _to_payload_value(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def _keyword_tokens(text: str) -> List[str]:
+    # A text without words gets [""], which no keyword matches: an empty
+    # list would count as missing and keep keywords_complete() False
+    return sorted(terms(text)) or [""]
+
+
+def chunk_payload(chunk: Document) -> Dict[str, Any]:
+    """
+    Payload layout used by LangChain's QdrantVectorStore, plus the words
+    of the text so that searches can be scoped to a keyword in Qdrant.
+    """
+    return {
+        "page_content": chunk.page_content,
+        "metadata": {
+            key: _to_payload_value(value) for key, value in chunk.metadata.items()
+        },
+        KEYWORDS_FIELD: _keyword_tokens(chunk.page_content),
+    }
+
+
+def upsert_chunks(chunks: Sequence[Document], vectors: List[List[float]]) -> None:
+    """Write chunks with precomputed vectors, using chunk_id as the point id"""
+    global _keywords_complete
+    if not chunks:
+        return
+    store = get_numpy_store()
+    if store is not None:
+        with _lock.write():
+            store.upsert(
+                [str(chunk.metadata["chunk_id"]) for chunk in chunks],
+                vectors,
+                [chunk_payload(chunk) for chunk in chunks],
+            )
+        return
+    points = [
+        PointStruct(
+            id=chunk.metadata["chunk_id"],
+            vector=vector,
+            payload=chunk_payload(chunk),
+        )
+        for chunk, vector in zip(chunks, vectors)
+    ]
+    with _lock.write():
+        get_qdrant_client().upsert(
+            collection_name=settings.QDRANT_COLLECTION_NAME,
+            points=points,
+            wait=True,
+        )
+        if _keywords_complete is False:
+            # May have replaced the last points without tokens
+            _keywords_complete = None
+
+
+def retrieve_chunks(chunk_ids: Sequence[str]) -> List[Document]:
+    """Fetch chunks directly by point id, keeping the requested order"""
+    if not chunk_ids:
+        return []
+    store = get_numpy_store()
+    with _lock.read():
+        if store is not None:
+            payloads = store.payloads([str(chunk_id) for chunk_id in chunk_ids])
+        else:
+            points = get_qdrant_client().retrieve(
+                collection_name=settings.QDRANT_COLLECTION_NAME,
+                ids=list(chunk_ids),
+                with_payload=True,
+                with_vectors=False,
+            )
+            payloads = {str(point.id): point.payload for point in points}
+    return [
+        Document(
+            page_content=payloads[chunk_id].get("page_content", ""),
+            metadata=payloads[chunk_id].get("metadata", {}),
+        )
+        for chunk_id in map(str, chunk_ids)
+        if chunk_id in payloads
+    ]
+
+
+def retrieve_vectors(point_ids: Sequence[str]) -> Dict[str, List[float]]:
+    """Vectors of the given points, without their payloads"""
+    if not point_ids:
+        return {}
+    store = get_numpy_store()
+    if store is not None:
+        with _lock.read():
+            return store.vectors([str(point_id) for point_id in point_ids])
+    with _lock.read():
+        points = get_qdrant_client().retrieve(
+            collection_name=settings.QDRANT_COLLECTION_NAME,
+            ids=list(point_ids),
+            with_payload=False,
+            with_vectors=True,
+        )
+    return {str(point.id): point.vector for point in points}
+
+
+def update_chunk_metadata(updates: Dict[str, Dict[str, Any]]) -> None:
+    """Merge new metadata values into existing points, keeping their vectors"""
+    if not updates:
+        return
+    store = get_numpy_store()
+    if store is not None:
+        with _lock.write():
+            store.set_metadata(
+                {
+                    str(chunk_id): {k: _to_payload_value(v) for k, v in values.items()}
+                    for chunk_id, values in updates.items()
+                }
+            )
+        return
+    operations = [
+        SetPayloadOperation(
+            set_payload=SetPayload(
+                payload={k: _to_payload_value(v) for k, v in values.items()},
+                points=[chunk_id],
+                key="metadata",
+            )
+        )
+        for chunk_id, values in updates.items()
+    ]
+    with _lock.write():
+        get_qdrant_client().batch_update_points(
+            collection_name=settings.QDRANT_COLLECTION_NAME,
+            update_operations=operations,
+            wait=True,
+        )
+
+
+def delete_points(chunk_ids: Sequence[str]) -> None:
+    """Remove points by chunk id"""
+    if not chunk_ids:
+        return
+    store = get_numpy_store()
+    if store is not None:
+        with _lock.write():
+            store.delete(str(chunk_id) for chunk_id in chunk_ids)
+        return
+    with _lock.write():
+        get_qdrant_client().delete(
+            collection_name=settings.QDRANT_COLLECTION_NAME,
+            points_selector=PointIdsList(points=list(chunk_ids)),
+        )
+
+
+def delete_document_points(
+    doc_ids: List[str], keep_ids: Optional[Sequence[str]] = None
+) -> None:
+    """
+    Remove every point that belongs to one of the given documents.
+
+    `keep_ids` are points other documents still share through a duplicate
+    chunk; they stay in place.
+    """
+    if not doc_ids:
+        return
+
+    store = get_numpy_store()
+    if store is not None:
+        with _lock.write():
+            if not store.exists():
+                return
+            keep = set(map(str, keep_ids or ()))
+            store.delete(
+                p
+                for p in store.document_points(list(map(str, doc_ids)))
+                if p not in keep
+            )
+        logger_info.info(f"Deleted vectors of {len(doc_ids)} documents")
+        return
+
+    selector = FilterSelector(
+        filter=Filter(
+            must=[
+                FieldCondition(key="metadata.doc_id", match=MatchAny(any=list(doc_ids)))
+            ],
+            must_not=[HasIdCondition(has_id=list(keep_ids))] if keep_ids else None,
+        )
+    )
+    client = get_qdrant_client()
+    with _lock.write():
+        if not client.collection_exists(settings.QDRANT_COLLECTION_NAME):
+            return
+        client.delete(
+            collection_name=settings.QDRANT_COLLECTION_NAME,
+            points_selector=selector,
+        )
+    logger_info.info(f"Deleted Qdrant points for {len(doc_ids)} documents")
+
+
+def reset_collection() -> None:
+    """Drop the collection so that the next ingestion starts from scratch"""
+    global _keywords_complete
+    store = get_numpy_store()
+    if store is not None:
+        with _lock.write():
+            store.drop()
+        logger_info.info(f"Dropped numpy vector store in {store.directory}")
+        return
+    client = get_qdrant_client()
+    with _lock.write():
+        if not client.collection_exists(settings.QDRANT_COLLECTION_NAME):
+            return
+        client.delete_collection(settings.QDRANT_COLLECTION_NAME)
+        _keywords_complete = None
+    logger_info.info(f"Dropped collection '{settings.QDRANT_COLLECTION_NAME}'")
+
+
+def scope_filter(
+    point_ids: Optional[Sequence[str]], keyword: Optional[str] = None
+) -> Filter:
+    """
+    The given points, and with a keyword also every point whose text
+    contains all of its words. Without point ids only the keyword is
+    matched, so no id list is sent with the query.
+    """
+    words = terms(keyword) if keyword else None
+    if point_ids is None and not words:
+        raise ValueError("A scope needs point ids or a keyword with words")
+    by_keyword = None
+    if words:
+        by_keyword = Filter(
+            must=[
+                FieldCondition(key=KEYWORDS_FIELD, match=MatchValue(value=word))
+                for word in sorted(words)
+            ]
+        )
+    if point_ids is None:
+        return by_keyword
+    by_id = HasIdCondition(has_id=list(point_ids))
+    if by_keyword is None:
+        return Filter(must=[by_id])
+    return Filter(should=[by_id, by_keyword])
+
+
+def keywords_complete() -> bool:
+    """
+    Whether every point carries its keyword tokens.
+
+    Points written before the tokens were added to the payload have none
+    and would never match a keyword filter; until backfill_keywords() has
+    tokenized them, searches are scoped by point id instead. The numpy backend does not
+    filter on payloads, so it always searches by point id.
+    """
+    global _keywords_complete
+    if settings.VECTOR_BACKEND == "numpy":
+        return False
+    if _keywords_complete is None:
+        client = get_qdrant_client()
+        with _lock.read():
+            if not client.collection_exists(settings.QDRANT_COLLECTION_NAME):
+                return False
+            missing = client.count(
+                collection_name=settings.QDRANT_COLLECTION_NAME,
+                count_filter=Filter(
+                    must=[IsEmptyCondition(is_empty=PayloadField(key=KEYWORDS_FIELD))]
+                ),
+                exact=True,
+            ).count
+        _keywords_complete = missing == 0
+    return _keywords_complete
+
+
+def backfill_keywords(batch_size: int = 256) -> int:
+    """
+    Add the keyword tokens to points written without them, from the text
+    in their payload, so upgraded collections can be filtered by keyword
+    without re-embedding. Returns the number of points updated.
+    """
+    global _keywords_complete
+    if settings.VECTOR_BACKEND == "numpy" or keywords_complete():
+        return 0
+    client = get_qdrant_client()
+    missing = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key=KEYWORDS_FIELD))])
+    updated = 0
+    offset = None
+    while True:
+        with _lock.read():
+            points, offset = client.scroll(
+                collection_name=settings.QDRANT_COLLECTION_NAME,
+                scroll_filter=missing,
+                limit=batch_size,
+                offset=offset,
+                with_payload=["page_content"],
+                with_vectors=False,
+            )
+        if points:
+            with _lock.write():
+                client.batch_update_points(
+                    collection_name=settings.QDRANT_COLLECTION_NAME,
+                    update_operations=[
+                        SetPayloadOperation(
+                            set_payload=SetPayload(
+                                payload={
+                                    KEYWORDS_FIELD: _keyword_tokens(
+                                        point.payload.get("page_content", "")
+                                    )
+                                },
+                                points=[point.id],
+                            )
+                        )
+                        for point in points
+                    ],
+                    wait=True,
+                )
+            updated += len(points)
+        if offset is None:
+            break
+    _keywords_complete = None
+    logger_info.info(f"Backfilled keyword tokens of {updated} points")
+    return updated
+
+
+def search_points(
+    vector: List[float],
+    query_filter: Optional[Filter],
+    limit: int,
+    score_threshold: Optional[float] = None,
+    with_vectors: bool = False,
+) -> List[ScoredPoint]:
+    """
+    Nearest points to the vector among those matching the filter, or in
+    the whole collection without one.
+
+    Points scoring below `score_threshold` are dropped by Qdrant, and only
+    the metadata of the returned points is read, not their text.
+    """
+    store = get_numpy_store()
+    if store is not None:
+        return _search_numpy(
+            store, vector, query_filter, limit, score_threshold, with_vectors
+        )
+    with _lock.read():
+        return (
+            get_qdrant_client()
+            .query_points(
+                collection_name=settings.QDRANT_COLLECTION_NAME,
+                query=vector,
+                query_filter=query_filter,
+                limit=limit,
+                score_threshold=score_threshold,
+                with_payload=["metadata"],
+                with_vectors=with_vectors,
+                search_params=_search_params(),
+            )
+            .points
+        )
+
+
+def _filter_point_ids(query_filter: Optional[Filter]) -> Optional[List[str]]:
+    """Point ids a scope_filter() without keyword selects, None for all"""
+    if query_filter is None:
+        return None
+    conditions = query_filter.must or []
+    if (
+        query_filter.should
+        or len(conditions) != 1
+        or not isinstance(conditions[0], HasIdCondition)
+    ):
+        raise ValueError("The numpy vector backend only filters by point id")
+    return [str(point_id) for point_id in conditions[0].has_id]
+
+
+def _search_numpy(
+    store: NumpyVectorStore,
+    vector: List[float],
+    query_filter: Optional[Filter],
+    limit: int,
+    score_threshold: Optional[float],
+    with_vectors: bool,
+) -> List[ScoredPoint]:
+    with _lock.read():
+        if not store.exists():
+            return []
+        (hits,) = store.search(
+            [vector], limit, _filter_point_ids(query_filter), score_threshold
+        )
+        point_ids = [point_id for point_id, _ in hits]
+        payloads = store.payloads(point_ids)
+        vectors = store.vectors(point_ids) if with_vectors else {}
+    return [
+        ScoredPoint(
+            id=point_id,
+            version=0,
+            score=score,
+            payload={"metadata": payloads.get(point_id, {}).get("metadata", {})},
+            vector=vectors.get(point_id),
+        )
+        for point_id, score in hits
+    ]
+
+
+def count_points() -> int:
+    """Number of points in the collection, 0 if it does not exist"""
+    store = get_numpy_store()
+    if store is not None:
+        with _lock.read():
+            return store.count() if store.exists() else 0
+    client = get_qdrant_client()
+    with _lock.read():
+        if not client.collection_exists(settings.QDRANT_COLLECTION_NAME):
+            return 0
+        return client.count(settings.QDRANT_COLLECTION_NAME).count
+
+
+def get_collection_info() -> CollectionStats:
+    store = get_numpy_store()
+    if store is not None:
+        count = count_points()
+        return CollectionStats(points_count=count, vectors_count=count)
+    with _lock.read():
+        info = get_qdrant_client().get_collection(settings.QDRANT_COLLECTION_NAME)
+    return CollectionStats(
+        points_count=info.points_count or 0,
+        vectors_count=info.vectors_count or info.points_count or 0,
+    )
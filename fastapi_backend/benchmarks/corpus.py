@@ -0,0 +1,117 @@
+import argparse
+import random
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import orjson
+
+WORDS = (
+    "api request response model token stream client server embedding vector "
+    "index query document chunk section header batch latency throughput cache "
+    "retry timeout error limit payload schema field value config deploy build"
+).split()
+
+
+@dataclass
+class CorpusShape:
+    """Size and shape of a synthetic corpus"""
+
+    documents: int = 200
+    sections: int = 8  # sections per document
+    header_depth: int = 3  # deepest header level used (1-3)
+    section_chars: int = 1500  # approximate text length of one section
+    code_block_ratio: float = 0.3  # share of sections that end with a code block
+    boilerplate_ratio: float = 0.0  # share of documents with a shared footer
+    seed: int = 42
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(6, 16))
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraphs(rng: random.Random, chars: int) -> str:
+    paragraphs = []
+    size = 0
+    while size < chars:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(2, 6)))
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def _code_block(rng: random.Random) -> str:
+    name = rng.choice(WORDS)
+    lines = [f"def {name}_{i}(value):\n    return value * {i}" for i in range(3)]
+    return "```python\n" + "\n\n".join(lines) + "\n```"
+
+
+def _footer(index: int) -> str:
+    """Site footer repeated on many pages, only the page link differs"""
+    text = _paragraphs(random.Random(0), 600)
+    return f"## Footer\n\n{text}\n\nYou are reading page {index}."
+
+
+def generate_markdown(shape: CorpusShape, rng: random.Random, title: str) -> str:
+    parts = [f"# {title}", _paragraphs(rng, shape.section_chars // 2)]
+    for i in range(shape.sections):
+        # Walk down to the deepest level and back up, like real docs pages
+        level = 2 + i % max(shape.header_depth - 1, 1)
+        level = min(level, shape.header_depth)
+        parts.append(f"{'#' * level} {rng.choice(WORDS).title()} {i}")
+        parts.append(_paragraphs(rng, shape.section_chars))
+        if rng.random() < shape.code_block_ratio:
+            parts.append(_code_block(rng))
+    # Checked first so that corpora without boilerplate keep their content
+    if shape.boilerplate_ratio and rng.random() < shape.boilerplate_ratio:
+        parts.append(_footer(rng.randint(0, 10**6)))
+    return "\n\n".join(parts) + "\n"
+
+
+def generate_corpus(directory: Path, shape: CorpusShape) -> int:
+    """
+    Write `shape.documents` JSON files in the scraped page format.
+
+    The same shape and seed always produce the same corpus, so results of
+    different runs are comparable. Returns the total size in bytes.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(shape.seed)
+    total = 0
+    for i in range(shape.documents):
+        title = f"Synthetic Page {i}"
+        page = {
+            "markdown": generate_markdown(shape, rng, title),
+            "metadata": {
+                "title": title,
+                "sourceURL": f"https://docs.example.com/page-{i}",
+                "language": "en",
+                "statusCode": 200,
+                "contentType": "text/html",
+            },
+        }
+        data = orjson.dumps(page)
+        (directory / f"page_{i:05d}.json").write_bytes(data)
+        total += len(data)
+    return total
+
+
+def shape_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = CorpusShape()
+    for name, value in asdict(defaults).items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}", type=type(value), default=value
+        )
+
+
+def shape_from_args(args: argparse.Namespace) -> CorpusShape:
+    return CorpusShape(**{name: getattr(args, name) for name in asdict(CorpusShape())})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic corpus")
+    parser.add_argument("directory", type=Path)
+    shape_arguments(parser)
+    args = parser.parse_args()
+    size = generate_corpus(args.directory, shape_from_args(args))
+    print(f"Wrote {args.documents} documents ({size / 1e6:.1f} MB) to {args.directory}")
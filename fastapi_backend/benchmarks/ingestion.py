@@ -0,0 +1,308 @@
+"""
+Ingestion micro-benchmarks.
+
+Generates a synthetic corpus, runs each ingestion stage on it with a fake
+embedder and writes throughput, process peak RSS and per-stage time to a JSON file.
+
+    uv run python -m benchmarks.ingestion --documents 500
+    uv run python -m benchmarks.ingestion --compare benchmarks/results/base.json
+
+The postgres and pipeline stages write to DATABASE_URL and delete their rows
+afterwards; point it at a development database.
+"""
+
+import argparse
+import asyncio
+import datetime
+import hashlib
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import orjson
+from langchain_core.embeddings import Embeddings
+
+from .corpus import CorpusShape, generate_corpus, shape_arguments, shape_from_args
+
+STAGES = ["load", "chunk", "postgres", "qdrant", "pipeline"]
+DEFAULT_STAGES = ["load", "chunk", "postgres", "qdrant"]
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic unit vectors derived from the text, no network calls"""
+
+    def __init__(self, dimension: int, latency: float = 0.0):
+        self.dimension = dimension
+        # Simulated round trip per embedding request
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest())
+        vector = np.random.default_rng(seed).standard_normal(self.dimension)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 if sys.platform != "darwin" else peak / 1024 / 1024
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StageTimer:
+    def __init__(self):
+        self.results: Dict[str, Dict] = {}
+
+    def record(self, stage: str, seconds: float, items: int, unit: str, **extra):
+        rss = peak_rss_mb()
+        self.results[stage] = {
+            "seconds": round(seconds, 4),
+            "items": items,
+            "unit": unit,
+            "per_second": round(items / seconds, 1) if seconds else None,
+            # Cumulative peak of the whole run so far, not of this stage
+            "process_peak_rss_mb": round(rss, 1),
+            **extra,
+        }
+        print(
+            f"{stage:<10} {seconds:8.2f}s  {items:>8} {unit:<9} "
+            f"{items / seconds if seconds else 0:>10.1f}/s  process peak RSS {rss:.0f} MB"
+        )
+
+
+async def run_stages(
+    stages: List[str], corpus_dir: Path, corpus_bytes: int, latency: float
+) -> Dict[str, Dict]:
+    # Imported here: app settings are read from the environment set up in main
+    from app.config import settings
+    from app.data_ingestion_service.ingest import (
+        chunk_documents,
+        ingest_to_qdrant,
+        load_documents_from_dir,
+    )
+
+    timer = StageTimer()
+    embeddings = FakeEmbeddings(settings.VECTOR_DIMENSION, latency)
+
+    started = time.perf_counter()
+    docs = await load_documents_from_dir(str(corpus_dir))
+    elapsed = time.perf_counter() - started
+    if "load" in stages:
+        timer.record(
+            "load",
+            elapsed,
+            len(docs),
+            "documents",
+            mb_per_second=round(corpus_bytes / 1e6 / elapsed, 2),
+        )
+
+    started = time.perf_counter()
+    chunks = await chunk_documents(docs)
+    if "chunk" in stages:
+        timer.record("chunk", time.perf_counter() - started, len(chunks), "chunks")
+
+    doc_ids = [doc.metadata["doc_id"] for doc in docs]
+
+    if "postgres" in stages or "pipeline" in stages:
+        from app.database import (
+            AsyncSessionLocal,
+            create_db_and_tables,
+            delete_documents,
+            save_chunks_to_postgres,
+            save_documents_to_postgres,
+        )
+
+        await create_db_and_tables(drop_existing=False)
+
+    if "postgres" in stages:
+        async with AsyncSessionLocal() as session:
+            try:
+                started = time.perf_counter()
+                await save_documents_to_postgres(docs, session)
+                await save_chunks_to_postgres(chunks, session)
+                timer.record(
+                    "postgres",
+                    time.perf_counter() - started,
+                    len(chunks),
+                    "chunks",
+                    write_mode=settings.POSTGRES_WRITE_MODE,
+                )
+            finally:
+                await delete_documents(doc_ids, session)
+
+    if "qdrant" in stages:
+        started = time.perf_counter()
+        await ingest_to_qdrant(chunks, embeddings=embeddings)
+        timer.record("qdrant", time.perf_counter() - started, len(chunks), "chunks")
+
+    if "pipeline" in stages:
+        from app.data_ingestion_service.pipeline import IngestionPipeline
+
+        pipeline = IngestionPipeline(embeddings=embeddings)
+        try:
+            started = time.perf_counter()
+            stats = await pipeline.run(sorted(corpus_dir.glob("*.json")))
+            timer.record(
+                "pipeline",
+                time.perf_counter() - started,
+                stats.chunks,
+                "chunks",
+                stage_seconds={k: round(v, 4) for k, v in stats.stage_seconds.items()},
+                duplicates=stats.dedup.duplicates,
+            )
+        finally:
+            async with AsyncSessionLocal() as session:
+                await delete_documents(doc_ids, session)
+
+    return timer.results
+
+
+def compare(baseline: Dict, current: Dict, max_regression: float) -> bool:
+    """Print the change per stage; False if a stage got slower than allowed"""
+    ok = True
+    print(f"\nCompared with {baseline.get('git_commit')} ({baseline['timestamp']}):")
+    for stage, result in current["stages"].items():
+        old = baseline["stages"].get(stage)
+        if not old or not old.get("seconds"):
+            print(f"{stage:<10} no baseline")
+            continue
+        change = result["seconds"] / old["seconds"] - 1
+        # Baselines saved before the key was renamed use "peak_rss_mb"
+        old_rss = old.get("process_peak_rss_mb", old.get("peak_rss_mb", 0))
+        flag = ""
+        if change > max_regression:
+            flag = "  REGRESSION"
+            ok = False
+        print(
+            f"{stage:<10} {old['seconds']:8.2f}s -> {result['seconds']:8.2f}s "
+            f"({change:+.1%}), process peak RSS {old_rss:.0f} -> "
+            f"{result['process_peak_rss_mb']:.0f} MB{flag}"
+        )
+    if baseline.get("shape") != current["shape"]:
+        print("Warning: the baseline was measured on a different corpus shape")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    shape_arguments(parser)
+    parser.add_argument(
+        "--stages",
+        default=",".join(DEFAULT_STAGES),
+        help=f"comma separated subset of {','.join(STAGES)}",
+    )
+    parser.add_argument(
+        "--embed-latency-ms",
+        type=float,
+        default=0.0,
+        help="simulated latency of one embedding request",
+    )
+    parser.add_argument("--output", type=Path, help="where to write the results")
+    parser.add_argument("--compare", type=Path, help="baseline results to diff")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.15,
+        help="allowed slowdown per stage before --compare fails, 0.15 = 15%%",
+    )
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    shape: CorpusShape = shape_from_args(args)
+
+    with tempfile.TemporaryDirectory(prefix="docify-bench-") as tmp:
+        corpus_dir = Path(tmp) / "corpus"
+        corpus_bytes = generate_corpus(corpus_dir, shape)
+        print(
+            f"Generated {shape.documents} documents "
+            f"({corpus_bytes / 1e6:.1f} MB) in {corpus_dir}\n"
+        )
+
+        # Keep the benchmark away from the real index and embedding cache
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+        os.environ["QDRANT_PATH"] = str(Path(tmp) / "qdrant")
+        os.environ["QDRANT_COLLECTION_NAME"] = "benchmark"
+        os.environ["DOCUMENT_LOADER_DIR"] = str(corpus_dir)
+        os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+
+        stage_results = asyncio.run(
+            run_stages(stages, corpus_dir, corpus_bytes, args.embed_latency_ms / 1000)
+        )
+
+    from app.config import settings
+
+    results = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "shape": shape.__dict__,
+        "settings": {
+            name: getattr(settings, name)
+            for name in (
+                "CHUNK_SIZE",
+                "CHUNK_OVERLAP",
+                "CHUNKING_EXECUTOR",
+                "CHUNKING_WORKERS",
+                "LOADER_WORKERS",
+                "EMBEDDING_BATCH_SIZE",
+                "EMBEDDING_BATCH_TOKENS",
+                "EMBEDDING_MAX_CONCURRENCY",
+                "POSTGRES_WRITE_MODE",
+            )
+        },
+        "stages": stage_results,
+    }
+
+    output = args.output or RESULTS_DIR / (
+        datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        baseline = orjson.loads(args.compare.read_bytes())
+        if not compare(baseline, results, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Vector quantization benchmark.
+
+Compares exact float32 search with int8 scalar and binary quantization,
+oversampled and rescored on the original vectors, and writes recall@k,
+RAM per vector and search latency to a JSON file.
+
+    uv run python -m benchmarks.quantization --source collection
+    uv run python -m benchmarks.quantization --vectors 50000 --oversampling 1,2,4
+
+`--source collection` reads the vectors of QDRANT_COLLECTION_NAME, i.e. the
+ingested corpus; `--source synthetic` generates clustered unit vectors.
+Quantization is simulated with numpy the way Qdrant applies it, so no
+Qdrant server is needed. Searches are brute force: latency compares the
+methods with each other, not with Qdrant's HNSW index, and int8 scores are
+computed in float32 (numpy has no int8 matrix product), so scalar latency
+is overstated.
+"""
+
+import argparse
+import datetime
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import orjson
+
+from .ingestion import RESULTS_DIR, git_commit
+
+
+def synthetic_vectors(
+    count: int, dimension: int, clusters: int = 64, seed: int = 42
+) -> np.ndarray:
+    """Unit vectors around random topic centroids, like chunks of a corpus"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centroids[rng.integers(0, clusters, size=count)]
+    vectors += 0.8 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def collection_vectors(limit: int) -> np.ndarray:
+    """Vectors stored in the app's Qdrant collection"""
+    from app.config import settings
+    from app.vector_store import get_qdrant_client
+
+    client = get_qdrant_client()
+    vectors, offset = [], None
+    while len(vectors) < limit:
+        points, offset = client.scroll(
+            settings.QDRANT_COLLECTION_NAME,
+            limit=min(1000, limit - len(vectors)),
+            offset=offset,
+            with_payload=False,
+            with_vectors=True,
+        )
+        vectors.extend(point.vector for point in points)
+        if offset is None:
+            break
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    top = np.argpartition(-scores, k)[:k] if k < len(scores) else np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+def _rescore(base: np.ndarray, query: np.ndarray, candidates: np.ndarray, k: int):
+    return candidates[_top_k(base[candidates] @ query, min(k, len(candidates)))]
+
+
+class ScalarIndex:
+    """int8 codes over the [0.5%, 99.5%] range of all values (quantile 0.99)"""
+
+    def __init__(self, base: np.ndarray, quantile: float = 0.99):
+        tail = (1 - quantile) / 2
+        self.low, high = np.quantile(base, [tail, 1 - tail])
+        self.scale = np.float32((high - self.low) / 255)
+        codes = np.clip(np.round((base - self.low) / self.scale), 0, 255)
+        self.codes = codes.astype(np.uint8)
+        self._matrix = self.codes.astype(np.float32)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        # Dot product with the dequantized vectors, up to a constant shift
+        return self._matrix @ (query * self.scale)
+
+
+class BinaryIndex:
+    """One sign bit per dimension, compared by Hamming distance"""
+
+    def __init__(self, base: np.ndarray):
+        self.bits = np.packbits(base > 0, axis=1)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        query_bits = np.packbits(query > 0)
+        return -np.bitwise_count(self.bits ^ query_bits).sum(axis=1, dtype=np.int32)
+
+
+def measure(
+    search: Callable[[np.ndarray], np.ndarray],
+    queries: np.ndarray,
+    truth: List[np.ndarray],
+    k: int,
+) -> Tuple[float, float]:
+    """Mean recall@k against the exact results, and milliseconds per query"""
+    hits = 0
+    started = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        hits += len(np.intersect1d(search(query), expected))
+    elapsed = time.perf_counter() - started
+    return hits / (k * len(queries)), elapsed * 1000 / len(queries)
+
+
+def run(
+    vectors: np.ndarray, queries: int, k: int, oversampling: List[float], seed: int
+) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    # Held out vectors, slightly perturbed, stand in for query embeddings
+    query_vectors = vectors[order[:queries]]
+    query_vectors = query_vectors + 0.05 * rng.standard_normal(
+        query_vectors.shape
+    ).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    base = np.ascontiguousarray(vectors[order[queries:]])
+    dimension = base.shape[1]
+
+    truth = [_top_k(base @ query, k) for query in query_vectors]
+    exact_recall, exact_ms = measure(
+        lambda q: _top_k(base @ q, k), query_vectors, truth, k
+    )
+    rows = [
+        {
+            "method": "float32",
+            "oversampling": None,
+            "recall": exact_recall,
+            "ms_per_query": exact_ms,
+            "ram_bytes_per_vector": 4 * dimension,
+        }
+    ]
+
+    indexes = {
+        "scalar": (ScalarIndex(base), dimension),
+        "binary": (BinaryIndex(base), dimension // 8),
+    }
+    for method, (index, ram_bytes) in indexes.items():
+        for factor in oversampling:
+            limit = max(k, int(k * factor))
+
+            def search(query, index=index, limit=limit):
+                return _rescore(base, query, _top_k(index.scores(query), limit), k)
+
+            recall, ms = measure(search, query_vectors, truth, k)
+            rows.append(
+                {
+                    "method": method,
+                    "oversampling": factor,
+                    "recall": recall,
+                    "ms_per_query": ms,
+                    # The originals stay on disk, only read for rescoring
+                    "ram_bytes_per_vector": ram_bytes,
+                }
+            )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--source", choices=["synthetic", "collection"], default="synthetic"
+    )
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=16, help="results per query")
+    parser.add_argument(
+        "--oversampling", default="1,2,4,8", help="comma separated factors to try"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="where to write the results")
+    args = parser.parse_args()
+
+    if args.source == "collection":
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+        vectors = collection_vectors(args.vectors + args.queries)
+    else:
+        vectors = synthetic_vectors(args.vectors + args.queries, args.dimension)
+    if len(vectors) <= args.queries:
+        parser.error(f"only {len(vectors)} vectors, need more than --queries")
+    oversampling = [float(f) for f in args.oversampling.split(",") if f.strip()]
+    print(f"{len(vectors) - args.queries} vectors of {vectors.shape[1]} dimensions\n")
+
+    rows = run(vectors, args.queries, args.k, oversampling, args.seed)
+    print(
+        f"{'method':<9} {'oversample':>10} {'recall@' + str(args.k):>10} "
+        f"{'ms/query':>9} {'RAM/vector':>11} {'RAM/1M':>9}"
+    )
+    for row in rows:
+        factor = f"{row['oversampling']:g}x" if row["oversampling"] else "-"
+        print(
+            f"{row['method']:<9} {factor:>10} {row['recall']:>10.3f} "
+            f"{row['ms_per_query']:>9.2f} {row['ram_bytes_per_vector']:>9} B "
+            f"{row['ram_bytes_per_vector'] * 1e6 / 2**20:>6.0f} MB"
+        )
+
+    results = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "source": args.source,
+        "vectors": len(vectors) - args.queries,
+        "dimension": int(vectors.shape[1]),
+        "queries": args.queries,
+        "k": args.k,
+        "results": rows,
+    }
+    output = args.output or RESULTS_DIR / (
+        "quantization-" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Vector backend benchmark.
+
+Loads the same synthetic vectors into the in-process numpy store and into
+local Qdrant, then times upserts, whole-collection and id-scoped searches,
+and batched numpy searches, and writes the results to a JSON file.
+
+    uv run python -m benchmarks.vector_backends --vectors 50000
+    uv run python -m benchmarks.vector_backends --vectors 200000 --float16
+
+Both stores are created in a temporary directory. Scoped searches use
+random point ids, like the keyword candidates of a filtered retrieval.
+"""
+
+import argparse
+import datetime
+import os
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+import orjson
+
+from .ingestion import RESULTS_DIR, git_commit, peak_rss_mb
+from .quantization import synthetic_vectors
+
+UPSERT_BATCH = 1000
+
+
+def _ms_per_call(func: Callable[[], object], repeats: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeats
+
+
+def run(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    scope: int,
+    batch: int,
+    use_float16: bool,
+    directory: Path,
+) -> List[Dict]:
+    from app.numpy_store import NumpyVectorStore
+    from qdrant_client import QdrantClient
+    from qdrant_client.http.models import (
+        Distance,
+        Filter,
+        HasIdCondition,
+        PointStruct,
+        VectorParams,
+    )
+
+    ids = [str(uuid.UUID(int=i + 1)) for i in range(len(vectors))]
+    rng = np.random.default_rng(0)
+    scoped_ids = [ids[i] for i in rng.choice(len(ids), scope, replace=False)]
+    payloads = [{"metadata": {"doc_id": str(i // 20)}} for i in range(len(ids))]
+    rows = []
+
+    store = NumpyVectorStore(str(directory / "numpy"), use_float16=use_float16)
+    store.create(vectors.shape[1])
+    started = time.perf_counter()
+    for i in range(0, len(ids), UPSERT_BATCH):
+        end = i + UPSERT_BATCH
+        store.upsert(ids[i:end], vectors[i:end], payloads[i:end])
+    upsert_seconds = time.perf_counter() - started
+    rows.append(
+        {
+            "backend": "numpy-float16" if use_float16 else "numpy",
+            "upsert_per_second": len(ids) / upsert_seconds,
+            "ms_per_query": _ms_per_call(
+                lambda: [store.search([q], k) for q in queries], 1
+            )
+            / len(queries),
+            "scoped_ms_per_query": _ms_per_call(
+                lambda: [store.search([q], k, scoped_ids) for q in queries], 1
+            )
+            / len(queries),
+            "batched_ms_per_query": _ms_per_call(
+                lambda: [
+                    store.search(queries[i : i + batch], k)
+                    for i in range(0, len(queries), batch)
+                ],
+                1,
+            )
+            / len(queries),
+        }
+    )
+    store.close()
+
+    client = QdrantClient(path=str(directory / "qdrant"))
+    client.create_collection(
+        "benchmark",
+        vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.COSINE),
+    )
+    started = time.perf_counter()
+    for i in range(0, len(ids), UPSERT_BATCH):
+        client.upsert(
+            "benchmark",
+            points=[
+                PointStruct(id=point_id, vector=vector.tolist(), payload=payload)
+                for point_id, vector, payload in zip(
+                    ids[i : i + UPSERT_BATCH],
+                    vectors[i : i + UPSERT_BATCH],
+                    payloads[i : i + UPSERT_BATCH],
+                )
+            ],
+            wait=True,
+        )
+    upsert_seconds = time.perf_counter() - started
+    scoped = Filter(must=[HasIdCondition(has_id=scoped_ids)])
+
+    def search(query_filter):
+        for query in queries:
+            client.query_points(
+                "benchmark",
+                query=query.tolist(),
+                query_filter=query_filter,
+                limit=k,
+                with_payload=["metadata"],
+            )
+
+    rows.append(
+        {
+            "backend": "qdrant-local",
+            "upsert_per_second": len(ids) / upsert_seconds,
+            "ms_per_query": _ms_per_call(lambda: search(None), 1) / len(queries),
+            "scoped_ms_per_query": _ms_per_call(lambda: search(scoped), 1)
+            / len(queries),
+            "batched_ms_per_query": None,
+        }
+    )
+    client.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=16, help="results per query")
+    parser.add_argument(
+        "--scope", type=int, default=500, help="point ids of a scoped search"
+    )
+    parser.add_argument(
+        "--batch", type=int, default=32, help="queries per batched numpy search"
+    )
+    parser.add_argument("--float16", action="store_true", help="float16 numpy store")
+    parser.add_argument("--output", type=Path, help="where to write the results")
+    args = parser.parse_args()
+    if args.scope > args.vectors:
+        parser.error("--scope can not exceed --vectors")
+
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    vectors = synthetic_vectors(args.vectors + args.queries, args.dimension)
+    queries, vectors = vectors[: args.queries], vectors[args.queries :]
+    print(f"{len(vectors)} vectors of {args.dimension} dimensions\n")
+
+    with tempfile.TemporaryDirectory(prefix="docify-bench-") as tmp:
+        rows = run(
+            vectors,
+            queries,
+            args.k,
+            args.scope,
+            args.batch,
+            args.float16,
+            Path(tmp),
+        )
+
+    print(
+        f"{'backend':<14} {'upserts/s':>10} {'ms/query':>9} "
+        f"{'scoped ms':>10} {'batched ms':>11}"
+    )
+    for row in rows:
+        batched = row["batched_ms_per_query"]
+        print(
+            f"{row['backend']:<14} {row['upsert_per_second']:>10.0f} "
+            f"{row['ms_per_query']:>9.2f} {row['scoped_ms_per_query']:>10.2f} "
+            f"{'-' if batched is None else f'{batched:.2f}':>11}"
+        )
+    print(f"\nprocess peak RSS {peak_rss_mb():.0f} MB")
+
+    results = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "vectors": len(vectors),
+        "dimension": args.dimension,
+        "queries": args.queries,
+        "k": args.k,
+        "scope": args.scope,
+        "batch": args.batch,
+        "results": rows,
+    }
+    output = args.output or RESULTS_DIR / (
+        "vector-backends-" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import pytest
+from app import embeddings
+from app.config import settings
+
+
+@pytest.fixture(autouse=True)
+def embedding_cache_in_tmp(tmp_path, monkeypatch):
+    """Keep the on-disk embedding cache out of the repository"""
+    monkeypatch.setattr(
+        settings, "EMBEDDING_CACHE_PATH", str(tmp_path / "embedding_cache.sqlite3")
+    )
+    monkeypatch.setattr(embeddings, "_cache", None)
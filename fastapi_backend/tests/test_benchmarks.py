@@ -0,0 +1,49 @@
+import asyncio
+
+from app.data_ingestion_service.ingest import load_documents_from_dir
+from benchmarks.corpus import CorpusShape, generate_corpus
+from benchmarks.ingestion import compare
+from benchmarks.quantization import run, synthetic_vectors
+
+
+def test_synthetic_corpus_is_deterministic_and_loadable(tmp_path):
+    shape = CorpusShape(documents=3, sections=4, header_depth=3, code_block_ratio=1)
+    generate_corpus(tmp_path / "a", shape)
+    generate_corpus(tmp_path / "b", shape)
+
+    first = sorted((tmp_path / "a").glob("*.json"))
+    assert [f.read_bytes() for f in first] == [
+        f.read_bytes() for f in sorted((tmp_path / "b").glob("*.json"))
+    ]
+
+    docs = asyncio.run(load_documents_from_dir(str(tmp_path / "a")))
+    assert len(docs) == 3
+    markdown = docs[0].page_content
+    assert "\n### " in markdown
+    assert markdown.count("```python") == 4
+
+
+def test_quantized_search_with_rescoring_recovers_exact_results():
+    vectors = synthetic_vectors(2000, 64, clusters=8)
+
+    rows = run(vectors, queries=20, k=5, oversampling=[4], seed=1)
+    recall = {row["method"]: row["recall"] for row in rows}
+
+    assert recall["float32"] == 1.0
+    assert recall["scalar"] >= 0.95
+    assert 0 < recall["binary"] <= recall["scalar"]
+
+
+def test_compare_reads_baselines_with_the_old_rss_key(capsys):
+    baseline = {
+        "timestamp": "t",
+        "shape": {},
+        "stages": {"load": {"seconds": 1.0, "peak_rss_mb": 100}},
+    }
+    current = {
+        "shape": {},
+        "stages": {"load": {"seconds": 1.05, "process_peak_rss_mb": 120}},
+    }
+
+    assert compare(baseline, current, max_regression=0.15)
+    assert "process peak RSS 100 -> 120 MB" in capsys.readouterr().out
@@ -0,0 +1,37 @@
+from app.ai_engine_service.context import select_context
+
+
+def test_near_duplicates_are_skipped_and_diverse_hits_kept():
+    ranked = [("a", 0.62), ("a-copy", 0.61), ("b", 0.55), ("weak", 0.30)]
+    vectors = {
+        "a": [1.0, 0.0, 0.0],
+        "a-copy": [0.99, 0.05, 0.0],
+        "b": [0.0, 1.0, 0.0],
+        "weak": [0.0, 0.0, 1.0],
+    }
+
+    selected = select_context(
+        ranked, vectors, max_chunks=5, diversity=0.7, duplicate_similarity=0.95
+    )
+    assert selected == ["a", "b", "weak"]
+
+    # "weak" scores more than the margin below the best hit
+    selected = select_context(
+        ranked,
+        vectors,
+        max_chunks=5,
+        diversity=0.7,
+        duplicate_similarity=0.95,
+        score_margin=0.15,
+    )
+    assert selected == ["a", "b"]
+
+
+def test_at_most_max_chunks_are_picked():
+    ranked = [(str(i), 1.0 - i / 10) for i in range(5)]
+
+    selected = select_context(
+        ranked, {}, max_chunks=2, diversity=0.7, duplicate_similarity=0.95
+    )
+
+    assert selected == ["0", "1"]
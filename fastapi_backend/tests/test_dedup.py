@@ -0,0 +1,49 @@
+from app.config import settings
+from app.data_ingestion_service.dedup import ChunkDeduplicator
+from langchain.schema import Document
+
+FOOTER = (
+    "Copyright the project authors. Licensed under the Apache License, "
+    "Version 2.0. See the LICENSE file distributed with this work for "
+    "additional information regarding copyright ownership and the terms "
+    "under which you may use, modify and share this documentation page."
+)
+
+
+def _chunk(chunk_id, text):
+    return Document(page_content=text, metadata={"chunk_id": chunk_id})
+
+
+def test_exact_and_near_duplicates_share_the_first_vector():
+    chunks = [
+        _chunk("a", FOOTER),
+        _chunk("b", "Install the client with pip and set your API key first."),
+        _chunk("c", "  " + FOOTER.upper()),
+        _chunk("d", FOOTER.replace("this work", "this project work")),
+    ]
+    deduplicator = ChunkDeduplicator(threshold=0.8, num_perm=128, bands=16)
+
+    unique = deduplicator.assign(chunks)
+
+    assert [c.metadata["chunk_id"] for c in unique] == ["a", "b"]
+    assert [c.metadata["vector_id"] for c in chunks] == ["a", "b", "a", "a"]
+    stats = deduplicator.stats
+    assert (stats.exact_duplicates, stats.near_duplicates) == (1, 1)
+
+
+def test_exact_matching_only_keeps_near_duplicates_apart():
+    chunks = [
+        _chunk("a", FOOTER),
+        _chunk("b", FOOTER.replace("this work", "this project work")),
+    ]
+    deduplicator = ChunkDeduplicator(threshold=1.0, num_perm=128, bands=16)
+
+    assert len(deduplicator.assign(chunks)) == 2
+
+
+def test_near_duplicates_are_only_shared_when_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "DEDUP_NEAR_DUPLICATES", False)
+    assert ChunkDeduplicator().threshold == 1.0
+
+    monkeypatch.setattr(settings, "DEDUP_NEAR_DUPLICATES", True)
+    assert ChunkDeduplicator().threshold == settings.DEDUP_NEAR_THRESHOLD
@@ -0,0 +1,189 @@
+import asyncio
+import time
+
+import pytest
+import tiktoken
+from app import embeddings
+from app.embeddings import (
+    CachedEmbeddings,
+    EmbeddingCache,
+    QueryCachedEmbeddings,
+    QueryEmbeddingCache,
+    TokenBatchedEmbeddings,
+    count_tokens,
+    dimensions_argument,
+    get_embeddings,
+    pack_by_tokens,
+)
+from langchain_core.embeddings import Embeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _cached(tmp_path, **kwargs):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), **kwargs)
+    inner = CountingEmbeddings()
+    return CachedEmbeddings(inner, cache, model="test-model", dimension=3), inner
+
+
+def test_cache_file_is_created_on_first_use(tmp_path):
+    embeddings, _ = _cached(tmp_path, max_entries=100)
+
+    assert not (tmp_path / "cache.sqlite3").exists()
+    embeddings.embed_documents(["a"])
+    assert (tmp_path / "cache.sqlite3").exists()
+
+
+def test_repeated_texts_are_embedded_once(tmp_path):
+    embeddings, inner = _cached(tmp_path, max_entries=100)
+
+    first = embeddings.embed_documents(["a", "bb", "a"])
+    second = embeddings.embed_documents(["bb", "ccc"])
+
+    assert inner.calls == [["a", "bb"], ["ccc"]]
+    assert first == [[1.0, 1.0, 0.5], [2.0, 1.0, 0.5], [1.0, 1.0, 0.5]]
+    assert second[0] == first[1]
+    stats = embeddings.cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 4)
+
+
+def test_cache_persists_and_evicts_least_recently_used(tmp_path):
+    embeddings, _ = _cached(tmp_path, max_entries=2, use_float16=True)
+    embeddings.embed_documents(["a", "bb"])
+    embeddings.embed_query("a")  # refresh "a"
+    embeddings.embed_query("ccc")  # evicts "bb"
+
+    reopened, inner = _cached(tmp_path, max_entries=2)
+    reopened.embed_documents(["a", "bb", "ccc"])
+
+    assert inner.calls == [["bb"]]
+
+
+def test_pack_by_tokens_respects_budget_and_count():
+    batches = pack_by_tokens(
+        [40, 50, 20, 90, 200, 5, 5, 5], max_tokens=100, max_texts=2
+    )
+
+    assert [list(b) for b in batches] == [[0, 1], [2], [3], [4], [5, 6], [7]]
+
+
+def test_token_batches_run_concurrently_and_keep_order():
+    class SlowEmbeddings(CountingEmbeddings):
+        in_flight = peak = 0
+
+        async def aembed_documents(self, texts):
+            SlowEmbeddings.in_flight += 1
+            SlowEmbeddings.peak = max(SlowEmbeddings.peak, SlowEmbeddings.in_flight)
+            await asyncio.sleep(0.01)
+            SlowEmbeddings.in_flight -= 1
+            return self.embed_documents(texts)
+
+    inner = SlowEmbeddings()
+    embeddings = TokenBatchedEmbeddings(
+        inner, model="test-model", max_tokens=10_000, max_texts=2, max_concurrency=3
+    )
+    texts = ["a" * n for n in range(1, 12)]
+
+    vectors = asyncio.run(embeddings.aembed_documents(texts))
+
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    assert len(inner.calls) == 6
+    assert SlowEmbeddings.peak == 3
+
+
+def _query_cached(**kwargs):
+    inner = CountingEmbeddings()
+    cache = QueryEmbeddingCache(**kwargs)
+    return QueryCachedEmbeddings(inner, cache, model="m", dimension=3), inner, cache
+
+
+def test_normalized_queries_share_one_vector():
+    embeddings, inner, cache = _query_cached(max_entries=10)
+
+    first = embeddings.embed_query("update  the\tapi key ")
+    second = embeddings.embed_query("update the api key")
+
+    assert first == second
+    assert inner.calls == [["update the api key"]]
+    assert cache.stats()["hits"] == 1
+
+
+def test_query_cache_evicts_least_recently_used_and_expired(monkeypatch):
+    embeddings, inner, cache = _query_cached(max_entries=2, ttl=60)
+    for query in ["a", "b", "a", "c"]:
+        embeddings.embed_query(query)
+    # "b" was evicted, "a" was kept by its second use
+    embeddings.embed_query("a")
+    embeddings.embed_query("b")
+    assert [call[0] for call in inner.calls] == ["a", "b", "c", "b"]
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 120)
+    embeddings.embed_query("a")
+    assert cache.stats()["expired"] == 1
+
+
+def test_concurrent_identical_queries_send_one_request():
+    class SlowEmbeddings(CountingEmbeddings):
+        async def aembed_query(self, text):
+            await asyncio.sleep(0.01)
+            return self.embed_query(text)
+
+    inner = SlowEmbeddings()
+    embeddings = QueryCachedEmbeddings(
+        inner, QueryEmbeddingCache(max_entries=10), model="m", dimension=3
+    )
+
+    async def run():
+        return await asyncio.gather(*(embeddings.aembed_query("q") for _ in range(5)))
+
+    vectors = asyncio.run(run())
+
+    assert len(inner.calls) == 1
+    assert all(vector == vectors[0] for vector in vectors)
+
+
+def test_dimensions_argument_shortens_only_v3_models():
+    assert dimensions_argument("text-embedding-3-small", 1536) is None
+    assert dimensions_argument("text-embedding-3-small", 512) == 512
+    assert dimensions_argument("text-embedding-3-large", 1024) == 1024
+
+    with pytest.raises(ValueError):
+        dimensions_argument("text-embedding-3-small", 3072)
+    with pytest.raises(ValueError):
+        dimensions_argument("text-embedding-ada-002", 512)
+
+
+def test_dimensions_argument_leaves_unknown_models_at_full_size():
+    assert dimensions_argument("my-finetuned-embedder", 768) is None
+
+
+def test_prepacked_callers_get_embeddings_without_token_batching():
+    packed = get_embeddings()
+    direct = get_embeddings(token_batching=False)
+
+    assert isinstance(packed.embeddings, TokenBatchedEmbeddings)
+    assert not isinstance(direct.embeddings, TokenBatchedEmbeddings)
+
+
+def test_failed_tokenizer_load_is_retried(monkeypatch):
+    def offline(model):
+        raise OSError("no network")
+
+    embeddings._load_encoding.cache_clear()
+    monkeypatch.setattr(tiktoken, "encoding_for_model", offline)
+    assert count_tokens(["abcdefgh"], "test-model") == [3]
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda model: "loaded")
+    assert embeddings._get_encoding("test-model") == "loaded"
+    embeddings._load_encoding.cache_clear()
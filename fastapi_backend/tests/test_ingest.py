@@ -0,0 +1,86 @@
+import asyncio
+from pathlib import Path
+
+from app.config import settings
+from app.data_ingestion_service.ingest import chunk_documents, iter_load_results
+from langchain.schema import Document
+
+MARKDOWN = "# Guide\n\nIntro text.\n\n## Install\n\nRun the installer.\n"
+
+
+def _doc(content=MARKDOWN, doc_id="0b7f6a56-2a4c-5c3e-8f1d-000000000001"):
+    return Document(page_content=content, metadata={"doc_id": doc_id})
+
+
+def test_chunk_ids_are_deterministic():
+    first = asyncio.run(chunk_documents([_doc()]))
+    second = asyncio.run(chunk_documents([_doc()]))
+
+    assert [c.metadata["chunk_id"] for c in first] == [
+        c.metadata["chunk_id"] for c in second
+    ]
+    assert [c.metadata["section_path"] for c in first] == [
+        "Guide",
+        "Guide > Install",
+    ]
+
+
+def test_editing_one_section_keeps_other_chunk_ids():
+    original = asyncio.run(chunk_documents([_doc()]))
+    edited = asyncio.run(
+        chunk_documents([_doc(MARKDOWN.replace("installer", "new installer"))])
+    )
+
+    assert original[0].metadata["chunk_id"] == edited[0].metadata["chunk_id"]
+    assert original[1].metadata["chunk_id"] != edited[1].metadata["chunk_id"]
+
+
+def test_duplicate_sections_get_distinct_ids():
+    chunks = asyncio.run(chunk_documents([_doc("# A\n\nsame\n\n# A\n\nsame\n")]))
+
+    assert len({c.metadata["chunk_id"] for c in chunks}) == len(chunks)
+
+
+def test_pooled_chunking_matches_inline(monkeypatch):
+    docs = [
+        _doc(MARKDOWN * (i + 1), doc_id=f"0b7f6a56-2a4c-5c3e-8f1d-{i:012d}")
+        for i in range(5)
+    ]
+    inline = asyncio.run(chunk_documents(docs))
+
+    monkeypatch.setattr(settings, "CHUNKING_EXECUTOR", "thread")
+    monkeypatch.setattr(settings, "CHUNKING_WORKERS", 2)
+    pooled = asyncio.run(chunk_documents(docs))
+
+    assert [c.metadata["chunk_id"] for c in pooled] == [
+        c.metadata["chunk_id"] for c in inline
+    ]
+
+
+def test_loader_reports_structured_results(tmp_path):
+    (tmp_path / "good.json").write_text(
+        '{"markdown": "# Hi", "metadata": {"sourceURL": "https://x"}}'
+    )
+    (tmp_path / "french.json").write_text(
+        '{"markdown": "# Salut", "metadata": {"language": "fr"}}'
+    )
+    (tmp_path / "broken.json").write_text("{")
+
+    async def collect():
+        files = sorted(tmp_path.glob("*.json"))
+        return {r.file_path: r async for r in iter_load_results(files, workers=2)}
+
+    results = asyncio.run(collect())
+    by_name = {Path(path).name: result for path, result in results.items()}
+
+    assert by_name["good.json"].document.metadata["source_url"] == "https://x"
+    assert by_name["french.json"].skipped == "non-English"
+    assert by_name["broken.json"].error.startswith("JSONDecodeError")
+
+
+def test_chunks_record_their_span_in_the_document():
+    chunks = asyncio.run(chunk_documents([_doc()]))
+
+    for chunk in chunks:
+        span = MARKDOWN[chunk.metadata["start_offset"] : chunk.metadata["end_offset"]]
+        assert span == chunk.page_content
@@ -0,0 +1,84 @@
+from app import keyword_index
+from app.keyword_index import KeywordIndex, analyze, terms
+
+
+def _index(entries):
+    index = KeywordIndex()
+    index.begin_build()
+    index.finish_build()
+    index.add(entries)
+    return index
+
+
+def test_identifiers_are_split_into_pieces():
+    assert {"add_documents", "add", "documents"} <= set(terms("add_documents()"))
+    assert {"qdrantclient", "qdrant", "client"} <= set(terms("QdrantClient"))
+
+
+def test_search_intersects_terms_and_ranks_by_count():
+    index = _index(
+        [
+            ("c1", "d1", "Set the api key once"),
+            ("c2", "d1", "The api key, the API key and the key"),
+            ("c3", "d2", "Call the api with add_documents"),
+        ]
+    )
+
+    assert index.search("API key", limit=10) == ["c2", "c1"]
+    assert index.search("documents", limit=10) == ["c3"]
+    assert index.search("missing", limit=10) == []
+    assert index.search("api", limit=1) == ["c2"]
+
+
+def test_removed_chunks_are_not_returned(monkeypatch):
+    monkeypatch.setattr(keyword_index, "COMPACT_MIN_REMOVED", 0)
+    index = _index([("c1", "d1", "token"), ("c2", "d2", "token"), ("c3", "d3", "x")])
+
+    index.remove_documents(["d1"])
+    index.remove_chunks(["c2"])
+
+    assert index.search("token", limit=10) == []
+    assert len(index) == 1
+    assert "token" not in index._postings
+
+
+def test_updates_during_a_build_are_replayed():
+    index = KeywordIndex()
+    index.begin_build()
+    index.add([("c2", "d2", "streamed token")])
+    index.remove_documents(["d1"])
+    index.load([("c1", "d1", terms("old token"))])
+
+    assert not index.ready
+    index.finish_build()
+
+    assert index.search("token", limit=10) == ["c2"]
+
+
+def test_pre_analyzed_entries_are_added_only_when_active():
+    index = KeywordIndex()
+    assert not index.active
+
+    index.begin_build()
+    assert index.active
+    index.add_analyzed(analyze([("c1", "d1", "retry token")]))
+    index.finish_build()
+
+    assert index.search("retry", limit=10) == ["c1"]
+
+
+def test_bm25_matches_any_term_and_favors_rare_ones():
+    index = _index(
+        [
+            ("c1", "d1", "the client sends the request"),
+            ("c2", "d1", "the client retries"),
+            ("c3", "d2", "backoff between retries of the client"),
+            ("c4", "d3", "unrelated text"),
+        ]
+    )
+
+    ranked = index.bm25(["client", "backoff"], limit=10)
+
+    assert [chunk_id for chunk_id, _ in ranked][0] == "c3"
+    assert {chunk_id for chunk_id, _ in ranked} == {"c1", "c2", "c3"}
+    assert index.bm25(["missing"], limit=10) == []
@@ -1,4 +1,7 @@
-from app.main import app
+import asyncio
+
+from app.main import _start_background_task, app
+from app.routes import debug
 from fastapi.testclient import TestClient
 
 client = TestClient(app)
@@ -16,3 +19,35 @@ def test_root_endpoint():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == {"message": "Welcome to awesome-docify API"}
+
+
+def test_ready_before_startup():
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "not_ready"
+
+
+def test_background_task_failures_are_logged(caplog):
+    async def broken():
+        raise RuntimeError("boom")
+
+    async def run():
+        task = _start_background_task(broken())
+        assert task in app.state.background_tasks
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+
+    assert not app.state.background_tasks
+    assert "Background task broken failed: boom" in caplog.text
+
+
+def test_qdrant_status_does_not_need_a_local_directory(monkeypatch):
+    # As with QDRANT_URL or VECTOR_BACKEND=numpy, where QDRANT_PATH is unused
+    monkeypatch.setattr(debug.settings, "QDRANT_PATH", "/nonexistent/qdrant")
+    monkeypatch.setattr(debug, "count_points", lambda: 0)
+
+    response = client.get("/api/v1/debug/qdrant-status")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "empty"
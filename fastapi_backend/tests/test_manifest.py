@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from app.data_ingestion_service.manifest import (
+    SourceFile,
+    diff_manifest,
+    document_id_for,
+    scan_directory,
+    scan_files,
+)
+
+
+def test_diff_manifest(tmp_path):
+    def source(name, digest):
+        return SourceFile(path=tmp_path / name, content_hash=digest, file_size=1)
+
+    files = [
+        source("new.json", "a"),
+        source("edit.json", "b"),
+        source("same.json", "c"),
+    ]
+    manifest = {
+        str((tmp_path / "edit.json").resolve()): "old",
+        str((tmp_path / "same.json").resolve()): "c",
+        str((tmp_path / "gone.json").resolve()): "d",
+    }
+
+    diff = diff_manifest(files, manifest)
+
+    assert [s.path.name for s in diff.added] == ["new.json"]
+    assert [s.path.name for s in diff.changed] == ["edit.json"]
+    assert [s.path.name for s in diff.unchanged] == ["same.json"]
+    assert [Path(key).name for key in diff.removed] == ["gone.json"]
+    assert diff.removed[str((tmp_path / "gone.json").resolve())] == (
+        document_id_for(tmp_path / "gone.json")
+    )
+    assert [s.path.name for s in diff.to_ingest] == ["new.json", "edit.json"]
+
+
+def test_rescanning_unchanged_files_gives_an_empty_diff(tmp_path):
+    (tmp_path / "a.json").write_text('{"markdown": "a"}')
+    (tmp_path / "b.json").write_text('{"markdown": "b"}')
+    (tmp_path / "notes.txt").write_text("not a source file")
+
+    first = scan_directory(str(tmp_path))
+    manifest = {source.key: source.content_hash for source in first}
+    (tmp_path / "b.json").write_text('{"markdown": "b, edited"}')
+    second = scan_directory(str(tmp_path))
+
+    assert [source.path.name for source in first] == ["a.json", "b.json"]
+    assert diff_manifest(first, manifest).is_empty
+    assert [s.path.name for s in diff_manifest(second, manifest).changed] == ["b.json"]
+    assert second[1].doc_id == first[1].doc_id
+
+
+def test_scan_files_skips_deleted_files(tmp_path):
+    (tmp_path / "a.json").write_text("{}")
+
+    files = scan_files([tmp_path / "a.json", tmp_path / "gone.json"])
+
+    assert [source.path.name for source in files] == ["a.json"]
@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+
+import numpy as np
+import pytest
+from app import numpy_store, vector_store
+from app.config import settings
+from app.numpy_store import NumpyVectorStore
+from langchain_core.documents import Document
+
+
+def payload(doc_id):
+    return {"page_content": "text", "metadata": {"doc_id": doc_id}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "vectors"))
+    store.create(2)
+    yield store
+    store.close()
+
+
+def test_search_ranks_by_cosine_within_scope(store):
+    store.upsert(
+        ["a", "b", "c"],
+        [[1, 0], [3, 3], [0, 2]],
+        [payload("d1"), payload("d1"), payload("d2")],
+    )
+
+    [hits] = store.search([[1, 0]], limit=2)
+    [scoped] = store.search([[1, 0]], limit=5, point_ids=["b", "c", "missing"])
+    [above] = store.search([[1, 0]], limit=5, score_threshold=0.5)
+
+    assert [point_id for point_id, _ in hits] == ["a", "b"]
+    assert hits[1][1] == pytest.approx(np.sqrt(0.5))
+    assert [point_id for point_id, _ in scoped] == ["b", "c"]
+    assert [point_id for point_id, _ in above] == ["a", "b"]
+
+
+def test_deleted_rows_are_skipped_and_reused(store):
+    store.upsert(["a", "b"], [[1, 0], [0, 1]], [payload("d1"), payload("d2")])
+    store.delete(store.document_points(["d1"]))
+
+    [hits] = store.search([[1, 0]], limit=5)
+    assert [point_id for point_id, _ in hits] == ["b"]
+
+    store.upsert(["c"], [[1, 1]], [payload("d3")])
+    assert store.count() == 2
+    assert store._size == 2
+
+
+def test_store_grows_and_survives_reopening(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "vectors"), use_float16=True)
+    store.create(2)
+    ids = [str(i) for i in range(1500)]
+    vectors = np.random.default_rng(0).standard_normal((1500, 2))
+    store.upsert(ids, vectors, [payload("d")] * 1500)
+    store.set_metadata({"7": {"title": "seven"}})
+    store.close()
+
+    reopened = NumpyVectorStore(str(tmp_path / "vectors"))
+    [hits] = reopened.search([vectors[7]], limit=1)
+
+    assert reopened.count() == 1500
+    assert hits[0][0] == "7"
+    assert hits[0][1] == pytest.approx(1, abs=1e-3)
+    assert reopened.payloads(["7"])["7"]["metadata"]["title"] == "seven"
+    reopened.close()
+
+
+def test_repeated_ids_in_a_batch_keep_the_last_vector(store):
+    store.upsert(
+        ["a", "b", "a"],
+        [[1, 0], [0, 1], [-1, 0]],
+        [payload("d1")] * 2 + [payload("d2")],
+    )
+
+    [hits] = store.search([[-1, 0]], limit=5)
+
+    assert store.count() == 2
+    assert store._size == 2
+    assert hits[0] == ("a", pytest.approx(1.0))
+    assert store.payloads(["a"])["a"]["metadata"]["doc_id"] == "d2"
+
+
+def test_concurrent_readers_open_the_store_once(store, monkeypatch):
+    store.upsert(["a"], [[1, 0]], [payload("d1")])
+    store.close()
+    connections = []
+    connect = sqlite3.connect
+
+    def counting_connect(*args, **kwargs):
+        connections.append(args)
+        return connect(*args, **kwargs)
+
+    monkeypatch.setattr(numpy_store.sqlite3, "connect", counting_connect)
+    start = threading.Barrier(8)
+    results = []
+
+    def read():
+        start.wait()
+        results.append(store.search([[1, 0]], limit=1))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(connections) == 1
+    assert [hits[0][0][0] for hits in results] == ["a"] * 8
+
+
+def test_vector_store_functions_use_the_numpy_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(settings, "NUMPY_STORE_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "VECTOR_DIMENSION", 2)
+    monkeypatch.setattr(vector_store, "_numpy_store", None)
+    vector_store.ensure_collection()
+    chunks = [
+        Document(
+            page_content=f"chunk {i}", metadata={"chunk_id": f"c{i}", "doc_id": "d"}
+        )
+        for i in range(3)
+    ]
+    vector_store.upsert_chunks(chunks, [[1, 0], [1, 1], [0, 1]])
+
+    hits = vector_store.search_points(
+        [1, 0], vector_store.scope_filter(["c1", "c2"]), limit=5
+    )
+
+    assert [hit.id for hit in hits] == ["c1", "c2"]
+    assert hits[0].payload["metadata"]["doc_id"] == "d"
+    assert not vector_store.keywords_complete()
+    assert vector_store.get_collection_info().points_count == 3
+    vector_store.delete_document_points(["d"], keep_ids=["c0"])
+    assert [d.page_content for d in vector_store.retrieve_chunks(["c0", "c1"])] == [
+        "chunk 0"
+    ]
+    vector_store.reset_collection()
+    assert vector_store.count_points() == 0
@@ -0,0 +1,70 @@
+import asyncio
+
+from app.data_ingestion_service import pipeline as pipeline_module
+from app.data_ingestion_service.ingest import LoadResult
+from app.data_ingestion_service.pipeline import IngestionPipeline
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+
+class ZeroEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [[0.0] for _ in texts]
+
+    def embed_query(self, text):
+        return [0.0]
+
+
+def _doc(doc_id):
+    return Document(page_content="", metadata={"doc_id": doc_id, "file_path": doc_id})
+
+
+def _chunk(doc_id, chunk_id, vector_id=None):
+    return Document(
+        page_content="",
+        metadata={
+            "doc_id": doc_id,
+            "chunk_id": chunk_id,
+            "vector_id": vector_id or chunk_id,
+        },
+    )
+
+
+def test_files_complete_once_all_their_points_are_stored():
+    checkpoints = []
+
+    async def on_checkpoint(files):
+        checkpoints.append(files)
+
+    pipeline = IngestionPipeline(
+        embeddings=ZeroEmbeddings(), on_checkpoint=on_checkpoint, checkpoint_files=1
+    )
+    a1, a2 = _chunk("a", "a1"), _chunk("a", "a2")
+    # b only holds a duplicate of a1, whose point is not stored yet
+    b1 = _chunk("b", "b1", vector_id="a1")
+    pipeline._track([_doc("a"), _doc("b")], [a1, a2, b1], [a1, a2])
+    for doc_id in ["a", "b"]:
+        pipeline._release(doc_id)  # chunk rows written
+    assert pipeline._completed == []
+
+    pipeline._stored([a1])
+    assert pipeline._completed == ["b"]
+
+    pipeline._stored([a2])
+    asyncio.run(pipeline._checkpoint())
+    assert checkpoints == [["b", "a"]]
+
+
+def test_unreadable_files_are_not_completed(monkeypatch):
+    async def results(files):
+        yield LoadResult("bad.json", error="Permission denied")
+        yield LoadResult("empty.json", skipped="empty")
+
+    monkeypatch.setattr(pipeline_module, "iter_load_results", results)
+    pipeline = IngestionPipeline(embeddings=ZeroEmbeddings(), chunk_workers=1)
+
+    asyncio.run(pipeline._load([], asyncio.Queue()))
+
+    assert pipeline._completed == ["empty.json"]
+    assert pipeline.stats.failed_files == ["bad.json"]
+    assert pipeline.stats.files_done == 2
@@ -0,0 +1,75 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from app.ai_engine_service import rag_engine
+from app.ai_engine_service.rag_engine import (
+    DocuRAG,
+    reciprocal_rank_fusion,
+    speculative_keywords,
+)
+from app.schemas import Intent
+
+
+def test_speculative_keywords_prefer_quoted_text_and_identifiers():
+    query = "Please don't forget to update the `add_documents` docs for QdrantClient"
+
+    assert speculative_keywords(query, 3) == [
+        "add_documents",
+        "QdrantClient",
+        "forget",
+    ]
+
+
+def test_speculative_hit_skips_the_keyword_lookup():
+    async def run():
+        speculative = asyncio.create_task(asyncio.sleep(0, {"qdrantclient": ["c1"]}))
+        intent = Intent(action="modify", target="`QdrantClient`")
+        # No session is needed when the speculative lookup has the target
+        return await DocuRAG()._get_relevant_chunk_ids(intent, None, speculative)
+
+    assert asyncio.run(run()) == ["c1"]
+
+
+def test_rank_fusion_favors_items_found_by_both_retrievers():
+    dense = ["a", "b", "c"]
+    sparse = ["c", "d"]
+
+    fused = [item for item, _ in reciprocal_rank_fusion([dense, sparse], k=60)]
+
+    assert fused[0] == "c"
+    assert set(fused) == {"a", "b", "c", "d"}
+
+
+def test_shared_point_expands_to_one_chunk_per_document_within_the_cap(
+    monkeypatch,
+):
+    @asynccontextmanager
+    async def session():
+        yield None
+
+    def row(chunk_id, doc_id):
+        chunk = SimpleNamespace(chunk_id=chunk_id, content=chunk_id, chunk_index=0)
+        document = SimpleNamespace(doc_id=doc_id, title="", file_path="", source_url="")
+        return chunk, document
+
+    # p1 is a boilerplate point shared by many chunks, two of them in doc d0
+    rows = [row("p1", "d0"), row("p1-copy", "d0")]
+    rows += [row(f"c{i}", f"d{i}") for i in range(1, 20)]
+    rows += [row("p2", "d1")]
+
+    async def chunks_with_documents(chunk_ids, db):
+        return [r for r in rows if r[0].chunk_id in chunk_ids]
+
+    monkeypatch.setattr(rag_engine, "get_db_session", session)
+    monkeypatch.setattr(rag_engine, "get_chunks_with_documents", chunks_with_documents)
+    vector_ids = {chunk.chunk_id: "p1" for chunk, _ in rows}
+    vector_ids["p2"] = "p2"
+
+    documents = asyncio.run(
+        DocuRAG()._expand_duplicates([("p1", {}), ("p2", {})], vector_ids, max_chunks=6)
+    )
+
+    assert len(documents) == 6
+    assert documents[0].metadata["chunk_id"] == "p1"
+    assert "p1-copy" not in [d.metadata["chunk_id"] for d in documents]
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import pytest
+from app import vector_store
+from app.config import settings
+from app.vector_store import _ReadWriteLock, run_vector_op
+from langchain_core.documents import Document
+from qdrant_client.http.models import PointStruct
+
+
+def test_run_vector_op_runs_off_the_event_loop():
+    name = asyncio.run(run_vector_op(lambda: threading.current_thread().name))
+
+    assert name.startswith("qdrant")
+
+
+def test_readers_share_the_lock_and_writers_wait_for_them():
+    lock = _ReadWriteLock()
+    events = []
+    both_reading = threading.Barrier(2, timeout=2)
+
+    def reader(name):
+        with lock.read():
+            events.append(f"{name} start")
+            # Fails with BrokenBarrierError unless both readers hold the lock
+            both_reading.wait()
+            time.sleep(0.05)
+            events.append(f"{name} end")
+
+    def writer():
+        with lock.write():
+            events.append("write")
+
+    readers = [threading.Thread(target=reader, args=(n,)) for n in ("r1", "r2")]
+    for thread in readers:
+        thread.start()
+    while len(events) < 2:
+        time.sleep(0.001)
+    writing = threading.Thread(target=writer)
+    writing.start()
+    for thread in readers + [writing]:
+        thread.join(timeout=2)
+
+    assert events[-1] == "write"
+    assert sorted(events[:2]) == ["r1 start", "r2 start"]
+
+
+def test_lock_is_skipped_for_a_qdrant_server(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_BACKEND", "qdrant")
+    monkeypatch.setattr(settings, "QDRANT_URL", "http://qdrant:6333")
+    lock = vector_store._lock
+
+    # A server serves readers and writers concurrently, so nesting cannot block
+    with lock.write():
+        with lock.read():
+            with lock.write():
+                pass
+
+    monkeypatch.setattr(settings, "QDRANT_URL", None)
+    assert vector_store._in_process_store()
+
+
+@pytest.fixture
+def collection(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "QDRANT_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "QDRANT_COLLECTION_NAME", "test")
+    monkeypatch.setattr(settings, "VECTOR_DIMENSION", 2)
+    monkeypatch.setattr(vector_store, "_client", None)
+    monkeypatch.setattr(vector_store, "_keywords_complete", None)
+    vector_store.ensure_collection()
+    yield vector_store.get_qdrant_client()
+    vector_store.get_qdrant_client().close()
+
+
+def _point(number):
+    return str(uuid.UUID(int=number))
+
+
+def test_scope_filter_adds_keyword_matches_and_threshold_is_applied(collection):
+    texts = ["retry the request", "stream the response", "retry with backoff"]
+    chunks = [
+        Document(page_content=text, metadata={"chunk_id": _point(i)})
+        for i, text in enumerate(texts)
+    ]
+    vectors = [[1.0, 0.0], [1.0, 0.1], [0.0, 1.0]]
+    vector_store.upsert_chunks(chunks, vectors)
+
+    def search(query_filter, threshold=None):
+        points = vector_store.search_points([1.0, 0.0], query_filter, 10, threshold)
+        return sorted(str(point.id) for point in points)
+
+    by_id = vector_store.scope_filter([_point(1)])
+    with_keyword = vector_store.scope_filter([_point(1)], "Retry")
+    keyword_only = vector_store.scope_filter(None, "Retry")
+
+    assert search(by_id) == [_point(1)]
+    assert search(with_keyword) == [_point(0), _point(1), _point(2)]
+    assert search(keyword_only) == [_point(0), _point(2)]
+    # The orthogonal vector scores 0 and is dropped by Qdrant
+    assert search(with_keyword, threshold=0.5) == [_point(0), _point(1)]
+    assert vector_store.keywords_complete()
+
+
+def test_points_without_keywords_are_detected(collection):
+    collection.upsert(
+        "test",
+        [PointStruct(id=_point(7), vector=[1.0, 0.0], payload={"metadata": {}})],
+    )
+
+    assert not vector_store.keywords_complete()
+
+
+def test_backfill_adds_keywords_to_old_points(collection):
+    collection.upsert(
+        "test",
+        [
+            PointStruct(
+                id=_point(i),
+                vector=[1.0, 0.0],
+                payload={"page_content": text, "metadata": {}},
+            )
+            for i, text in enumerate(["retry the request", "..."])
+        ],
+    )
+
+    assert vector_store.backfill_keywords(batch_size=1) == 2
+    assert vector_store.keywords_complete()
+    assert vector_store.backfill_keywords() == 0
+    points = vector_store.search_points(
+        [1.0, 0.0], vector_store.scope_filter(None, "retry"), 10
+    )
+    assert [str(point.id) for point in points] == [_point(0)]
+
+
+def test_existing_collections_get_missing_payload_indexes(monkeypatch):
+    created = []
+
+    class Client:
+        def create_payload_index(self, collection_name, field_name, field_schema):
+            created.append(field_name)
+
+    monkeypatch.setattr(settings, "QDRANT_URL", "http://qdrant:6333")
+    vector_store._create_payload_indexes(Client(), {"metadata.doc_id": object()})
+
+    assert created == [vector_store.KEYWORDS_FIELD]
+
+
+def test_collection_with_another_dimension_is_rejected(collection, monkeypatch):
+    vector_store.check_collection_dimension()
+
+    monkeypatch.setattr(settings, "VECTOR_DIMENSION", 4)
+
+    with pytest.raises(ValueError, match="2-dimensional"):
+        vector_store.check_collection_dimension()
+    with pytest.raises(ValueError):
+        vector_store.ensure_collection()
@@ -0,0 +1,38 @@
+import asyncio
+from pathlib import Path
+
+from app.data_ingestion_service.manifest import scan_files
+from app.data_ingestion_service.watch import DocumentWatcher
+
+
+def test_burst_of_events_is_flushed_as_one_batch():
+    batches = []
+
+    async def on_batch(paths):
+        batches.append(paths)
+
+    async def run():
+        watcher = DocumentWatcher(
+            directory=".", debounce=0.05, max_delay=5, on_batch=on_batch
+        )
+        task = asyncio.create_task(watcher._flush_loop())
+        for name in ["a.json", "b.json", "a.json"]:
+            watcher.notify(Path(name))
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.2)
+        watcher.notify(Path("c.json"))
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+    asyncio.run(run())
+
+    assert batches == [{Path("a.json"), Path("b.json")}, {Path("c.json")}]
+
+
+def test_scan_files_skips_deleted_files(tmp_path):
+    present = tmp_path / "present.json"
+    present.write_text("{}")
+
+    files = scan_files([present, tmp_path / "deleted.json"])
+
+    assert [f.path for f in files] == [present]